@@ -4,7 +4,6 @@ Handles JavaScript-rendered websites, SPAs, and modern web apps
 """
 
 import os
-import re
 import sys
 import time
 import hashlib
@@ -16,26 +15,68 @@ import mimetypes
 # Install required packages
 try:
     import requests
-    from bs4 import BeautifulSoup
 except ImportError:
     print("Installing required packages...")
     import subprocess
     subprocess.check_call([sys.executable, "-m", "pip", "install", "requests", "beautifulsoup4", "lxml", "-q"])
     import requests
-    from bs4 import BeautifulSoup
 
-try:
-    from playwright.sync_api import sync_playwright
-except ImportError:
-    print("Installing Playwright...")
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "playwright", "-q"])
-    subprocess.check_call([sys.executable, "-m", "playwright", "install", "chromium"])
-    from playwright.sync_api import sync_playwright
+from crawl_state import CrawlState
+from asset_store import AssetStore
+from html_extract import ExtractRules, extract, URL, SRCSET, CSS, LINK
+from html_rewrite import parse, rewrite_html, BACKENDS, DEFAULT_BACKEND
+from css_scan import find_refs, splice_refs, css_urls
+from browser_pool import BrowserPool, Frontier, DEFAULT_WORKERS, DEFAULT_RECYCLE_AFTER
+from page_ready import watch, wait_until_ready, DEFAULT_READY_TIMEOUT
+from lazy_scroll import scroll_page, add_scroll_arguments, DEFAULT_MAX_SCROLL_HEIGHT, DEFAULT_MAX_SCROLL_TIME
+from resource_policy import add_policy_arguments, policy_from_args, check_policy
+
+
+# Resource types saved from rendered pages (the responses watch_assets keeps)
+SAVED_TYPES = {'stylesheet', 'script', 'image', 'font'}
+
+# What extract_from_html() collects, as one tag -> attribute table
+EXTRACT_RULES = ExtractRules(
+    tag_attrs=[
+        ('link', 'href', URL), ('script', 'src', URL), ('img', 'src', URL), ('img', 'data-src', URL),
+        ('source', 'src', URL), ('video', 'src', URL), ('video', 'poster', URL), ('audio', 'src', URL),
+        ('iframe', 'src', URL), ('embed', 'src', URL), ('object', 'data', URL),
+        ('img', 'srcset', SRCSET), ('source', 'srcset', SRCSET),
+        ('a', 'href', LINK),
+        # Meta tags for SEO
+        ('meta', 'content', URL, lambda a: a.get('property', '').startswith('og:') and 'image' in a['property'].lower()),
+    ],
+    any_attrs=[('style', CSS)],
+    text_tags={'style': CSS},
+)
+
+
+# What rewrite_html() points at local copies
+REWRITE_RULES = ExtractRules(
+    tag_attrs=[
+        ('link', 'href', URL),
+        ('script', 'src', URL),
+        ('img', 'src', URL),
+        ('img', 'data-src', URL),
+        ('img', 'srcset', SRCSET),
+        ('source', 'src', URL),
+        ('source', 'srcset', SRCSET),
+        ('video', 'src', URL),
+        ('video', 'poster', URL),
+        ('audio', 'src', URL),
+        ('a', 'href', URL),
+    ],
+    any_attrs=[('style', CSS)],
+    text_tags={'style': CSS},
+)
 
 
 class AdvancedWebsiteCloner:
-    def __init__(self, base_url, output_dir="cloned_site", max_depth=10, delay=1.0):
+    def __init__(self, base_url, output_dir="cloned_site", max_depth=10, delay=0.0, resume=False,
+                 blob_dir=None, max_memory=1024 * 1024, html_parser=DEFAULT_BACKEND,
+                 workers=DEFAULT_WORKERS, recycle_after=DEFAULT_RECYCLE_AFTER, ready_timeout=DEFAULT_READY_TIMEOUT,
+                 resource_policy=None, max_scroll_height=DEFAULT_MAX_SCROLL_HEIGHT,
+                 max_scroll_time=DEFAULT_MAX_SCROLL_TIME):
         self.base_url = base_url.rstrip('/')
         self.parsed_base = urlparse(self.base_url)
         self.base_domain = self.parsed_base.netloc
@@ -52,6 +93,34 @@ class AdvancedWebsiteCloner:
         # Queue for pages: (url, depth)
         self.pages_to_visit = deque()
         
+        # Checkpoints for --resume
+        self.resume = resume
+        self.state = CrawlState(self.output_dir)
+        
+        # Binary assets are stored once per distinct body and hardlinked into place.
+        # Downloads are streamed; bodies over max_memory bytes go to a temp file.
+        self.asset_store = AssetStore(self.output_dir, blob_dir, max_memory)
+        
+        # HTML backend for extraction and rewriting: 'lxml' or 'bs4' (same output)
+        self.html_parser = html_parser
+        
+        # Pages render in parallel, one browser context per worker
+        self.workers = workers
+        self.recycle_after = recycle_after
+        
+        # Longest wait for a rendered page to settle (see page_ready)
+        self.ready_timeout = ready_timeout
+        
+        # What rendered pages may load (see resource_policy); None loads everything
+        self.resource_policy = check_policy(resource_policy, SAVED_TYPES)
+        
+        # Caps on the lazy-load scroll, for infinite grids (see lazy_scroll)
+        self.max_scroll_height = max_scroll_height
+        self.max_scroll_time = max_scroll_time
+        
+        # Assets saved straight from the browser's responses while rendering
+        self.captured_urls = set()
+        
         # Session for asset downloads
         self.session = requests.Session()
         self.session.headers.update({
@@ -130,7 +199,7 @@ class AdvancedWebsiteCloner:
         
         try:
             time.sleep(0.1)
-            response = self.session.get(url, timeout=30, allow_redirects=True)
+            response = self.session.get(url, timeout=30, allow_redirects=True, stream=True)
             response.raise_for_status()
             
             content_type = response.headers.get('Content-Type', '')
@@ -139,12 +208,12 @@ class AdvancedWebsiteCloner:
             # Determine if text or binary
             is_text = any(t in content_type for t in ['text', 'javascript', 'json', 'xml', 'css'])
             
-            if is_text:
-                with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
-                    f.write(response.text)
-            else:
-                with open(local_path, 'wb') as f:
-                    f.write(response.content)
+            with self.asset_store.read(response) as body:
+                if is_text:
+                    with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
+                        f.write(body.text(response.encoding))
+                else:
+                    self.asset_store.save_body(local_path, body, content_type)
             
             self.downloaded_assets.add(url)
             self.url_to_local[url] = local_path
@@ -156,151 +225,119 @@ class AdvancedWebsiteCloner:
             self.failed_urls.add(url)
             return None
     
+    def save_captured(self, url, content_type, body, encoding=None):
+        """Save a body the browser already fetched, as download_asset() would have"""
+        local_path = self.url_to_filepath(url, content_type)
+        
+        is_text = any(t in content_type for t in ['text', 'javascript', 'json', 'xml', 'css'])
+        if is_text:
+            with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
+                f.write(body.decode(encoding or 'utf-8', errors='replace'))
+        else:
+            self.asset_store.save(local_path, body, content_type)
+        
+        self.downloaded_assets.add(url)
+        self.url_to_local[url] = local_path
+        self.captured_urls.add(url)
+        return local_path
+    
     def extract_from_html(self, html_content, page_url):
-        """Extract assets and links from HTML"""
-        soup = BeautifulSoup(html_content, 'lxml')
+        """Extract assets and links from HTML (one tree walk, see EXTRACT_RULES)"""
+        found = extract(html_content, EXTRACT_RULES)
         assets = set()
         pages = set()
         
-        # Asset extraction
-        tag_attrs = [
-            ('link', 'href'), ('script', 'src'), ('img', 'src'), ('img', 'data-src'),
-            ('source', 'src'), ('video', 'src'), ('video', 'poster'), ('audio', 'src'),
-            ('iframe', 'src'), ('embed', 'src'), ('object', 'data'),
-        ]
-        
-        for tag, attr in tag_attrs:
-            for element in soup.find_all(tag):
-                value = element.get(attr)
-                if value:
-                    url = self.normalize_url(value, page_url)
-                    if url:
-                        assets.add(url)
-        
-        # srcset handling
-        for element in soup.find_all(['img', 'source'], srcset=True):
-            srcset = element.get('srcset', '')
-            for part in srcset.split(','):
-                url_part = part.strip().split()[0] if part.strip() else None
-                if url_part:
-                    url = self.normalize_url(url_part, page_url)
-                    if url:
-                        assets.add(url)
-        
-        # Inline styles
-        for element in soup.find_all(style=True):
-            urls = re.findall(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', element.get('style', ''))
-            for url in urls:
-                normalized = self.normalize_url(url, page_url)
-                if normalized:
-                    assets.add(normalized)
-        
-        # Style tags
-        for style in soup.find_all('style'):
-            if style.string:
-                urls = re.findall(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', style.string)
-                for url in urls:
-                    normalized = self.normalize_url(url, page_url)
-                    if normalized:
-                        assets.add(normalized)
+        # Tag attributes, srcset entries and meta images, plus url()
+        # references in style attributes and <style> tags
+        values = found[URL] + [url for css in found[CSS] for url in css_urls(css)]
+        for value in values:
+            url = self.normalize_url(value, page_url)
+            if url:
+                assets.add(url)
         
         # Page links
-        for a in soup.find_all('a', href=True):
-            href = a.get('href')
+        for href in found[LINK]:
             url = self.normalize_url(href, page_url)
             if url and self.is_same_domain(url):
                 ext = os.path.splitext(urlparse(url).path)[1].lower()
                 if not ext or ext in ['.html', '.htm', '.php', '.asp', '.aspx', '']:
                     pages.add(url)
         
-        # Meta tags for SEO
-        for meta in soup.find_all('meta', attrs={'property': re.compile(r'^og:')}):
-            if 'image' in meta.get('property', '').lower():
-                url = self.normalize_url(meta.get('content', ''), page_url)
-                if url:
-                    assets.add(url)
-        
         return assets, pages
     
     def extract_from_css(self, css_content, css_url):
-        """Extract assets from CSS"""
+        """Extract assets from CSS: url() references, @imports and @font-face sources, in one pass"""
         assets = set()
-        patterns = [
-            r'url\([\'"]?([^\'")\s]+)[\'"]?\)',
-            r'@import\s+[\'"]([^\'"]+)[\'"]',
-        ]
-        for pattern in patterns:
-            for match in re.findall(pattern, css_content):
-                url = self.normalize_url(match, css_url)
-                if url:
-                    assets.add(url)
+        for value in css_urls(css_content):
+            url = self.normalize_url(value, css_url)
+            if url:
+                assets.add(url)
         return assets
     
     def rewrite_html(self, html_content, page_url):
-        """Rewrite URLs in HTML to local paths"""
-        soup = BeautifulSoup(html_content, 'lxml')
+        """Rewrite URLs in HTML to local paths (one tree walk, see REWRITE_RULES)"""
         page_local = self.url_to_filepath(page_url)
         
-        tag_attrs = [
-            ('link', 'href'), ('script', 'src'), ('img', 'src'), ('img', 'data-src'),
-            ('source', 'src'), ('video', 'src'), ('video', 'poster'), ('audio', 'src'),
-            ('a', 'href'),
-        ]
-        
-        for tag, attr in tag_attrs:
-            for element in soup.find_all(tag):
-                value = element.get(attr)
-                if value:
-                    url = self.normalize_url(value, page_url)
-                    if url and url in self.url_to_local:
-                        try:
-                            rel_path = os.path.relpath(self.url_to_local[url], os.path.dirname(page_local))
-                            element[attr] = rel_path.replace('\\', '/')
-                        except ValueError:
-                            pass
-        
-        # Rewrite srcset
-        for element in soup.find_all(['img', 'source'], srcset=True):
-            srcset = element.get('srcset', '')
-            new_parts = []
-            for part in srcset.split(','):
-                parts = part.strip().split()
-                if parts:
-                    url = self.normalize_url(parts[0], page_url)
-                    if url and url in self.url_to_local:
-                        try:
-                            rel_path = os.path.relpath(self.url_to_local[url], os.path.dirname(page_local))
-                            parts[0] = rel_path.replace('\\', '/')
-                        except ValueError:
-                            pass
-                    new_parts.append(' '.join(parts))
-            element['srcset'] = ', '.join(new_parts)
-        
-        # Rewrite inline styles
-        for element in soup.find_all(style=True):
-            style = element.get('style', '')
-            element['style'] = self._rewrite_css_urls(style, page_url, page_local)
-        
-        for style in soup.find_all('style'):
-            if style.string:
-                style.string = self._rewrite_css_urls(style.string, page_url, page_local)
+        def rewrite_url(value):
+            url = self.normalize_url(value, page_url)
+            if url and url in self.url_to_local:
+                try:
+                    rel_path = os.path.relpath(self.url_to_local[url], os.path.dirname(page_local))
+                    return rel_path.replace('\\', '/')
+                except ValueError:
+                    pass
+            return None
         
-        return str(soup)
+        handlers = {
+            URL: rewrite_url,
+            CSS: lambda css: self._rewrite_css_urls(css, page_url, page_local),
+        }
+        return rewrite_html(html_content, REWRITE_RULES, handlers, self.html_parser)
     
     def _rewrite_css_urls(self, css_content, css_url, css_local):
         """Helper to rewrite URLs in CSS content"""
-        def replace_url(match):
-            url = match.group(1)
-            normalized = self.normalize_url(url, css_url)
+        def replace_url(kind, value):
+            normalized = self.normalize_url(value, css_url)
             if normalized and normalized in self.url_to_local:
                 try:
                     rel_path = os.path.relpath(self.url_to_local[normalized], os.path.dirname(css_local))
-                    return f'url("{rel_path.replace(chr(92), "/")}")'
+                    return rel_path.replace('\\', '/')
                 except ValueError:
                     pass
-            return match.group(0)
+            return None
         
-        return re.sub(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', replace_url, css_content)
+        return splice_refs(css_content, find_refs(css_content), replace_url)[0]
+    
+    def save_checkpoint(self, phase, assets=(), processed=(), in_progress=()):
+        """Persist crawl progress so an interrupted run can be resumed
+        
+        in_progress: (url, depth) of pages still rendering; they go back on the frontier
+        """
+        in_progress = list(in_progress)
+        frontier = in_progress + list(self.pages_to_visit)
+        visited = self.visited_urls - {url for url, _ in in_progress}
+        
+        self.state.save(
+            sets={
+                'visited': visited,
+                'downloaded': self.downloaded_assets,
+                'failed': self.failed_urls,
+                'assets': assets,
+                'processed': processed,
+            },
+            maps={'url_to_local': self.url_to_local},
+            frontier=frontier,
+            meta={'phase': phase},
+        )
+    
+    def restore_checkpoint(self):
+        """Load progress saved by save_checkpoint(); returns (phase, assets, processed)"""
+        self.visited_urls = self.state.load_set('visited')
+        self.downloaded_assets = self.state.load_set('downloaded')
+        self.failed_urls = self.state.load_set('failed')
+        self.url_to_local = self.state.load_map('url_to_local')
+        self.pages_to_visit = deque(self.state.load_frontier())
+        return self.state.get_meta('phase'), self.state.load_set('assets'), self.state.load_set('processed')
     
     def clone(self):
         """Main cloning method using Playwright"""
@@ -312,114 +349,127 @@ class AdvancedWebsiteCloner:
         print(f"Max depth: {self.max_depth}")
         print("="*60 + "\n")
         
-        all_assets = set()
+        all_assets, processed = set(), set()
+        if self.state.open(resume=self.resume):
+            phase, all_assets, processed = self.restore_checkpoint()
+            print(f"[RESUME] Continuing from {phase} checkpoint: {len(self.visited_urls)} pages visited, "
+                  f"{len(self.pages_to_visit)} queued, {len(self.downloaded_assets)} files saved\n")
+        else:
+            self.pages_to_visit.append((self.base_url, 0))
+        
+        # Track network requests for assets, and keep the bodies the browser
+        # already downloaded so Phase 2 does not fetch them again
+        captured_assets = set()
+        saving = set()
         
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            )
-            page = context.new_page()
-            
-            # Track network requests for assets
-            captured_assets = set()
-            
-            def handle_response(response):
+        def watch_assets(page):
+            async def handle_response(response):
                 url = response.url
-                if any(ext in url.lower() for ext in ['.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.woff', '.woff2', '.ttf', '.ico']):
-                    captured_assets.add(url)
+                if not any(ext in url.lower() for ext in ['.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.woff', '.woff2', '.ttf', '.ico']):
+                    return
+                captured_assets.add(url)
+                
+                if (response.status != 200 or response.request.method != 'GET'
+                        or url in self.downloaded_assets or url in saving):
+                    return
+                saving.add(url)
+                try:
+                    body = await response.body()
+                    headers = response.headers
+                    await asyncio.to_thread(self.save_captured, url, headers.get('content-type', ''), body,
+                                            requests.utils.get_encoding_from_headers(headers))
+                except Exception:
+                    pass  # Body no longer available (redirect, evicted); Phase 2 downloads it
+                finally:
+                    saving.discard(url)
             
             page.on('response', handle_response)
+        
+        frontier = Frontier(self.pages_to_visit, self.visited_urls, self.max_depth)
+        
+        async def visit(page, url, depth):
+            if self.state.due():
+                self.save_checkpoint('pages', all_assets, processed, in_progress=frontier.pending())
             
-            self.pages_to_visit.append((self.base_url, 0))
-            
-            print("[PHASE 1] Crawling pages with JavaScript rendering...\n")
-            
-            while self.pages_to_visit:
-                url, depth = self.pages_to_visit.popleft()
+            try:
+                print(f"[PAGE] {url[:70]}...")
                 
-                if url in self.visited_urls or depth > self.max_depth:
-                    continue
+                # Navigate and wait for network idle
+                watch(page)
+                await page.goto(url, wait_until='networkidle', timeout=60000)
+                if self.delay:
+                    await asyncio.sleep(self.delay)  # Extra wait for dynamic content
                 
-                self.visited_urls.add(url)
+                # Scroll until lazy content stops appearing (see lazy_scroll)
+                await scroll_page(page, self.max_scroll_height, self.max_scroll_time)
                 
-                try:
-                    print(f"[PAGE] {url[:70]}...")
-                    
-                    # Navigate and wait for network idle
-                    page.goto(url, wait_until='networkidle', timeout=60000)
-                    time.sleep(self.delay)  # Extra wait for dynamic content
-                    
-                    # Scroll to trigger lazy loading
-                    page.evaluate('''() => {
-                        return new Promise((resolve) => {
-                            let totalHeight = 0;
-                            let distance = 500;
-                            let timer = setInterval(() => {
-                                window.scrollBy(0, distance);
-                                totalHeight += distance;
-                                if(totalHeight >= document.body.scrollHeight){
-                                    clearInterval(timer);
-                                    window.scrollTo(0, 0);
-                                    resolve();
-                                }
-                            }, 100);
-                        });
-                    }''')
-                    
-                    time.sleep(0.5)
-                    
-                    # Get rendered HTML
-                    html_content = page.content()
-                    
-                    # Save the page
-                    local_path = self.url_to_filepath(url)
-                    with open(local_path, 'w', encoding='utf-8') as f:
-                        f.write(html_content)
-                    
-                    self.url_to_local[url] = local_path
-                    self.downloaded_assets.add(url)
-                    
-                    # Extract assets and links
-                    assets, pages = self.extract_from_html(html_content, url)
-                    all_assets.update(assets)
-                    all_assets.update(captured_assets)
-                    captured_assets.clear()
-                    
-                    print(f"       Found {len(assets)} assets, {len(pages)} links")
-                    
-                    # Queue new pages
-                    for page_url in pages:
-                        if page_url not in self.visited_urls:
-                            self.pages_to_visit.append((page_url, depth + 1))
-                    
-                except Exception as e:
-                    print(f"[FAIL] {url[:50]}... - {str(e)[:40]}")
-                    self.failed_urls.add(url)
-            
-            browser.close()
+                # Lazy content the scroll triggered (see page_ready)
+                await wait_until_ready(page, self.ready_timeout)
+                
+                # Get rendered HTML
+                html_content = await page.content()
+                
+                # Save the page
+                local_path = self.url_to_filepath(url)
+                with open(local_path, 'w', encoding='utf-8') as f:
+                    f.write(html_content)
+                
+                self.url_to_local[url] = local_path
+                self.downloaded_assets.add(url)
+                
+                # Extract assets and links
+                assets, pages = self.extract_from_html(parse(html_content, self.html_parser), url)
+                all_assets.update(assets)
+                all_assets.update(captured_assets)
+                
+                print(f"       Found {len(assets)} assets, {len(pages)} links")
+                
+                # Every link, seen or not: the frontier keeps each page's smallest depth
+                return pages
+                
+            except Exception as e:
+                print(f"[FAIL] {url[:50]}... - {str(e)[:40]}")
+                self.failed_urls.add(url)
+                return ()
+        
+        print(f"[PHASE 1] Crawling pages with JavaScript rendering ({self.workers} at a time)...\n")
+        
+        pool = BrowserPool(self.workers, self.recycle_after, resource_policy=self.resource_policy,
+                           on_page=watch_assets)
+        try:
+            pool.run(frontier, visit)
+        finally:
+            all_assets.update(captured_assets)
+            self.save_checkpoint('pages', all_assets, processed, in_progress=frontier.pending())
         
         # Phase 2: Download assets
-        print(f"\n[PHASE 2] Downloading {len(all_assets)} assets...\n")
+        print(f"\n[PHASE 2] {len(all_assets)} assets, {len(self.captured_urls)} already saved from the browser, "
+              f"downloading the rest...\n")
         
-        processed = set()
         to_process = all_assets.copy()
+        current_asset = None
         
-        while to_process - processed:
-            for asset_url in list(to_process - processed):
-                processed.add(asset_url)
-                local_path = self.download_asset(asset_url)
-                
-                # Process CSS for nested assets
-                if local_path and local_path.endswith('.css'):
-                    try:
-                        with open(local_path, 'r', encoding='utf-8', errors='replace') as f:
-                            css_content = f.read()
-                        nested = self.extract_from_css(css_content, asset_url)
-                        to_process.update(nested)
-                    except:
-                        pass
+        try:
+            while to_process - processed:
+                for asset_url in list(to_process - processed):
+                    if self.state.due():
+                        self.save_checkpoint('assets', to_process, processed)
+                    current_asset = asset_url
+                    processed.add(asset_url)
+                    local_path = self.download_asset(asset_url)
+                    
+                    # Process CSS for nested assets
+                    if local_path and local_path.endswith('.css'):
+                        try:
+                            with open(local_path, 'r', encoding='utf-8', errors='replace') as f:
+                                css_content = f.read()
+                            nested = self.extract_from_css(css_content, asset_url)
+                            to_process.update(nested)
+                        except:
+                            pass
+            current_asset = None
+        finally:
+            self.save_checkpoint('assets', to_process, processed - {current_asset})
         
         # Phase 3: Rewrite URLs
         print("\n[PHASE 3] Rewriting URLs to local paths...")
@@ -441,6 +491,9 @@ class AdvancedWebsiteCloner:
             except Exception as e:
                 print(f"  Warning: Could not rewrite {local_path}: {e}")
         
+        self.save_checkpoint('done', to_process, processed)
+        self.state.close()
+        
         # Create root redirect
         main_index = os.path.join(self.output_dir, self.base_domain, 'index.html')
         root_index = os.path.join(self.output_dir, 'index.html')
@@ -465,8 +518,12 @@ class AdvancedWebsiteCloner:
         print("CLONE COMPLETE!")
         print("="*60)
         print(f"Pages downloaded: {len(self.visited_urls)}")
-        print(f"Assets downloaded: {len(self.downloaded_assets)}")
+        print(f"Assets downloaded: {len(self.downloaded_assets)} ({len(self.captured_urls)} from the browser's own responses)")
         print(f"Failed downloads: {len(self.failed_urls)}")
+        pruned = self.asset_store.prune()
+        print(f"Blob store: {self.asset_store.summary()}, {pruned} unused blobs pruned")
+        if self.resource_policy is not None:
+            print(f"Resources: {self.resource_policy.summary()}")
         print(f"Output directory: {os.path.abspath(self.output_dir)}")
         print(f"\nTo view the site, open: {os.path.abspath(root_index)}")
         
@@ -491,8 +548,24 @@ def main():
                        help='Output directory')
     parser.add_argument('-d', '--depth', type=int, default=10,
                        help='Max crawl depth')
-    parser.add_argument('--delay', type=float, default=1.0,
-                       help='Delay between pages')
+    parser.add_argument('--delay', type=float, default=0.0,
+                       help='Fixed extra wait after each page loads, on top of readiness detection (default: 0)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue an interrupted clone from its last checkpoint')
+    parser.add_argument('--blob-dir', default=None,
+                       help='Shared blob store for deduplicated assets (default: OUTPUT/.blobs)')
+    parser.add_argument('--max-memory', type=float, default=1.0,
+                       help='Largest download kept in memory, in MB; bigger ones stream to disk (default: 1)')
+    parser.add_argument('--parser', choices=BACKENDS, default=DEFAULT_BACKEND,
+                       help='HTML backend for extraction and rewriting; both write the same output (default: lxml)')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                       help=f'Pages rendered at once, each in its own browser context (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--recycle-after', type=int, default=DEFAULT_RECYCLE_AFTER,
+                       help=f'Navigations before a worker\'s browser context is replaced (default: {DEFAULT_RECYCLE_AFTER})')
+    parser.add_argument('--ready-timeout', type=float, default=DEFAULT_READY_TIMEOUT,
+                       help=f'Longest wait for a page to settle before it is captured anyway, in seconds (default: {DEFAULT_READY_TIMEOUT:g})')
+    add_policy_arguments(parser, SAVED_TYPES)
+    add_scroll_arguments(parser)
     
     args = parser.parse_args()
     
@@ -500,10 +573,23 @@ def main():
         base_url=args.url,
         output_dir=args.output,
         max_depth=args.depth,
-        delay=args.delay
+        delay=args.delay,
+        resume=args.resume,
+        blob_dir=args.blob_dir,
+        max_memory=int(args.max_memory * 1024 * 1024),
+        html_parser=args.parser,
+        workers=args.workers,
+        recycle_after=args.recycle_after,
+        ready_timeout=args.ready_timeout,
+        resource_policy=policy_from_args(args, urlparse(args.url).netloc),
+        max_scroll_height=args.scroll_max_height,
+        max_scroll_time=args.scroll_max_time
     )
     
-    cloner.clone()
+    try:
+        cloner.clone()
+    except KeyboardInterrupt:
+        print("\n\nInterrupted - progress saved. Run again with --resume to continue.")
 
 
 if __name__ == '__main__':
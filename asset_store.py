@@ -0,0 +1,234 @@
+"""
+Asset Store - Content-addressed blob store for downloaded assets
+Each distinct body is written once under .blobs/<sha256> and hardlinked to every
+local path that serves it, so the same image under several query strings or
+hosts (and across successive runs into the same directory) takes disk space once.
+Bodies are read in chunks and only kept in memory up to a size limit.
+"""
+
+import os
+import codecs
+import shutil
+import hashlib
+import tempfile
+import threading
+
+from requests.compat import chardet
+
+
+# Files that the cloners rewrite in place after download. Those must never be
+# hardlinks, or rewriting one copy would change every other copy of the blob.
+TEXT_TYPES = ('text', 'javascript', 'json', 'xml', 'css', 'svg')
+TEXT_EXTENSIONS = {'.html', '.htm', '.css', '.js', '.mjs', '.json', '.xml', '.svg', '.txt', '.map'}
+
+CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_MEMORY = 1024 * 1024  # Larger bodies are spilled to a temp file
+
+
+class ResponseBody:
+    """Body of a streamed (stream=True) response, read in chunks and hashed on the way
+
+    Up to max_memory bytes are kept in memory; past that the body is spilled to
+    a temp file in spill_dir, so a large video never sits in memory whole. After
+    save_to() a spilled body can still be read back (text()) from its new place.
+    """
+    def __init__(self, response, spill_dir, max_memory=DEFAULT_MAX_MEMORY, chunk_size=CHUNK_SIZE):
+        self.data = bytearray()
+        self.path = None     # File holding the body, once spilled
+        self.owned = False   # True while path is our temp file
+        self.size = 0
+
+        digest = hashlib.sha256()
+        f = None
+        try:
+            for chunk in response.iter_content(chunk_size):
+                digest.update(chunk)
+                self.size += len(chunk)
+
+                if f is None and self.size > max_memory:
+                    os.makedirs(spill_dir, exist_ok=True)
+                    fd, self.path = tempfile.mkstemp(suffix='.part', dir=spill_dir)
+                    self.owned = True
+                    f = os.fdopen(fd, 'wb')
+                    f.write(self.data)
+                    self.data = None
+
+                if f is None:
+                    self.data += chunk
+                else:
+                    f.write(chunk)
+        except BaseException:
+            if f is not None:
+                f.close()
+            self.discard()
+            raise
+
+        if f is not None:
+            f.close()
+        self.sha256 = digest.hexdigest()
+
+    def text(self, encoding=None):
+        """Decode the body the way requests' response.text does"""
+        if encoding is None:
+            # Same guess as response.apparent_encoding, from the first chunk
+            if self.path:
+                with open(self.path, 'rb') as f:
+                    sample = f.read(CHUNK_SIZE)
+            else:
+                sample = bytes(self.data[:CHUNK_SIZE])
+            encoding = chardet.detect(sample)['encoding'] or 'utf-8'
+        try:
+            codecs.lookup(encoding)
+        except LookupError:
+            encoding = 'utf-8'
+
+        if self.path:
+            with open(self.path, 'r', encoding=encoding, errors='replace', newline='') as f:
+                return f.read()
+        return str(self.data, encoding, errors='replace')
+
+    def save_to(self, path):
+        """Move the body to path atomically (temp file + rename)"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.part"
+
+        if self.path:
+            try:
+                os.replace(self.path, path)
+            except OSError:
+                # Spill dir on another filesystem
+                shutil.copyfile(self.path, tmp)
+                os.replace(tmp, path)
+                self.discard()
+            self.path, self.owned = path, False
+        else:
+            with open(tmp, 'wb') as f:
+                f.write(self.data)
+            os.replace(tmp, path)
+
+        return path
+
+    def discard(self):
+        """Remove the spill file, if it was not moved into place"""
+        if self.owned and os.path.exists(self.path):
+            os.remove(self.path)
+        self.owned = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.discard()
+
+
+class AssetStore:
+    def __init__(self, output_dir, blob_dir=None, max_memory=DEFAULT_MAX_MEMORY):
+        # Hardlinks need the blobs on the same filesystem as the mirror
+        self.blob_dir = blob_dir or os.path.join(output_dir, '.blobs')
+        self.spill_dir = os.path.join(output_dir, '.partial')
+        self.max_memory = max_memory
+        self.lock = threading.Lock()
+
+        # Stats
+        self.blobs_written = 0
+        self.shared_files = 0
+        self.shared_bytes = 0
+
+    def shareable(self, local_path, content_type=''):
+        """Binary files that are written once and never edited afterwards"""
+        if any(t in content_type for t in TEXT_TYPES):
+            return False
+        return os.path.splitext(local_path)[1].lower() not in TEXT_EXTENSIONS
+
+    def blob_path(self, digest):
+        return os.path.join(self.blob_dir, digest[:2], digest)
+
+    def read(self, response):
+        """Read a stream=True response into a ResponseBody"""
+        return ResponseBody(response, self.spill_dir, self.max_memory)
+
+    def save(self, local_path, body, content_type=''):
+        """Write body (bytes) to local_path, through the blob store when it is shareable"""
+        os.makedirs(os.path.dirname(local_path) or '.', exist_ok=True)
+
+        if not self.shareable(local_path, content_type):
+            with open(local_path, 'wb') as f:
+                f.write(body)
+            return local_path
+
+        digest = hashlib.sha256(body).hexdigest()
+        blob = self.blob_path(digest)
+
+        if os.path.exists(blob):
+            self._count_shared(len(body))
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            tmp = f"{blob}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(body)
+            os.replace(tmp, blob)
+            with self.lock:
+                self.blobs_written += 1
+
+        return self._link(blob, local_path)
+
+    def save_body(self, local_path, body, content_type=''):
+        """Like save(), for a ResponseBody - moved into place, never copied through memory"""
+        if not self.shareable(local_path, content_type):
+            return body.save_to(local_path)
+
+        blob = self.blob_path(body.sha256)
+
+        if os.path.exists(blob):
+            self._count_shared(body.size)
+        else:
+            body.save_to(blob)
+            with self.lock:
+                self.blobs_written += 1
+
+        os.makedirs(os.path.dirname(local_path) or '.', exist_ok=True)
+        return self._link(blob, local_path)
+
+    def _count_shared(self, size):
+        with self.lock:
+            self.shared_files += 1
+            self.shared_bytes += size
+
+    def _link(self, blob, local_path):
+        # Already linked to this blob by an earlier run - nothing to write
+        if os.path.exists(local_path):
+            if os.path.samefile(blob, local_path):
+                return local_path
+            os.remove(local_path)
+
+        try:
+            os.link(blob, local_path)
+        except FileExistsError:
+            pass  # Another worker saved the same URL first
+        except OSError:
+            # No hardlink support (e.g. FAT, or a blob_dir on another drive)
+            shutil.copyfile(blob, local_path)
+
+        return local_path
+
+    def prune(self):
+        """Delete blobs that no file in any mirror links to anymore"""
+        removed = 0
+        if not os.path.isdir(self.blob_dir):
+            return removed
+
+        for root, _, files in os.walk(self.blob_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.stat(path).st_nlink <= 1:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+        return removed
+
+    def summary(self):
+        """One-line dedup report for the end-of-run summary"""
+        return (f"{self.blobs_written} new blobs, {self.shared_files} duplicate files "
+                f"({self.shared_bytes / 1024 / 1024:.1f} MB) linked to existing blobs")
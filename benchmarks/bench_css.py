@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark - Stylesheet extraction and rewriting
+Times WebsiteCloner's stylesheet path (find URL references, then point them
+at local copies) with the previous separate findall passes and re.sub, and
+with the single css_scan pass whose offsets the rewrite splices into.
+
+Without --css, the stylesheets in stumptown_static and the <style> blocks of
+the saved pages are repeated up to --size MB, the size of a big Shopify
+theme bundle; pass real theme files with --css for the real thing.
+
+Usage: python benchmarks/bench_css.py [--css theme.css ...] [--size 4] [--repeat 3]
+"""
+
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from website_cloner import WebsiteCloner
+from css_scan import find_refs
+
+BASE_URL = 'https://www.stumptowncoffee.com/'
+CSS_URL = BASE_URL + 'cdn/shop/t/410/assets/theme.css'
+STYLE_PATTERN = re.compile(r'<style[^>]*>(.*?)</style>', re.S | re.I)
+
+# The stylesheet path as it was before css_scan
+LEGACY_URL_PATTERN = re.compile(r'url\([\'"]?([^\'")\s]+)[\'"]?\)')
+
+
+def legacy_extract(cloner, css_content, css_url):
+    assets = set()
+    urls = re.findall(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', css_content)
+    imports = re.findall(r'@import\s+[\'"]([^\'"]+)[\'"]', css_content)
+    imports += re.findall(r'@import\s+url\([\'"]?([^\'")\s]+)[\'"]?\)', css_content)
+    font_urls = re.findall(r'src:\s*[^;]*url\([\'"]?([^\'")\s]+)[\'"]?\)', css_content)
+    for url in urls + imports + font_urls:
+        normalized = cloner.normalize_url(url, css_url)
+        if normalized:
+            assets.add(normalized)
+    return assets
+
+
+def legacy_rewrite(cloner, css_content, css_url, refs):
+    def replace_url(match):
+        normalized = cloner.normalize_url(match.group(1), css_url)
+        ref = refs.get(normalized) if normalized else None
+        return f'url("{ref}")' if ref else match.group(0)
+    return LEGACY_URL_PATTERN.subn(replace_url, css_content)[0]
+
+
+def legacy(cloner, css, refs):
+    assets = legacy_extract(cloner, css, CSS_URL)
+    legacy_rewrite(cloner, css, CSS_URL, refs)
+    return assets
+
+
+def scanned(cloner, css, refs):
+    found = find_refs(css)
+    assets = cloner.extract_assets_from_css(css, CSS_URL, found)
+    cloner.rewrite_urls_in_css(css, CSS_URL, refs, found)
+    return assets
+
+
+def sample_css(root, size):
+    """The repo's stylesheets and distinct page <style> blocks, repeated to size bytes"""
+    parts = []
+    for path in sorted(glob.glob(os.path.join(root, 'stumptown_static', '*.css'))):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            parts.append(f.read())
+    for path in sorted(glob.glob(os.path.join(root, 'stumptown_fixed', '*.html'))):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            parts.extend(STYLE_PATTERN.findall(f.read()))
+    chunk = '\n'.join(dict.fromkeys(parts))
+    return (chunk + '\n') * max(1, size // max(1, len(chunk)))
+
+
+def best_of(repeat, run, cloner, css, refs):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        assets = run(cloner, css, refs)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, assets
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Benchmark stylesheet extraction and rewriting')
+    parser.add_argument('--css', nargs='+', default=None,
+                       help='Stylesheets to use (default: the repo CSS, repeated to --size)')
+    parser.add_argument('--size', type=float, default=4,
+                       help='MB of sample CSS when no --css is given (default: 4)')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Runs per implementation; the best time is reported (default: 3)')
+    args = parser.parse_args()
+
+    if args.css:
+        sheets = []
+        for path in args.css:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                sheets.append((os.path.basename(path), f.read()))
+    else:
+        sheets = [(f'sample ({args.size:g} MB)', sample_css(root, int(args.size * 1024 * 1024)))]
+
+    scratch = tempfile.TemporaryDirectory(prefix='bench_css_')
+    cloner = WebsiteCloner(BASE_URL, output_dir=scratch.name)
+
+    print(f"{'stylesheet':<28}{'size':>8}{'refs':>8}  {'scanner':<9}{'time':>10}{'MB/s':>8}")
+    for name, css in sheets:
+        # Every reference resolves, so the rewrite does the most work it can
+        assets = cloner.extract_assets_from_css(css, CSS_URL)
+        refs = {url: f'assets/{i}' for i, url in enumerate(sorted(assets))}
+        mb = len(css.encode('utf-8')) / (1024 * 1024)
+        results = {}
+        for label, run in (('legacy', legacy), ('css_scan', scanned)):
+            elapsed, results[label] = best_of(args.repeat, run, cloner, css, refs)
+            print(f"{name[:27]:<28}{mb:>6.1f}MB{len(find_refs(css)):>8}  {label:<9}"
+                  f"{elapsed * 1000:>8.0f}ms{mb / elapsed:>8.1f}")
+        missed = results['legacy'] - results['css_scan']
+        if missed:
+            print(f"  css_scan skips {len(missed)} URLs legacy found (commented out, or malformed)")
+    scratch.cleanup()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
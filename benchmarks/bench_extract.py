@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Benchmark - HTML asset extraction
+Times WebsiteCloner.extract_assets_from_html (single lxml tree walk) against the
+previous BeautifulSoup extractor, which ran one find_all() pass per tag/attribute,
+on the saved Stumptown pages, and checks both return the same URLs.
+
+Usage: python benchmarks/bench_extract.py [--pages stumptown_fixed] [--repeat 3]
+"""
+
+import os
+import re
+import sys
+import glob
+import time
+import argparse
+import tempfile
+import warnings
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
+from website_cloner import WebsiteCloner
+
+warnings.filterwarnings('ignore', category=XMLParsedAsHTMLWarning)
+
+
+def legacy_extract(cloner, html_content, page_url):
+    """The extractor as it was before html_extract: ~25 find_all() passes"""
+    soup = BeautifulSoup(html_content, 'lxml')
+    assets = set()
+    pages = set()
+
+    tag_attrs = [
+        ('link', 'href'), ('script', 'src'), ('img', 'src'), ('img', 'data-src'), ('img', 'srcset'),
+        ('source', 'src'), ('source', 'srcset'), ('video', 'src'), ('video', 'poster'), ('audio', 'src'),
+        ('iframe', 'src'), ('embed', 'src'), ('object', 'data'), ('use', 'xlink:href'), ('image', 'xlink:href'),
+    ]
+
+    for tag, attr in tag_attrs:
+        for element in soup.find_all(tag):
+            value = element.get(attr)
+            if value:
+                if 'srcset' in attr:
+                    for part in value.split(','):
+                        if part.strip():
+                            url = cloner.normalize_url(part.strip().split()[0], page_url)
+                            if url:
+                                assets.add(url)
+                else:
+                    url = cloner.normalize_url(value, page_url)
+                    if url:
+                        assets.add(url)
+
+    for element in soup.find_all(style=True):
+        for url in re.findall(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', element.get('style', '')):
+            normalized = cloner.normalize_url(url, page_url)
+            if normalized:
+                assets.add(normalized)
+
+    for style_tag in soup.find_all('style'):
+        if style_tag.string:
+            for url in re.findall(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', style_tag.string):
+                normalized = cloner.normalize_url(url, page_url)
+                if normalized:
+                    assets.add(normalized)
+
+    for attr in ['data-background', 'data-bg']:
+        for element in soup.find_all(attrs={attr: True}):
+            url = cloner.normalize_url(element.get(attr), page_url)
+            if url:
+                assets.add(url)
+
+    for a_tag in soup.find_all('a', href=True):
+        url = cloner.normalize_url(a_tag.get('href'), page_url)
+        if url and cloner.is_same_domain(url):
+            ext = os.path.splitext(urlparse(url).path)[1].lower()
+            if not ext or ext in ['.html', '.htm', '.php', '.asp', '.aspx', '']:
+                pages.add(url)
+
+    for link in soup.find_all('link', rel=['canonical', 'alternate']):
+        href = link.get('href')
+        if href:
+            url = cloner.normalize_url(href, page_url)
+            if url and cloner.is_same_domain(url):
+                pages.add(url)
+
+    for meta in soup.find_all('meta', attrs={'http-equiv': 'refresh'}):
+        match = re.search(r'url=([^\s;]+)', meta.get('content', ''), re.I)
+        if match:
+            url = cloner.normalize_url(match.group(1), page_url)
+            if url and cloner.is_same_domain(url):
+                pages.add(url)
+
+    for meta in soup.find_all('meta', attrs={'property': re.compile(r'^og:')}):
+        if 'image' in meta.get('property', '').lower():
+            url = cloner.normalize_url(meta.get('content', ''), page_url)
+            if url:
+                assets.add(url)
+
+    for meta in soup.find_all('meta', attrs={'name': re.compile(r'^twitter:')}):
+        if 'image' in meta.get('name', '').lower():
+            url = cloner.normalize_url(meta.get('content', ''), page_url)
+            if url:
+                assets.add(url)
+
+    return assets, pages
+
+
+def best_of(repeat, fn, docs):
+    """Best wall time over repeat runs of fn across all docs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for html, url in docs:
+            fn(html, url)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Benchmark HTML asset extraction')
+    parser.add_argument('--pages', default=os.path.join(root, 'stumptown_fixed'),
+                       help='Directory of saved .html pages (default: stumptown_fixed)')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Runs per extractor; the best time is reported (default: 3)')
+    args = parser.parse_args()
+
+    base_url = 'https://www.stumptowncoffee.com/'
+    scratch = tempfile.TemporaryDirectory(prefix='bench_extract_')
+    cloner = WebsiteCloner(base_url, output_dir=scratch.name)
+
+    docs = []
+    for path in sorted(glob.glob(os.path.join(args.pages, '*.html'))):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            docs.append((f.read(), base_url + os.path.basename(path)[:-len('.html')]))
+
+    if not docs:
+        print(f"No .html files in {args.pages}")
+        return 1
+
+    total_kb = sum(len(html) for html, _ in docs) / 1024
+    print(f"{len(docs)} pages, {total_kb:.0f} KB of HTML\n")
+
+    # Same output first, then speed
+    mismatches = [url for html, url in docs
+                  if legacy_extract(cloner, html, url) != cloner.extract_assets_from_html(html, url)]
+    if mismatches:
+        print(f"MISMATCH on {len(mismatches)} pages, e.g. {mismatches[0]}")
+
+    legacy = best_of(args.repeat, lambda html, url: legacy_extract(cloner, html, url), docs)
+    single = best_of(args.repeat, cloner.extract_assets_from_html, docs)
+
+    print(f"{'extractor':<28}{'total':>10}{'per page':>12}")
+    print(f"{'BeautifulSoup, find_all x25':<28}{legacy:>9.3f}s{legacy / len(docs) * 1000:>10.1f}ms")
+    print(f"{'lxml, single pass':<28}{single:>9.3f}s{single / len(docs) * 1000:>10.1f}ms")
+    print(f"\nSpeedup: {legacy / single:.1f}x" + ("" if mismatches else " (identical results)"))
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
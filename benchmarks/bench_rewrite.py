@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark - HTML parse, extraction and rewriting backends
+Runs WebsiteCloner's page path (parse once, extract assets, rewrite URLs,
+serialize) on the saved Stumptown pages with the BeautifulSoup and the lxml
+backend, and checks both write the same bytes.
+
+Usage: python benchmarks/bench_rewrite.py [--pages stumptown_fixed] [--repeat 3]
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import XMLParsedAsHTMLWarning
+from website_cloner import WebsiteCloner
+from html_rewrite import parse, BACKENDS
+
+warnings.filterwarnings('ignore', category=XMLParsedAsHTMLWarning)
+
+
+def process(cloner, html, url):
+    """What WebsiteCloner.process_page does with a downloaded page"""
+    document = parse(html, cloner.html_parser)
+    cloner.extract_assets_from_html(document, url)
+    return cloner.rewrite_urls_in_html(document, url)
+
+
+def best_of(repeat, cloner, docs):
+    """Best wall time over repeat runs across all docs"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for html, url in docs:
+            process(cloner, html, url)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Benchmark the HTML backends')
+    parser.add_argument('--pages', default=os.path.join(root, 'stumptown_fixed'),
+                       help='Directory of saved .html pages (default: stumptown_fixed)')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Runs per backend; the best time is reported (default: 3)')
+    args = parser.parse_args()
+
+    base_url = 'https://www.stumptowncoffee.com/'
+    scratch = tempfile.TemporaryDirectory(prefix='bench_rewrite_')
+    cloners = {backend: WebsiteCloner(base_url, output_dir=os.path.join(scratch.name, backend),
+                                      html_parser=backend)
+               for backend in BACKENDS}
+
+    docs = []
+    for path in sorted(glob.glob(os.path.join(args.pages, '*.html'))):
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            docs.append((f.read(), base_url + os.path.basename(path)[:-len('.html')]))
+
+    if not docs:
+        print(f"No .html files in {args.pages}")
+        return 1
+
+    total_kb = sum(len(html) for html, _ in docs) / 1024
+    print(f"{len(docs)} pages, {total_kb:.0f} KB of HTML\n")
+
+    # Same output first, then speed
+    mismatches = [url for html, url in docs
+                  if process(cloners['bs4'], html, url) != process(cloners['lxml'], html, url)]
+    if mismatches:
+        print(f"MISMATCH on {len(mismatches)} pages, e.g. {mismatches[0]}")
+
+    times = {backend: best_of(args.repeat, cloners[backend], docs) for backend in ('bs4', 'lxml')}
+
+    print(f"{'backend':<12}{'total':>10}{'per page':>12}")
+    for backend, elapsed in times.items():
+        print(f"{backend:<12}{elapsed:>9.3f}s{elapsed / len(docs) * 1000:>10.1f}ms")
+    print(f"\nSpeedup: {times['bs4'] / times['lxml']:.1f}x" + ("" if mismatches else " (identical output)"))
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Benchmark - FullRenderCloner computed-style capture
+Loads a saved page in Chromium and times the style script the way
+FullRenderCloner runs it: the previous version (a querySelector per cloned
+element), and STYLE_SCRIPT in its inline and classes modes. Reports time in
+page.evaluate and the size of the HTML pulled back over CDP. --copies repeats
+the page body to see how each one scales with DOM size.
+
+Needs Playwright and Chromium: pip install playwright && playwright install chromium
+
+Usage: python benchmarks/bench_styles.py [--page stumptown_fixed/medium-roast-coffee.html] [--copies 1 4] [--repeat 3]
+"""
+
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from playwright.async_api import async_playwright
+from full_render_cloner import STYLE_SCRIPT, STYLE_MODES
+
+# The script as it was before STYLE_SCRIPT: one querySelector per cloned element
+LEGACY_SCRIPT = '''() => {
+    const clone = document.cloneNode(true);
+    const elements = clone.querySelectorAll('*');
+    elements.forEach(el => {
+        if (el.tagName === 'SCRIPT' || el.tagName === 'NOSCRIPT') {
+            el.remove();
+            return;
+        }
+        try {
+            const origEl = document.querySelector(
+                el.tagName.toLowerCase() +
+                (el.id ? '#' + CSS.escape(el.id) : '') +
+                (el.className && typeof el.className === 'string' ?
+                    '.' + el.className.split(' ').filter(c => c).map(c => CSS.escape(c)).join('.') : '')
+            );
+            if (origEl) {
+                const computed = window.getComputedStyle(origEl);
+                const criticalProps = [
+                    'display', 'position', 'top', 'left', 'right', 'bottom',
+                    'width', 'height', 'max-width', 'max-height', 'min-width', 'min-height',
+                    'margin', 'padding', 'border', 'border-radius',
+                    'background', 'background-color', 'background-image', 'background-size', 'background-position',
+                    'color', 'font-family', 'font-size', 'font-weight', 'line-height', 'text-align',
+                    'flex', 'flex-direction', 'justify-content', 'align-items', 'gap',
+                    'grid', 'grid-template-columns', 'grid-template-rows',
+                    'overflow', 'opacity', 'visibility', 'z-index',
+                    'transform', 'box-shadow', 'text-shadow'
+                ];
+                let inlineStyle = '';
+                criticalProps.forEach(prop => {
+                    const value = computed.getPropertyValue(prop);
+                    if (value && value !== 'none' && value !== 'auto' && value !== 'normal' && value !== '0px') {
+                        inlineStyle += `${prop}:${value};`;
+                    }
+                });
+                if (inlineStyle) {
+                    el.setAttribute('style', (el.getAttribute('style') || '') + inlineStyle);
+                }
+            }
+        } catch(e) {}
+    });
+    clone.querySelectorAll('script').forEach(s => s.remove());
+    clone.querySelectorAll('noscript').forEach(s => s.remove());
+    return clone.documentElement.outerHTML;
+}'''
+
+REPEAT_BODY = '''(copies) => {
+    const body = document.body.innerHTML;
+    document.body.innerHTML = body.repeat(copies);
+    return document.querySelectorAll('*').length;
+}'''
+
+
+async def measure(page, script, arg, repeat):
+    """Best time over repeat runs, and the HTML size of the last one"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await page.evaluate(script, arg) if arg is not None else await page.evaluate(script)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    html = result if isinstance(result, str) else result['html']
+    return best, len(html)
+
+
+async def run(args):
+    with open(args.page, 'r', encoding='utf-8', errors='replace') as f:
+        html = f.read()
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch()
+        page = await browser.new_page(viewport={'width': 1920, 'height': 1080})
+        # Scripts off: the saved page is measured as it was rendered, not re-rendered
+        await page.route('**/*.js*', lambda route: route.abort())
+
+        print(f"{os.path.basename(args.page)}\n")
+        print(f"{'elements':>9}  {'script':<10}{'time':>10}{'html':>12}")
+        for copies in args.copies:
+            await page.set_content(html, wait_until='load')
+            elements = await page.evaluate(REPEAT_BODY, copies)
+
+            runs = [('legacy', LEGACY_SCRIPT, None)] + [(mode, STYLE_SCRIPT, mode) for mode in STYLE_MODES]
+            for name, script, arg in runs:
+                elapsed, size = await measure(page, script, arg, args.repeat)
+                print(f"{elements:>9}  {name:<10}{elapsed * 1000:>8.0f}ms{size / 1024:>10.0f}KB")
+            print()
+
+        await browser.close()
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description='Benchmark FullRenderCloner style capture')
+    parser.add_argument('--page', default=os.path.join(root, 'stumptown_fixed', 'medium-roast-coffee.html'),
+                       help='Saved page to load (default: the heaviest collection page, medium-roast-coffee)')
+    parser.add_argument('--copies', type=int, nargs='+', default=[1, 4],
+                       help='Times the page body is repeated, one run each (default: 1 4)')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Runs per script; the best time is reported (default: 3)')
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Check - Frontier depths through the browser pool's workers
+Runs BrowserPool's worker loop on a stub browser over a small link graph, with
+visit() written the way the browser cloners write it, and checks that a page
+first reached through a longer path is re-expanded from its shorter one:
+
+    S -> L1 -> L2 -> D,  S -> C (slow) -> D,  D -> E    (max depth 3)
+
+D is rendered at depth 3 (via L2) before C finishes, which drops E at depth 4;
+once C reaches D at depth 2, E has to be crawled at depth 3. The same graph is
+also run with the old visit(), which filtered out visited pages, to show the
+check fails without the fix. A last run checks the visible cloner's cap on
+new links per page.
+
+Usage: python benchmarks/check_frontier.py [--slow 0.3]
+"""
+
+import os
+import sys
+import asyncio
+import argparse
+from collections import deque
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from browser_pool import BrowserPool, Frontier
+
+GRAPH = {
+    'S': ['L1', 'C'],
+    'L1': ['L2'],
+    'L2': ['D'],
+    'C': ['D'],
+    'D': ['E'],
+    'E': [],
+}
+
+
+class StubPage:
+    def __init__(self, graph, delays):
+        self.graph = graph
+        self.delays = delays
+        self.links = ()
+
+    async def goto(self, url, **kwargs):
+        await asyncio.sleep(self.delays.get(url, 0.01))
+        self.links = list(self.graph.get(url, ()))
+
+    def is_closed(self):
+        return False
+
+
+class StubContext:
+    def __init__(self, graph, delays):
+        self.graph = graph
+        self.delays = delays
+
+    async def new_page(self):
+        return StubPage(self.graph, self.delays)
+
+    async def close(self):
+        pass
+
+
+class StubBrowser:
+    def __init__(self, graph, delays):
+        self.graph = graph
+        self.delays = delays
+
+    async def new_context(self, **options):
+        return StubContext(self.graph, self.delays)
+
+
+class StubCloner:
+    """The crawl state and visit() of a browser cloner, without the saving"""
+    def __init__(self, max_depth, filter_visited=False, max_links=None):
+        self.pages_to_visit = deque([('S', 0)])
+        self.visited_urls = set()
+        self.max_depth = max_depth
+        self.max_links = max_links
+        self.filter_visited = filter_visited
+        self.depths = {}
+
+    async def visit(self, page, url, depth):
+        await page.goto(url)
+        self.depths[url] = depth
+        if self.filter_visited:
+            # What the cloners did before: already visited pages never reach the frontier
+            return [link for link in page.links if link not in self.visited_urls]
+        return page.links
+
+    def crawl(self, graph, delays):
+        frontier = Frontier(self.pages_to_visit, self.visited_urls, self.max_depth, max_links=self.max_links)
+        asyncio.run(BrowserPool(workers=2).crawl_with(StubBrowser(graph, delays), frontier, self.visit))
+        return self.depths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check that the frontier keeps each page at its smallest depth')
+    parser.add_argument('--slow', type=float, default=0.3, help='Seconds page C takes to render (default: 0.3)')
+    args = parser.parse_args()
+
+    delays = {'C': args.slow}
+    failures = 0
+
+    depths = StubCloner(max_depth=3).crawl(GRAPH, delays)
+    ok = depths.get('E') == 3 and depths.get('D') == 3
+    failures += not ok
+    print(f"[{'OK' if ok else 'FAIL'}] visit() returns every link: {sorted(depths.items())}")
+
+    depths = StubCloner(max_depth=3, filter_visited=True).crawl(GRAPH, delays)
+    ok = 'E' not in depths
+    failures += not ok
+    print(f"[{'OK' if ok else 'FAIL'}] old visit() drops E: {sorted(depths.items())}")
+
+    wide = {'S': [f'P{i:02d}' for i in range(40)]}
+    depths = StubCloner(max_depth=1, max_links=15).crawl(wide, {})
+    ok = len(depths) == 16
+    failures += not ok
+    print(f"[{'OK' if ok else 'FAIL'}] max_links=15 follows 15 of 40 new links: {len(depths) - 1} followed")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Load test - Requests per second and latency percentiles for a local server
+Opens --connections client threads, each with its own keep-alive connection,
+and has them request the site's pages, stylesheets and scripts round-robin for
+--duration seconds. --revalidate sends back each file's ETag, the way a
+browser reloading the page does, so the run measures 304s instead of full
+bodies; --accept-encoding 'br, gzip' asks for precompressed variants.
+
+Start the server first (python serve.py --quiet --no-browser), then:
+
+Usage: python benchmarks/loadtest.py [--url http://localhost:8080] [--connections 16] [--duration 10] [--revalidate]
+                                  [--accept-encoding 'br, gzip']
+"""
+
+import os
+import sys
+import time
+import math
+import argparse
+import threading
+import http.client
+from collections import Counter
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SITE_EXTENSIONS = ('.html', '.css', '.js', '.svg')
+
+
+def site_paths(directory):
+    """URL paths of the pages, stylesheets and scripts at the top of a site directory"""
+    return ['/' + name for name in sorted(os.listdir(directory))
+            if name.endswith(SITE_EXTENSIONS) and os.path.isfile(os.path.join(directory, name))]
+
+
+def client(host, port, paths, offset, revalidate, accept_encoding, stop_at, results):
+    """One keep-alive connection; appends (latency, status, bytes) per request to results"""
+    connection = http.client.HTTPConnection(host, port, timeout=30)
+    etags = {}
+    i = offset
+    while time.perf_counter() < stop_at:
+        path = paths[i % len(paths)]
+        i += 1
+        headers = {'Accept-Encoding': accept_encoding}
+        if revalidate and path in etags:
+            headers['If-None-Match'] = etags[path]
+        start = time.perf_counter()
+        try:
+            connection.request('GET', path, headers=headers)
+            response = connection.getresponse()
+            body = response.read()
+        except (OSError, http.client.HTTPException):
+            results.append((time.perf_counter() - start, 'error', 0))
+            connection.close()
+            continue
+        results.append((time.perf_counter() - start, response.status, len(body)))
+        etag = response.getheader('ETag')
+        if etag:
+            etags[path] = etag
+    connection.close()
+
+
+def percentile(ordered, fraction):
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test a local static server')
+    parser.add_argument('--url', default='http://localhost:8080',
+                       help='Server to test (default: http://localhost:8080)')
+    parser.add_argument('--site', default=os.path.join(ROOT, 'stumptown_static'),
+                       help='Directory whose top-level pages, CSS and JS are requested (default: stumptown_static)')
+    parser.add_argument('--paths', nargs='+', default=None,
+                       help='Request these paths instead of the files in --site')
+    parser.add_argument('-c', '--connections', type=int, default=16,
+                       help='Concurrent keep-alive connections (default: 16)')
+    parser.add_argument('-d', '--duration', type=float, default=10,
+                       help='Seconds to run (default: 10)')
+    parser.add_argument('--revalidate', action='store_true',
+                       help="Send each file's ETag back (If-None-Match), like a browser reload")
+    parser.add_argument('--accept-encoding', default='identity',
+                       help="Accept-Encoding to send, e.g. 'br, gzip' for precompressed variants (default: identity)")
+    args = parser.parse_args()
+
+    target = urlsplit(args.url)
+    paths = args.paths or site_paths(args.site)
+    if not paths:
+        print(f"No pages, stylesheets or scripts found in {args.site}")
+        return 1
+
+    results = []
+    stop_at = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=client, daemon=True,
+                                args=(target.hostname, target.port or 80, paths,
+                                      n * len(paths) // args.connections, args.revalidate, args.accept_encoding,
+                                      stop_at, results))
+               for n in range(args.connections)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    if not results:
+        print("No requests completed")
+        return 1
+    latencies = sorted(latency for latency, _, _ in results)
+    statuses = Counter(status for _, status, _ in results)
+    transferred = sum(size for _, _, size in results)
+
+    print(f"{args.url}: {len(paths)} paths, {args.connections} connections, {elapsed:.1f}s"
+          f"{' (revalidating)' if args.revalidate else ''}, Accept-Encoding: {args.accept_encoding}")
+    print(f"  requests   {len(results)}  ({', '.join(f'{status}: {n}' for status, n in sorted(statuses.items(), key=str))})")
+    print(f"  req/s      {len(results) / elapsed:.0f}")
+    print(f"  transfer   {transferred / elapsed / (1024 * 1024):.1f} MB/s")
+    print(f"  latency    p50 {percentile(latencies, 0.50) * 1000:.1f}ms   p90 {percentile(latencies, 0.90) * 1000:.1f}ms"
+          f"   p99 {percentile(latencies, 0.99) * 1000:.1f}ms   max {latencies[-1] * 1000:.1f}ms")
+    return 0 if 'error' not in statuses else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
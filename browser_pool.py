@@ -0,0 +1,194 @@
+"""
+Browser Pool - Several Playwright pages rendering one crawl frontier at once
+One Chromium is launched and each worker gets its own browser context and
+page. Workers take (url, depth) items from a shared Frontier, so a slow page
+only holds up its own worker. A worker's context is closed and reopened after
+recycle_after navigations (or when its page crashed) to keep memory flat.
+"""
+
+import asyncio
+from collections import deque
+
+try:
+    from playwright.async_api import async_playwright
+except ImportError:
+    async_playwright = None  # Checked in BrowserPool.run()
+
+
+DEFAULT_WORKERS = 4
+DEFAULT_RECYCLE_AFTER = 50
+DEFAULT_CONTEXT = {
+    'viewport': {'width': 1920, 'height': 1080},
+    'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+}
+
+
+class Frontier:
+    """Crawl queue shared by the pool's workers
+
+    queue and seen may be a cloner's own pages_to_visit deque and visited_urls
+    set, so its checkpoints keep working. Items deeper than max_depth or
+    already seen are skipped. next() returns None once the queue is empty and
+    no worker is still on a page that could add to it.
+
+    Workers finish in any order, so a page can be reached first through a
+    longer path. Each URL keeps the smallest depth it was found at; when a
+    shorter path turns up for a page that is already rendered, its links are
+    queued again from the new depth (they are kept for that), so max_depth
+    never cuts off a page that is within reach. For that, visit() has to return
+    every link a page has, including pages already seen, and leave the
+    deduplication to the frontier.
+
+    max_links caps how many links a page adds that were not known yet; links to
+    known pages are always kept, so their depths can still improve.
+    """
+    def __init__(self, queue=None, seen=None, max_depth=None, max_links=None):
+        self.queue = queue if queue is not None else deque()
+        self.seen = seen if seen is not None else set()
+        self.max_depth = max_depth
+        self.max_links = max_links
+        self.in_flight = {}  # url -> depth, pages being rendered right now
+        self.depths = {}     # url -> smallest depth found at
+        self.links = {}      # url -> links of a rendered page (only kept with a max_depth)
+        for url, depth in self.queue:
+            self.depths[url] = min(depth, self.depths.get(url, depth))
+        self.changed = asyncio.Condition()
+
+    def add(self, url, depth):
+        pending = [(url, depth)]
+        while pending:
+            url, depth = pending.pop()
+            if self.max_depth is not None and depth > self.max_depth:
+                continue
+            best = self.depths.get(url)
+            if best is not None and best <= depth:
+                continue
+            if best is None and url in self.seen:
+                continue  # Rendered before a resume; its depth is not known
+            self.depths[url] = depth
+            if url in self.links:
+                # Rendered already, from further away: its links are now closer too
+                pending.extend((link, depth + 1) for link in self.links[url])
+            elif url not in self.seen:
+                self.queue.append((url, depth))
+            # In flight: done() queues its links from the new depth
+
+    async def next(self):
+        async with self.changed:
+            while True:
+                while self.queue:
+                    url, depth = self.queue.popleft()
+                    if url in self.seen or depth > self.depths.get(url, depth):
+                        continue  # Done, or queued again closer to the start
+                    if self.max_depth is not None and depth > self.max_depth:
+                        continue
+                    self.seen.add(url)
+                    self.in_flight[url] = depth
+                    return url, depth
+                if not self.in_flight:
+                    self.changed.notify_all()  # Wake the other idle workers so they finish too
+                    return None
+                await self.changed.wait()
+
+    async def done(self, url, links=()):
+        """A page is finished; queue the links it found one level deeper"""
+        async with self.changed:
+            depth = self.in_flight.pop(url)
+            depth = min(depth, self.depths.get(url, depth))
+            links = self.follow(links)
+            if self.max_depth is not None:
+                self.links[url] = links
+            for link in links:
+                self.add(link, depth + 1)
+            self.changed.notify_all()
+
+    def follow(self, links):
+        """The links of a finished page that are followed: all known pages, plus
+        the first max_links that are new"""
+        if self.max_links is None:
+            return tuple(links)
+        kept, new = [], 0
+        for link in dict.fromkeys(links):
+            if link not in self.depths and link not in self.seen:
+                if new >= self.max_links:
+                    continue
+                new += 1
+            kept.append(link)
+        return tuple(kept)
+
+    def pending(self):
+        """(url, depth) of pages in progress, for checkpoints: they have to be done again"""
+        return list(self.in_flight.items())
+
+
+class BrowserPool:
+    def __init__(self, workers=DEFAULT_WORKERS, recycle_after=DEFAULT_RECYCLE_AFTER,
+                 launch_options=None, context_options=None, on_page=None, resource_policy=None):
+        """workers: pages rendering at once; recycle_after: navigations before a
+        worker's context is replaced; on_page(page) is called for every new page,
+        e.g. to attach response handlers; resource_policy (a ResourcePolicy)
+        decides what every page may load"""
+        self.workers = max(1, workers)
+        self.recycle_after = max(1, recycle_after)
+        self.launch_options = dict(launch_options or {'headless': True})
+        self.context_options = dict(DEFAULT_CONTEXT, **(context_options or {}))
+        self.on_page = on_page
+        self.resource_policy = resource_policy
+        self.recycled = 0
+
+    def run(self, frontier, visit):
+        """Render the whole frontier; visit is `async def visit(page, url, depth)` returning new links"""
+        if async_playwright is None:
+            raise RuntimeError("Browser pool requires Playwright: pip install playwright && playwright install chromium")
+        return asyncio.run(self.crawl(frontier, visit))
+
+    async def crawl(self, frontier, visit):
+        async with async_playwright() as p:
+            browser = await p.chromium.launch(**self.launch_options)
+            try:
+                await self.crawl_with(browser, frontier, visit)
+            finally:
+                await browser.close()
+
+    async def crawl_with(self, browser, frontier, visit):
+        """Run the workers on an already launched browser"""
+        await asyncio.gather(*(self.worker(browser, frontier, visit) for _ in range(self.workers)))
+
+    async def open_page(self, browser):
+        context = await browser.new_context(**self.context_options)
+        page = await context.new_page()
+        if self.resource_policy is not None:
+            await self.resource_policy.attach(page)
+        if self.on_page:
+            result = self.on_page(page)
+            if asyncio.iscoroutine(result):
+                await result
+        return context, page
+
+    async def worker(self, browser, frontier, visit):
+        context = page = None
+        navigations = 0
+        try:
+            while True:
+                item = await frontier.next()
+                if item is None:
+                    return
+                url, depth = item
+
+                links = ()
+                try:
+                    if page is None or navigations >= self.recycle_after or page.is_closed():
+                        if context is not None:
+                            await context.close()
+                            self.recycled += 1
+                        context, page = await self.open_page(browser)
+                        navigations = 0
+                    navigations += 1
+                    links = await visit(page, url, depth) or ()
+                except Exception as e:
+                    print(f"[FAIL] {url[:50]}... - {str(e)[:40]}")
+                finally:
+                    await frontier.done(url, links)
+        finally:
+            if context is not None:
+                await context.close()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Build Assets - Fingerprinted, long-cache build of the static site
+Copies a site to an output directory and gives each stylesheet, script, image
+and font a page references a content-hashed copy (cart.js -> cart.3f9a1c2e.js).
+The pages are pointed at the hashed names, which can then be cached for a
+year: a file that changes gets a new name. Pages are rewritten by html_rewrite
+from the ExtractRules table below, as in the cloners, and url()s in stylesheets
+and inline styles by css_scan. A stylesheet is rewritten before it is hashed,
+so a changed image renames the stylesheets that use it too.
+
+The original files stay in place for URLs that JavaScript builds at runtime
+(products-data.js, the service worker). asset-manifest.json maps each original
+path to its hashed one; static_server sends the hashed files as immutable.
+
+Usage: python build_assets.py [stumptown_static] [-o stumptown_dist] [--precompress]
+"""
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+import argparse
+import posixpath
+from urllib.parse import urlsplit, urlunsplit
+
+from html_extract import ExtractRules, URL, SRCSET, CSS
+from html_rewrite import rewrite_html, DEFAULT_BACKEND
+from css_scan import find_refs, splice_refs
+from precompress import precompress_tree, summary
+from static_server import MANIFEST_NAME
+
+
+HASH_LENGTH = 8
+FINGERPRINT_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.svg', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.avif', '.ico',
+    '.woff', '.woff2', '.ttf', '.otf', '.eot', '.mp4', '.webm',
+}
+KEEP_NAMES = {'sw.js'}  # A service worker's URL is its identity; it must not move
+
+# References that point at assets; <a href> and other page links keep their names
+REWRITE_RULES = ExtractRules(
+    tag_attrs=[
+        ('link', 'href', URL),
+        ('script', 'src', URL),
+        ('img', 'src', URL),
+        ('img', 'data-src', URL),
+        ('img', 'srcset', SRCSET),
+        ('source', 'src', URL),
+        ('source', 'srcset', SRCSET),
+        ('video', 'src', URL),
+        ('video', 'poster', URL),
+        ('audio', 'src', URL),
+        ('meta', 'content', URL, lambda a: 'image' in a.get('property', '') or 'image' in a.get('name', '')),
+    ],
+    any_attrs=[('style', CSS)],
+    text_tags={'style': CSS},
+)
+
+
+def hashed_name(rel_path, body):
+    root, ext = posixpath.splitext(rel_path)
+    return f"{root}.{hashlib.sha256(body).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+class AssetBuilder:
+    def __init__(self, source_dir, output_dir, html_parser=DEFAULT_BACKEND):
+        self.source_dir = os.path.abspath(source_dir)
+        self.output_dir = os.path.abspath(output_dir)
+        self.html_parser = html_parser
+        self.manifest = {}      # Original path -> hashed path, both relative to the site root
+        self.in_progress = set()  # Stylesheets being hashed, to break @import cycles
+        self.pages_rewritten = 0
+        self.refs_rewritten = 0
+
+    def prepare_output(self):
+        """Start from a fresh copy of the source; only an earlier build (or an empty directory) is replaced"""
+        if os.path.isdir(self.output_dir) and os.listdir(self.output_dir):
+            if not os.path.exists(os.path.join(self.output_dir, MANIFEST_NAME)):
+                raise RuntimeError(f"{self.output_dir} is not empty and is not an earlier build; not replacing it")
+            shutil.rmtree(self.output_dir)
+        shutil.copytree(self.source_dir, self.output_dir, dirs_exist_ok=True,
+                        ignore=shutil.ignore_patterns('*.br', '*.gz', '.*'))
+
+    def resolve(self, value, base_dir):
+        """(site path, query and fragment) of an asset reference made from base_dir, or (None, None)"""
+        parts = urlsplit(value.strip())
+        if parts.scheme or parts.netloc or not parts.path:
+            return None, None  # External, data:, or just a fragment
+        path = parts.path if parts.path.startswith('/') else posixpath.join('/' + base_dir, parts.path)
+        path = posixpath.normpath(path).lstrip('/')
+        if path.startswith('..') or not os.path.isfile(os.path.join(self.output_dir, path)):
+            return None, None
+        return path, (parts.query, parts.fragment)
+
+    def fingerprint(self, path):
+        """Hashed path of a site file, creating it on first use; None if the file keeps its name"""
+        if path in self.manifest:
+            return self.manifest[path]
+        ext = posixpath.splitext(path)[1].lower()
+        if ext not in FINGERPRINT_EXTENSIONS or posixpath.basename(path) in KEEP_NAMES:
+            return None
+        if path in self.in_progress:
+            return None
+
+        with open(os.path.join(self.output_dir, path), 'rb') as f:
+            body = f.read()
+        if ext == '.css':
+            self.in_progress.add(path)
+            try:
+                css = body.decode('utf-8', errors='surrogateescape')
+                css = self.rewrite_css(css, posixpath.dirname(path))
+                body = css.encode('utf-8', errors='surrogateescape')
+            finally:
+                self.in_progress.discard(path)
+
+        hashed = hashed_name(path, body)
+        with open(os.path.join(self.output_dir, hashed), 'wb') as f:
+            f.write(body)
+        self.manifest[path] = hashed
+        return hashed
+
+    def hashed_ref(self, value, base_dir):
+        """value pointed at the hashed copy of what it references, or None to leave it"""
+        path, extra = self.resolve(value, base_dir)
+        if path is None:
+            return None
+        hashed = self.fingerprint(path)
+        if hashed is None:
+            return None
+        if value.strip().startswith('/'):
+            new_path = '/' + hashed
+        else:
+            new_path = posixpath.relpath(hashed, base_dir or '.')
+        self.refs_rewritten += 1
+        return urlunsplit(('', '', new_path, *extra))
+
+    def rewrite_css(self, css, base_dir):
+        def replace_url(kind, value):
+            return self.hashed_ref(value, base_dir)
+        return splice_refs(css, find_refs(css), replace_url)[0]
+
+    def rewrite_page(self, path):
+        file_path = os.path.join(self.output_dir, path)
+        with open(file_path, 'r', encoding='utf-8', errors='surrogateescape') as f:
+            html = f.read()
+        base_dir = posixpath.dirname(path)
+        before = self.refs_rewritten
+
+        def rewrite_url(value):
+            return self.hashed_ref(value, base_dir)
+
+        def rewrite_css(css):
+            return self.rewrite_css(css, base_dir)
+
+        html = rewrite_html(html, REWRITE_RULES, {URL: rewrite_url, CSS: rewrite_css}, self.html_parser)
+        if self.refs_rewritten == before:
+            return  # Nothing to point elsewhere; keep the page byte for byte
+        with open(file_path, 'w', encoding='utf-8', errors='surrogateescape') as f:
+            f.write(html)
+        self.pages_rewritten += 1
+
+    def pages(self):
+        for directory, dirs, files in os.walk(self.output_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                if name.endswith(('.html', '.htm')):
+                    yield os.path.relpath(os.path.join(directory, name), self.output_dir).replace(os.sep, '/')
+
+    def build(self):
+        self.prepare_output()
+        for path in list(self.pages()):
+            self.rewrite_page(path)
+        with open(os.path.join(self.output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(dict(sorted(self.manifest.items())), f, indent=2)
+            f.write('\n')
+        return self.manifest
+
+    def summary(self):
+        return (f"{len(self.manifest)} assets fingerprinted, {self.refs_rewritten} references "
+                f"in {self.pages_rewritten} pages and their stylesheets rewritten")
+
+
+def main():
+    root = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Build the static site with content-hashed asset names')
+    parser.add_argument('source', nargs='?', default=os.path.join(root, 'stumptown_static'),
+                       help='Site to build (default: stumptown_static)')
+    parser.add_argument('-o', '--output', default=os.path.join(root, 'stumptown_dist'),
+                       help='Build directory, replaced on each build (default: stumptown_dist)')
+    parser.add_argument('--precompress', action='store_true',
+                       help='Also write .br/.gz copies of the built files (see precompress.py)')
+    args = parser.parse_args()
+
+    builder = AssetBuilder(args.source, args.output)
+    try:
+        builder.build()
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        return 1
+    print(f"Built {args.output}: {builder.summary()}")
+    print(f"Manifest: {os.path.join(args.output, MANIFEST_NAME)}")
+    if args.precompress:
+        print(f"Precompressed: {summary(*precompress_tree(args.output))}")
+    print(f"\nServe it with: python serve.py --directory {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""
+Crawl State - On-disk frontier and checkpoint store shared by the cloners
+Keeps visited URLs, local paths, failures and the page queue in SQLite (WAL mode)
+so an interrupted run can continue where it stopped with --resume
+"""
+
+import os
+import json
+import time
+import sqlite3
+
+
+class CrawlState:
+    def __init__(self, output_dir, filename='.crawl_state.sqlite', checkpoint_every=25):
+        self.path = os.path.join(output_dir, filename)
+        self.checkpoint_every = checkpoint_every
+        self.conn = None
+        self._ticks = 0
+        # What the last checkpoint wrote, so the next one only writes the difference
+        self._saved_sets = {}
+        self._saved_maps = {}
+
+    def open(self, resume=False):
+        """Open the store. Without resume, any state from a previous run is discarded.
+
+        Returns True when there is a checkpoint to resume from.
+        """
+        if not resume:
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self._saved_sets = {}
+        self._saved_maps = {}
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS sets (
+                name TEXT NOT NULL, url TEXT NOT NULL, PRIMARY KEY (name, url)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS maps (
+                name TEXT NOT NULL, key TEXT NOT NULL, value TEXT, PRIMARY KEY (name, key)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS frontier (
+                seq INTEGER PRIMARY KEY, url TEXT NOT NULL, depth INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY, value TEXT
+            );
+        ''')
+        self.conn.commit()
+
+        return resume and self.get_meta('saved_at') is not None
+
+    def get_meta(self, key, default=None):
+        row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def due(self):
+        """Count one unit of work; True every checkpoint_every calls"""
+        self._ticks += 1
+        if self._ticks >= self.checkpoint_every:
+            self._ticks = 0
+            return True
+        return False
+
+    def save(self, sets=None, maps=None, frontier=None, meta=None):
+        """Write a checkpoint in a single transaction
+
+        sets:     {name: iterable of URLs}
+        maps:     {name: {key: JSON-serialisable value}}
+        frontier: iterable of (url, depth) in queue order
+        meta:     {key: str}
+
+        Sets and maps are passed whole, but only entries added, changed or removed
+        since the last checkpoint are written; the frontier is rewritten each time.
+        """
+        saved_sets, saved_maps = {}, {}
+        with self.conn:
+            for name, urls in (sets or {}).items():
+                urls = set(urls)
+                saved = self._saved_sets.get(name)
+                if saved is None:
+                    saved = self.load_set(name)
+                self.conn.executemany('DELETE FROM sets WHERE name = ? AND url = ?',
+                                      ((name, url) for url in saved - urls))
+                self.conn.executemany('INSERT OR IGNORE INTO sets (name, url) VALUES (?, ?)',
+                                      ((name, url) for url in urls - saved))
+                saved_sets[name] = urls
+
+            for name, mapping in (maps or {}).items():
+                mapping = dict(mapping)
+                saved = self._saved_maps.get(name)
+                saved = self.load_map(name) if saved is None else dict(saved)
+                changed = {key: json.dumps(value) for key, value in mapping.items()
+                           if key not in saved or saved[key] != value}
+                self.conn.executemany('DELETE FROM maps WHERE name = ? AND key = ?',
+                                      ((name, key) for key in saved.keys() - mapping.keys()))
+                self.conn.executemany('INSERT OR REPLACE INTO maps (name, key, value) VALUES (?, ?, ?)',
+                                      ((name, key, value) for key, value in changed.items()))
+                # Keep decoded copies, so values the caller mutates later still compare as changed
+                for key in saved.keys() - mapping.keys():
+                    del saved[key]
+                saved.update((key, json.loads(value)) for key, value in changed.items())
+                saved_maps[name] = saved
+
+            if frontier is not None:
+                self.conn.execute('DELETE FROM frontier')
+                self.conn.executemany('INSERT INTO frontier (seq, url, depth) VALUES (?, ?, ?)',
+                                      ((seq, url, depth) for seq, (url, depth) in enumerate(frontier)))
+
+            meta = dict(meta or {})
+            meta['saved_at'] = str(time.time())
+            self.conn.executemany('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', meta.items())
+
+        # Only once the transaction has committed
+        self._saved_sets.update(saved_sets)
+        self._saved_maps.update(saved_maps)
+
+    def load_set(self, name):
+        return {row[0] for row in self.conn.execute('SELECT url FROM sets WHERE name = ?', (name,))}
+
+    def load_map(self, name):
+        return {key: json.loads(value)
+                for key, value in self.conn.execute('SELECT key, value FROM maps WHERE name = ?', (name,))}
+
+    def load_frontier(self):
+        """Saved queue as a list of (url, depth), in the original order"""
+        return [(url, depth) for url, depth in self.conn.execute('SELECT url, depth FROM frontier ORDER BY seq')]
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
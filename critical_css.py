@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Critical CSS - Inline above-the-fold CSS into saved pages and defer the rest
+A post-processing stage for a cloned site (website_cloner, smart_cloner, ...)
+or stumptown_static. Each page is rendered in Chromium (BrowserPool, served
+from the directory by static_server) at every --viewport. The rules of its
+linked stylesheets that match an element in the first screen are collected,
+plus the @media/@supports blocks around them and the @font-face rules of
+the fonts they use, in cascade order. That CSS goes into a <style
+data-critical> before the first stylesheet; the local stylesheets are
+deferred, either as media="print" swapped to their real media on load, or
+as rel="preload" swapped to a stylesheet. A <noscript> copy of each link is
+kept for browsers without JavaScript.
+
+Pages are grouped by template: their DOM skeleton (tags and classes, with
+runs of repeated siblings such as product cards counted once), the contents
+of their stylesheets, and the viewports. Each template is rendered once, and
+its CSS is cached in SITE/.critical-css/<hash>.css. A rerun, or a page whose
+layout has been seen before, needs no browser. Pages that already have a
+<style data-critical> are left alone. Cross-origin stylesheets (e.g. Google
+Fonts) cannot be read from the page and stay as they are.
+
+Needs Playwright and Chromium: pip install playwright && playwright install chromium
+
+Usage: python critical_css.py cloned_site/www.example.com [--mode media|preload] [--viewport 1920x1080 412x915]
+"""
+
+import os
+import sys
+import hashlib
+import argparse
+import posixpath
+import threading
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from lxml import etree
+
+from html_rewrite import parse, serialize
+from css_scan import find_refs, splice_refs
+from static_server import StaticServer
+from browser_pool import BrowserPool, Frontier, DEFAULT_WORKERS
+from page_ready import watch, wait_until_ready, DEFAULT_READY_TIMEOUT
+from resource_policy import ResourcePolicy
+
+
+CACHE_DIR = '.critical-css'
+DEFAULT_VIEWPORTS = ((1920, 1080), (412, 915))  # BrowserPool's desktop, and a phone
+DEFAULT_MODE = 'media'
+MODES = ('media', 'preload')
+SKELETON_DEPTH = 8  # Levels below <body> that make up a page's template
+SKELETON_SKIP = {'script', 'noscript', 'template', 'style', 'link', 'meta'}
+
+# Rules of the page's <link>ed stylesheets that apply to something in the first
+# screen, with their position in the cascade (order) and enclosing @media and
+# @supports blocks. A selector is tried without its pseudo-elements and state
+# pseudo-classes, since a button's :hover style belongs with the button; one
+# the browser cannot query is kept rather than guessed at.
+CRITICAL_SCRIPT = '''() => {
+    const fold = window.innerHeight;
+    const PSEUDO = /::?(before|after|first-line|first-letter|marker|placeholder|selection|backdrop|file-selector-button|-(webkit|moz|ms)-[\\w-]+)(\\([^)]*\\))?/gi;
+    const STATE = /:(hover|focus|focus-visible|focus-within|active|visited|target|checked|disabled|enabled|invalid|valid|placeholder-shown|autofill)(?![\\w-])/gi;
+    const seen = new Map();
+    const aboveFold = (selector) => {
+        const cleaned = selector.replace(PSEUDO, '').replace(STATE, '').trim() || '*';
+        if (seen.has(cleaned)) return seen.get(cleaned);
+        let found = false;
+        try {
+            for (const el of document.querySelectorAll(cleaned)) {
+                const rect = el.getBoundingClientRect();
+                if (rect.top < fold && rect.bottom >= 0) { found = true; break; }
+            }
+        } catch (e) {
+            found = true;
+        }
+        seen.set(cleaned, found);
+        return found;
+    };
+    const unquote = (family) => family.trim().replace(/^["']|["']$/g, '').toLowerCase();
+
+    const items = [];
+    const fontFaces = [];
+    const families = new Set();
+    const walk = (rules, href, order, wrappers) => {
+        for (let i = 0; i < rules.length; i++) {
+            const rule = rules[i];
+            const path = order.concat(i);
+            if (rule instanceof CSSStyleRule) {
+                if (rule.selectorText.split(',').some(aboveFold)) {
+                    items.push({href, order: path, wrappers, text: rule.cssText});
+                    const family = rule.style.getPropertyValue('font-family');
+                    if (family) family.split(',').forEach(f => families.add(unquote(f)));
+                }
+            } else if (rule instanceof CSSMediaRule) {
+                if (window.matchMedia(rule.media.mediaText).matches)
+                    walk(rule.cssRules, href, path, wrappers.concat('@media ' + rule.media.mediaText));
+            } else if (rule instanceof CSSSupportsRule) {
+                if (CSS.supports(rule.conditionText))
+                    walk(rule.cssRules, href, path, wrappers.concat('@supports ' + rule.conditionText));
+            } else if (rule instanceof CSSImportRule) {
+                if (rule.styleSheet && (!rule.media.mediaText || window.matchMedia(rule.media.mediaText).matches))
+                    sheet(rule.styleSheet, path, wrappers);
+            } else if (rule instanceof CSSFontFaceRule) {
+                fontFaces.push({href, order: path, wrappers, text: rule.cssText,
+                                family: unquote(rule.style.getPropertyValue('font-family'))});
+            }
+        }
+    };
+    const sheet = (styleSheet, order, wrappers) => {
+        let rules;
+        try { rules = styleSheet.cssRules; } catch (e) { return; }  // Cross-origin
+        walk(rules, styleSheet.href, order, wrappers);
+    };
+    Array.from(document.styleSheets).forEach((styleSheet, i) => {
+        const owner = styleSheet.ownerNode;
+        if (!owner || owner.tagName !== 'LINK' || !styleSheet.href) return;  // <style> is inline already
+        const media = styleSheet.media.mediaText;
+        if (media && !window.matchMedia(media).matches) return;
+        sheet(styleSheet, [i], media && media !== 'all' ? ['@media ' + media] : []);
+    });
+    fontFaces.forEach(face => { if (families.has(face.family)) items.push(face); });
+    return items;
+}'''
+
+
+def file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def skeleton(element, depth=0):
+    """Tags and classes of element's subtree; consecutive identical siblings count once"""
+    classes = element.get('class', '').split()
+    signature = element.tag + ''.join('.' + c for c in sorted(classes))
+    if depth >= SKELETON_DEPTH:
+        return signature
+    children = []
+    for child in element:
+        if isinstance(child.tag, str) and child.tag not in SKELETON_SKIP:
+            child_signature = skeleton(child, depth + 1)
+            if not children or children[-1] != child_signature:
+                children.append(child_signature)
+    return f"{signature}({','.join(children)})" if children else signature
+
+
+def is_deferred(link):
+    """Whether a <link> already loads as media="print" or rel="preload" and swaps itself in on load"""
+    onload = (link.get('onload') or '').replace(' ', '')
+    rel = link.get('rel', '').lower().split()
+    if link.get('media', '').strip().lower() == 'print' and 'this.media=' in onload:
+        return True
+    return 'preload' in rel and link.get('as', '').lower() == 'style' and 'this.rel=' in onload
+
+
+def group_wrappers(items):
+    """CSS text for rules in cascade order, each inside its @media/@supports blocks"""
+    out = []
+    current = ()
+    for wrappers, text in items:
+        common = 0
+        while common < min(len(current), len(wrappers)) and current[common] == wrappers[common]:
+            common += 1
+        out.extend('}' for _ in current[common:])
+        out.extend(wrapper + ' {' for wrapper in wrappers[common:])
+        out.append(text)
+        current = wrappers
+    out.extend('}' for _ in current)
+    return '\n'.join(out)
+
+
+class CriticalCss:
+    def __init__(self, site_dir, mode=DEFAULT_MODE, viewports=DEFAULT_VIEWPORTS, workers=DEFAULT_WORKERS,
+                 ready_timeout=DEFAULT_READY_TIMEOUT):
+        self.site_dir = os.path.abspath(site_dir)
+        self.mode = mode
+        self.viewports = tuple(tuple(viewport) for viewport in viewports)
+        self.workers = workers
+        self.ready_timeout = ready_timeout
+        self.cache_dir = os.path.join(self.site_dir, CACHE_DIR)
+        self.page_templates = {}  # Page URL being rendered -> template key
+        self.counts = {'pages': 0, 'inlined': 0, 'already': 0, 'no_styles': 0, 'templates': 0, 'rendered': 0,
+                       'failed': 0, 'unrendered': 0, 'rejected': 0,
+                       'bytes': 0}
+
+    def pages(self):
+        for directory, dirs, files in os.walk(self.site_dir):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            for name in sorted(files):
+                if name.endswith(('.html', '.htm')):
+                    yield os.path.relpath(os.path.join(directory, name), self.site_dir).replace(os.sep, '/')
+
+    def local_path(self, href, page):
+        """Site path of a same-site reference from page, or None"""
+        parts = urlsplit(href.strip())
+        if parts.scheme or parts.netloc or not parts.path:
+            return None
+        path = parts.path if parts.path.startswith('/') else posixpath.join('/' + posixpath.dirname(page), parts.path)
+        path = posixpath.normpath(path).lstrip('/')
+        if path.startswith('..') or not os.path.isfile(os.path.join(self.site_dir, path)):
+            return None
+        return path
+
+    def stylesheet_links(self, root, page):
+        """(element, site path) of each local stylesheet a page links, in order; <noscript> fallbacks are not counted"""
+        links = []
+        for link in root.iter('link'):
+            if any(ancestor.tag == 'noscript' for ancestor in link.iterancestors()):
+                continue
+            rel = link.get('rel', '').lower().split()
+            if ('stylesheet' in rel or is_deferred(link)) and 'alternate' not in rel and link.get('href'):
+                path = self.local_path(link.get('href'), page)
+                if path is not None:
+                    links.append((link, path))
+        return links
+
+    def template_key(self, root, links):
+        parts = [repr(self.viewports)]
+        parts.extend(f"{path}:{file_digest(os.path.join(self.site_dir, path))}" for _, path in links)
+        body = root.find('body')
+        parts.append(skeleton(body) if body is not None else '')
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+    def cache_path(self, key):
+        return os.path.join(self.cache_dir, key + '.css')
+
+    def cached(self, key):
+        try:
+            with open(self.cache_path(key), 'r', encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def root_relative(self, css, sheet_url, origin):
+        """url()s in css, written relative to sheet_url, as site-root paths (other hosts absolute)"""
+        def replace_url(kind, value):
+            if value.startswith(('data:', '#')):
+                return None
+            parts = urlsplit(urljoin(sheet_url, value))
+            if f"{parts.scheme}://{parts.netloc}" == origin:
+                return urlunsplit(('', '', parts.path, parts.query, parts.fragment))
+            return parts.geturl()
+        return splice_refs(css, find_refs(css), replace_url)[0]
+
+    def page_relative(self, css, page):
+        """Site-root url()s in cached CSS, relative to page, so the page works from file:// too"""
+        page_dir = '/' + posixpath.dirname(page)
+
+        def replace_url(kind, value):
+            if value.startswith('/') and not value.startswith('//'):
+                return posixpath.relpath(value, page_dir)
+            return None
+        return splice_refs(css, find_refs(css), replace_url)[0]
+
+    async def visit(self, page, url, depth):
+        """Render one page per template at every viewport and cache its critical CSS"""
+        origin = '{0.scheme}://{0.netloc}'.format(urlsplit(url))
+        items = {}
+        try:
+            for width, height in self.viewports:
+                await page.set_viewport_size({'width': width, 'height': height})
+                await page.goto(url, wait_until='load', timeout=60000)
+                await wait_until_ready(page, self.ready_timeout)
+                for item in await page.evaluate(CRITICAL_SCRIPT):
+                    # The same rule found at another viewport is the same item
+                    items.setdefault((item['href'], tuple(item['order'])), item)
+        except Exception as e:
+            print(f"[FAIL] {url[:60]} - {str(e)[:60]}")
+            self.counts['failed'] += 1
+            return ()
+
+        ordered = sorted(items.values(), key=lambda item: item['order'])
+        css = group_wrappers((tuple(item['wrappers']), self.root_relative(item['text'], item['href'], origin))
+                             for item in ordered)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.cache_path(self.page_templates[url]), 'w', encoding='utf-8') as f:
+            f.write(css)
+        self.counts['rendered'] += 1
+        print(f"[CSS]  {urlsplit(url).path[:60]} - {len(ordered)} rules, {len(css) / 1024:.1f}KB")
+        return ()
+
+    def render(self, templates):
+        """Compute the critical CSS of templates ({key: example page}) in the browser"""
+        server = StaticServer(self.site_dir, ('127.0.0.1', 0), quiet=True, watch=False)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{server.server_address[1]}/"
+        try:
+            frontier = Frontier()
+            for key, page in templates.items():
+                url = base + page
+                self.page_templates[url] = key
+                frontier.add(url, 0)
+            width, height = self.viewports[0]
+            # No images, media or trackers: layout, not pixels, decides what is above the fold
+            pool = BrowserPool(self.workers, resource_policy=ResourcePolicy.preset('render', '127.0.0.1'),
+                               context_options={'viewport': {'width': width, 'height': height}}, on_page=watch)
+            pool.run(frontier, self.visit)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def defer(self, link):
+        """Make a stylesheet <link> non-blocking, with a <noscript> copy of it as it was"""
+        if is_deferred(link):
+            return  # Already swapped on load (stumptown_static does this itself), with its own fallback
+        noscript = etree.Element('noscript')
+        original = etree.SubElement(noscript, 'link', dict(link.attrib))
+        original.tail = None
+        if self.mode == 'preload':
+            link.set('rel', 'preload')
+            link.set('as', 'style')
+            link.set('onload', "this.onload=null;this.rel='stylesheet'")
+        else:
+            media = link.get('media') or 'all'
+            link.set('media', 'print')
+            link.set('onload', f"this.onload=null;this.media='{media}'")
+        noscript.tail = link.tail
+        link.tail = None
+        link.addnext(noscript)
+
+    def inline(self, page, root, links, css):
+        style = etree.Element('style')
+        style.set('data-critical', '')
+        style.text = '\n' + self.page_relative(css, page) + '\n'
+        first = links[0][0]
+        style.tail = first.tail
+        first.addprevious(style)
+        for link, _ in links:
+            self.defer(link)
+
+        html = serialize(root)
+        problem = self.check_markup(html, page, [path for _, path in links])
+        if problem:
+            print(f"[FAIL] {page[:60]} - {problem}; left as it was")
+            self.counts['rejected'] += 1
+            return
+        with open(os.path.join(self.site_dir, page), 'w', encoding='utf-8') as f:
+            f.write(html)
+        self.counts['inlined'] += 1
+        self.counts['bytes'] += len(style.text)
+
+    def check_markup(self, html, page, paths):
+        """Why html, reparsed, is not a page with one critical <style> and paths all deferred; None if it is"""
+        root = parse(html)
+        if root is None:
+            return 'output does not parse'
+        if len(root.xpath('//style[@data-critical]')) != 1:
+            return 'critical <style> missing or repeated'
+        if root.xpath('//noscript//noscript'):
+            return 'nested <noscript>'
+        links = self.stylesheet_links(root, page)
+        if [path for _, path in links] != paths:
+            return 'stylesheets changed'
+        for link, path in links:
+            if not is_deferred(link):
+                return f'{path} still blocks rendering'
+            media = link.get('onload', '').partition("this.media='")[2].partition("'")[0]
+            if media.strip().lower() == 'print':
+                return f'{path} would never apply'
+        return None
+
+    def run(self):
+        """Inline critical CSS into every page of the site; returns the counts"""
+        plans = []       # (page, parsed root, links, template key)
+        templates = {}   # key -> first page with that template
+        for page in self.pages():
+            self.counts['pages'] += 1
+            with open(os.path.join(self.site_dir, page), 'r', encoding='utf-8', errors='replace') as f:
+                root = parse(f.read())
+            if root is None:
+                continue
+            if root.xpath('//style[@data-critical]'):
+                self.counts['already'] += 1
+                continue
+            links = self.stylesheet_links(root, page)
+            if not links:
+                self.counts['no_styles'] += 1
+                continue
+            key = self.template_key(root, links)
+            templates.setdefault(key, page)
+            plans.append((page, root, links, key))
+        self.counts['templates'] = len(templates)
+
+        missing = {key: page for key, page in templates.items() if self.cached(key) is None}
+        if missing:
+            print(f"Rendering {len(missing)} of {len(templates)} page templates "
+                  f"({len(templates) - len(missing)} cached)...\n")
+            try:
+                self.render(missing)
+            except Exception as e:
+                # No Playwright or no Chromium: pages with cached templates are still done
+                print(f"Cannot render pages: {str(e).splitlines()[0] if str(e) else e!r}")
+
+        for page, root, links, key in plans:
+            css = self.cached(key)
+            if css:
+                self.inline(page, root, links, css)
+            else:
+                self.counts['unrendered'] += 1
+        return self.counts
+
+    def summary(self):
+        counts = self.counts
+        inlined = counts['inlined']
+        average = counts['bytes'] / inlined / 1024 if inlined else 0
+        return (f"{inlined} of {counts['pages']} pages inlined ({average:.1f}KB each on average), "
+                f"{counts['templates']} templates ({counts['rendered']} rendered, {counts['failed']} failed), "
+                f"{counts['already']} already done, {counts['no_styles']} without local stylesheets, "
+                f"{counts['unrendered'] + counts['rejected']} left as they were")
+
+
+def viewport(value):
+    try:
+        width, height = (int(n) for n in value.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got {value!r}")
+    return width, height
+
+
+def main():
+    root = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Inline above-the-fold CSS into saved pages and defer the rest')
+    parser.add_argument('site', nargs='?', default=os.path.join(root, 'stumptown_static'),
+                       help='Directory of saved pages, e.g. cloned_site/www.example.com (default: stumptown_static)')
+    parser.add_argument('--mode', choices=MODES, default=DEFAULT_MODE,
+                       help='How the full stylesheets are deferred: media (media="print" swapped on load) '
+                            f'or preload (rel="preload" swapped to a stylesheet) (default: {DEFAULT_MODE})')
+    parser.add_argument('--viewport', type=viewport, nargs='+', default=list(DEFAULT_VIEWPORTS),
+                       help='Screens whose first fold counts as critical, WIDTHxHEIGHT (default: 1920x1080 412x915)')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                       help=f'Templates rendered at once (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--ready-timeout', type=float, default=DEFAULT_READY_TIMEOUT,
+                       help=f'Longest wait for a page to settle, in seconds (default: {DEFAULT_READY_TIMEOUT:g})')
+    args = parser.parse_args()
+
+    stage = CriticalCss(args.site, mode=args.mode, viewports=args.viewport, workers=args.workers,
+                        ready_timeout=args.ready_timeout)
+    counts = stage.run()
+    print(f"\n{stage.summary()}")
+    return 1 if counts['failed'] or counts['unrendered'] or counts['rejected'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""
+CSS Scan - Every URL reference in a stylesheet, typed, with its offsets
+find_refs() returns the references of a stylesheet in document order:
+  URL     url(...) in any property (backgrounds, masks, cursors, ...)
+  IMPORT  @import "..." or @import url(...)
+  FONT    url(...) in an @font-face block (src and friends)
+Comments are skipped, so commented-out rules no longer pull in assets.
+splice_refs() rewrites from those offsets, so a stylesheet that was scanned
+for extraction is rewritten without a second regex pass.
+
+The scan is three precompiled patterns that each start with a literal
+(url(, @, /*), merged by offset. One alternation of all of them would be a
+single pass, but the re module can only skip ahead to a literal prefix; with
+an alternation it tests every character, which is several times slower on a
+multi-MB theme (see benchmarks/bench_css.py).
+"""
+
+import re
+from bisect import bisect_right
+
+
+URL = 'url'
+IMPORT = 'import'
+FONT = 'font'
+
+URL_PATTERN = re.compile(r'url\(\s*(?P<quote>["\']?)(?P<url>[^"\')\s]+)(?P=quote)\s*\)')
+# @import "..." (with its value), @import right before a url(), and whole @font-face blocks
+AT_RULE_PATTERN = re.compile(r'@(?:import\s+(?:(?P<quote>["\'])(?P<import>[^"\']+)(?P=quote)|(?=url\())'
+                             r'|font-face\s*\{[^}]*\})')
+COMMENT_PATTERN = re.compile(r'/\*[^*]*\*+(?:[^/*][^*]*\*+)*/|/\*.*', re.S)  # Unrolled: no backtracking
+
+
+def within(spans, starts, pos):
+    """True if pos falls in one of spans, sorted (start, end) pairs that do not overlap"""
+    i = bisect_right(starts, pos) - 1
+    return i >= 0 and pos < spans[i][1]
+
+
+def find_refs(css):
+    """[(kind, value, start, end)] in document order; css[start:end] is the
+    url(...) or quoted string that splice_refs() replaces"""
+    urls = list(URL_PATTERN.finditer(css))
+    if '@' not in css and '/*' not in css:
+        return [(URL, match.group('url'), match.start(), match.end()) for match in urls]
+
+    comments = [match.span() for match in COMMENT_PATTERN.finditer(css)]
+    comment_starts = [start for start, _ in comments]
+
+    refs = []
+    import_urls = set()  # Offsets of url()s that belong to an @import
+    fonts = []
+    for match in AT_RULE_PATTERN.finditer(css):
+        if within(comments, comment_starts, match.start()):
+            continue
+        if match.group('import') is not None:
+            refs.append((IMPORT, match.group('import'), match.start('quote'), match.end()))
+        elif css.startswith('@import', match.start()):
+            import_urls.add(match.end())
+        else:
+            fonts.append(match.span())
+    font_starts = [start for start, _ in fonts]
+
+    for match in urls:
+        start = match.start()
+        if within(comments, comment_starts, start):
+            continue
+        if start in import_urls:
+            kind = IMPORT
+        elif within(fonts, font_starts, start):
+            kind = FONT
+        else:
+            kind = URL
+        refs.append((kind, match.group('url'), start, match.end()))
+
+    refs.sort(key=lambda ref: ref[2])
+    return refs
+
+
+def css_urls(css):
+    """The raw URL values referenced by css, in document order"""
+    return [value for _, value, _, _ in find_refs(css)]
+
+
+def splice_refs(css, refs, replace):
+    """css with each reference replace(kind, value) returns a new URL for
+    rewritten in place (None keeps it); returns (css, number of references)"""
+    parts = []
+    last = 0
+    for kind, value, start, end in refs:
+        new_value = replace(kind, value)
+        if new_value is None:
+            continue
+        parts.append(css[last:start])
+        if css[start] in '"\'':
+            parts.append(f'"{new_value}"')
+        else:
+            parts.append(f'url("{new_value}")')
+        last = end
+    if not parts:
+        return css, len(refs)
+    parts.append(css[last:])
+    return ''.join(parts), len(refs)
@@ -7,8 +7,24 @@ import os
 import re
 import base64
 import shutil
+import argparse
 from urllib.parse import urlparse, unquote
-from bs4 import BeautifulSoup
+
+from html_extract import ExtractRules, URL, SRCSET, CSS
+from html_rewrite import rewrite_html, BACKENDS, DEFAULT_BACKEND
+
+
+CSS_URL_PATTERN = re.compile(r'url\([\'"]?([^\'")\s]+)[\'"]?\)')
+
+# What fix_html_file() touches: image sources, srcset (cleared) and inline styles
+FIX_RULES = ExtractRules(
+    tag_attrs=[
+        ('img', 'src', URL),
+        ('img', 'data-src', URL),
+        ('img', 'srcset', SRCSET),
+    ],
+    any_attrs=[('style', CSS)],
+)
 
 
 def find_local_image(image_url, clone_dir):
@@ -62,7 +78,7 @@ def image_to_base64(image_path):
         return None
 
 
-def fix_html_file(html_path, clone_dir, output_dir):
+def fix_html_file(html_path, clone_dir, output_dir, html_parser=DEFAULT_BACKEND):
     """Fix a single HTML file by embedding images"""
     try:
         with open(html_path, 'r', encoding='utf-8', errors='replace') as f:
@@ -70,42 +86,39 @@ def fix_html_file(html_path, clone_dir, output_dir):
     except:
         return 0
     
-    soup = BeautifulSoup(content, 'lxml')
     images_fixed = 0
     
-    # Fix img tags
-    for img in soup.find_all('img'):
-        for attr in ['src', 'data-src']:
-            src = img.get(attr)
-            if src and not src.startswith('data:') and 'http' in src:
-                local_path = find_local_image(src, clone_dir)
-                if local_path:
-                    b64 = image_to_base64(local_path)
-                    if b64:
-                        img[attr] = b64
-                        images_fixed += 1
-        # Clear srcset
-        if img.get('srcset'):
-            img['srcset'] = ''
+    def embed(src):
+        nonlocal images_fixed
+        if src.startswith('data:') or 'http' not in src:
+            return None
+        local_path = find_local_image(src, clone_dir)
+        if local_path:
+            b64 = image_to_base64(local_path)
+            if b64:
+                images_fixed += 1
+                return b64
+        return None
     
     # Fix background images
-    for el in soup.find_all(style=True):
-        style = el.get('style', '')
-        urls = re.findall(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', style)
-        for url in urls:
-            if not url.startswith('data:') and 'http' in url:
-                local_path = find_local_image(url, clone_dir)
-                if local_path:
-                    b64 = image_to_base64(local_path)
-                    if b64:
-                        style = style.replace(url, b64)
-                        images_fixed += 1
-        el['style'] = style
+    def embed_in_style(style):
+        for url in CSS_URL_PATTERN.findall(style):
+            b64 = embed(url)
+            if b64:
+                style = style.replace(url, b64)
+        return style
+    
+    handlers = {
+        URL: embed,                    # img src / data-src
+        SRCSET: lambda srcset: '',     # Clear srcset
+        CSS: embed_in_style,
+    }
+    fixed = rewrite_html(content, FIX_RULES, handlers, html_parser)
     
     # Save
     output_path = os.path.join(output_dir, os.path.basename(html_path))
     with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(str(soup))
+        f.write(fixed)
     
     return images_fixed
 
@@ -139,6 +152,11 @@ a:hover{background:rgba(255,255,255,0.1)}
 
 
 def main():
+    parser = argparse.ArgumentParser(description='Repair a cloned site for offline viewing')
+    parser.add_argument('--parser', choices=BACKENDS, default=DEFAULT_BACKEND,
+                       help='HTML backend for rewriting; both write the same output (default: lxml)')
+    args = parser.parse_args()
+    
     clone_dir = r"C:\Users\Michael 2\Desktop\CoffeeStore\stumptown_smart"
     output_dir = r"C:\Users\Michael 2\Desktop\CoffeeStore\stumptown_fixed"
     
@@ -164,7 +182,7 @@ def main():
     
     for i, html_file in enumerate(html_files[:80]):
         basename = os.path.basename(html_file)
-        count = fix_html_file(html_file, clone_dir, output_dir)
+        count = fix_html_file(html_file, clone_dir, output_dir, args.parser)
         total_fixed += count
         fixed_pages.append(basename)
         if (i+1) % 10 == 0:
@@ -7,27 +7,137 @@ Creates truly offline-functional websites
 import os
 import re
 import sys
-import time
 import base64
+import asyncio
 import hashlib
 from urllib.parse import urljoin, urlparse, unquote
 from collections import deque
 
 try:
-    from playwright.sync_api import sync_playwright
     import requests
-    from bs4 import BeautifulSoup
 except ImportError:
     import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "playwright", "requests", "beautifulsoup4", "lxml", "-q"])
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "playwright", "requests", "lxml", "-q"])
     subprocess.check_call([sys.executable, "-m", "playwright", "install", "chromium"])
-    from playwright.sync_api import sync_playwright
     import requests
-    from bs4 import BeautifulSoup
+
+from asset_store import AssetStore
+from html_extract import ExtractRules, URL, SRCSET, CSS, LINK, rel_has
+from html_rewrite import rewrite_html
+from css_scan import find_refs, splice_refs
+from browser_pool import BrowserPool, Frontier, DEFAULT_WORKERS, DEFAULT_RECYCLE_AFTER
+from page_ready import watch, wait_until_ready, DEFAULT_READY_TIMEOUT
+from lazy_scroll import scroll_page, add_scroll_arguments, DEFAULT_MAX_SCROLL_HEIGHT, DEFAULT_MAX_SCROLL_TIME
+from resource_policy import add_policy_arguments, policy_from_args, check_policy
+
+
+# What extract_and_download_assets() downloads and points at local copies (URL,
+# SRCSET, url()s in CSS) or at local pages (LINK)
+REWRITE_RULES = ExtractRules(
+    tag_attrs=[
+        ('img', 'src', URL), ('img', 'data-src', URL), ('img', 'data-lazy-src', URL), ('img', 'srcset', SRCSET),
+        ('link', 'href', URL, rel_has('stylesheet')),
+        ('video', 'src', URL), ('video', 'poster', URL), ('source', 'src', URL), ('source', 'poster', URL),
+        ('a', 'href', LINK),
+    ],
+    any_attrs=[('style', CSS)],
+)
+
+# Resource types saved from rendered pages (the responses watch_assets records)
+SAVED_TYPES = {'stylesheet', 'image', 'media', 'font'}
+
+# 'inline' writes each element's computed styles into its style attribute;
+# 'classes' writes one class per distinct set, and leaves out UA defaults
+STYLE_MODES = ('inline', 'classes')
+
+# Computed styles of the rendered page, copied onto a clone of it. The clone's
+# elements are in the same document order as the originals, so they pair up
+# by index in one pass.
+STYLE_SCRIPT = '''(mode) => {
+    const criticalProps = [
+        'display', 'position', 'top', 'left', 'right', 'bottom',
+        'width', 'height', 'max-width', 'max-height', 'min-width', 'min-height',
+        'margin', 'padding', 'border', 'border-radius',
+        'background', 'background-color', 'background-image', 'background-size', 'background-position',
+        'color', 'font-family', 'font-size', 'font-weight', 'line-height', 'text-align',
+        'flex', 'flex-direction', 'justify-content', 'align-items', 'gap',
+        'grid', 'grid-template-columns', 'grid-template-rows',
+        'overflow', 'opacity', 'visibility', 'z-index',
+        'transform', 'box-shadow', 'text-shadow'
+    ];
+    const trivial = new Set(['none', 'auto', 'normal', '0px']);
+
+    const originals = document.querySelectorAll('*');
+    const clone = document.cloneNode(true);
+    const copies = clone.querySelectorAll('*');
+
+    // UA defaults per tag: a bare element in an empty frame, where no author styles apply
+    let frame = null;
+    const defaults = {};
+    const uaDefaults = (tag) => {
+        if (!(tag in defaults)) {
+            if (!frame) {
+                frame = document.createElement('iframe');
+                frame.style.cssText = 'position:absolute;width:0;height:0;border:0;visibility:hidden';
+                document.documentElement.appendChild(frame);
+            }
+            const probe = frame.contentDocument.createElement(tag);
+            frame.contentDocument.body.appendChild(probe);
+            const computed = frame.contentWindow.getComputedStyle(probe);
+            defaults[tag] = {};
+            criticalProps.forEach(prop => { defaults[tag][prop] = computed.getPropertyValue(prop); });
+            probe.remove();
+        }
+        return defaults[tag];
+    };
+
+    const classes = new Map();  // declarations -> {name, css}
+    let styled = 0;
+    originals.forEach((original, i) => {
+        const el = copies[i];
+        if (el.tagName === 'SCRIPT' || el.tagName === 'NOSCRIPT') return;
+
+        const computed = window.getComputedStyle(original);
+        const ua = mode === 'classes' ? uaDefaults(el.localName) : null;
+        const declarations = [];
+        criticalProps.forEach(prop => {
+            const value = computed.getPropertyValue(prop);
+            if (!value || (ua ? value === ua[prop] : trivial.has(value))) return;
+            declarations.push(`${prop}:${value}`);
+        });
+        if (!declarations.length) return;
+        styled++;
+
+        if (mode === 'classes') {
+            const key = declarations.join(';');
+            let cls = classes.get(key);
+            if (!cls) {
+                cls = {name: 'fr-s' + classes.size, css: declarations.map(d => d + ' !important').join(';')};
+                classes.set(key, cls);
+            }
+            el.classList.add(cls.name);
+        } else {
+            el.setAttribute('style', (el.getAttribute('style') || '') + declarations.join(';') + ';');
+        }
+    });
+    if (frame) frame.remove();
+
+    clone.querySelectorAll('script, noscript').forEach(s => s.remove());
+    if (classes.size) {
+        const sheet = clone.createElement('style');
+        sheet.textContent = [...classes.values()].map(cls => `.${cls.name}{${cls.css}}`).join('\\n');
+        (clone.head || clone.documentElement).appendChild(sheet);
+    }
+
+    return {html: clone.documentElement.outerHTML, elements: originals.length, styled: styled, classes: classes.size};
+}'''
 
 
 class FullRenderCloner:
-    def __init__(self, base_url, output_dir="cloned_site", max_depth=5):
+    def __init__(self, base_url, output_dir="cloned_site", max_depth=5, blob_dir=None, max_memory=1024 * 1024,
+                 workers=DEFAULT_WORKERS, recycle_after=DEFAULT_RECYCLE_AFTER, ready_timeout=DEFAULT_READY_TIMEOUT,
+                 resource_policy=None, styles='inline', max_scroll_height=DEFAULT_MAX_SCROLL_HEIGHT,
+                 max_scroll_time=DEFAULT_MAX_SCROLL_TIME):
         self.base_url = base_url.rstrip('/')
         self.parsed_base = urlparse(self.base_url)
         self.base_domain = self.parsed_base.netloc
@@ -39,6 +149,27 @@ class FullRenderCloner:
         self.failed_urls = set()
         self.pages_to_visit = deque()
         
+        # Binary assets are stored once per distinct body and hardlinked into place.
+        # Downloads are streamed; bodies over max_memory bytes go to a temp file.
+        self.asset_store = AssetStore(self.output_dir, blob_dir, max_memory)
+        
+        # Pages render in parallel, one browser context per worker
+        self.workers = workers
+        self.recycle_after = recycle_after
+        
+        # Longest wait for a rendered page to settle (see page_ready)
+        self.ready_timeout = ready_timeout
+        
+        # What rendered pages may load (see resource_policy); None loads everything
+        self.resource_policy = check_policy(resource_policy, SAVED_TYPES)
+        
+        # Caps on the lazy-load scroll, for infinite grids (see lazy_scroll)
+        self.max_scroll_height = max_scroll_height
+        self.max_scroll_time = max_scroll_time
+        
+        # How computed styles are written into the pages (see STYLE_MODES)
+        self.styles = styles
+        
         # For downloading external assets
         self.session = requests.Session()
         self.session.headers.update({
@@ -102,7 +233,7 @@ class FullRenderCloner:
             return None
         
         try:
-            response = self.session.get(url, timeout=15)
+            response = self.session.get(url, timeout=15, stream=True)
             response.raise_for_status()
             
             # Determine filename
@@ -127,8 +258,8 @@ class FullRenderCloner:
             
             local_path = os.path.join(self.output_dir, 'assets', filename)
             
-            with open(local_path, 'wb') as f:
-                f.write(response.content)
+            with self.asset_store.read(response) as body:
+                self.asset_store.save_body(local_path, body, content_type)
             
             self.downloaded_assets[url] = local_path
             return local_path
@@ -137,6 +268,11 @@ class FullRenderCloner:
             self.failed_urls.add(url)
             return None
     
+    def download_all(self, urls):
+        """Download a batch of assets (run in a thread, off the browser's event loop)"""
+        for url in urls:
+            self.download_asset(url)
+    
     def inline_image_as_base64(self, url):
         """Download image and return as base64 data URI"""
         try:
@@ -153,95 +289,29 @@ class FullRenderCloner:
         except:
             return None
     
-    def process_page_with_playwright(self, page, url, inline_images=False):
+    async def process_page_with_playwright(self, page, url, inline_images=False):
         """
         Navigate to page, wait for render, and extract processed HTML
         """
         try:
             # Navigate and wait for network idle
-            page.goto(url, wait_until='networkidle', timeout=60000)
+            watch(page)
+            await page.goto(url, wait_until='networkidle', timeout=60000)
             
             # Wait for main content to load
-            time.sleep(3)
+            waited = await wait_until_ready(page, self.ready_timeout)
+            print(f"         Ready after {waited:.1f}s" if waited is not None else
+                  f"         Still busy after {self.ready_timeout:g}s, capturing anyway")
             
-            # Scroll to trigger lazy loading
-            page.evaluate('''() => {
-                return new Promise((resolve) => {
-                    let totalHeight = 0;
-                    const distance = 500;
-                    const timer = setInterval(() => {
-                        window.scrollBy(0, distance);
-                        totalHeight += distance;
-                        if (totalHeight >= document.body.scrollHeight) {
-                            clearInterval(timer);
-                            window.scrollTo(0, 0);
-                            setTimeout(resolve, 1000);
-                        }
-                    }, 100);
-                });
-            }''')
+            # Scroll until lazy content stops appearing (see lazy_scroll)
+            steps, stopped = await scroll_page(page, self.max_scroll_height, self.max_scroll_time)
+            print(f"         Scrolled {steps} screens ({stopped})")
             
-            # Get all computed styles and inline them
-            rendered_html = page.evaluate('''() => {
-                // Clone the document
-                const clone = document.cloneNode(true);
-                
-                // Get all elements
-                const elements = clone.querySelectorAll('*');
-                
-                // For critical elements, inline computed styles
-                elements.forEach(el => {
-                    if (el.tagName === 'SCRIPT' || el.tagName === 'NOSCRIPT') {
-                        el.remove();
-                        return;
-                    }
-                    
-                    // Get corresponding original element
-                    try {
-                        const origEl = document.querySelector(
-                            el.tagName.toLowerCase() + 
-                            (el.id ? '#' + CSS.escape(el.id) : '') +
-                            (el.className && typeof el.className === 'string' ? 
-                                '.' + el.className.split(' ').filter(c => c).map(c => CSS.escape(c)).join('.') : '')
-                        );
-                        
-                        if (origEl) {
-                            const computed = window.getComputedStyle(origEl);
-                            
-                            // Only inline critical visual styles
-                            const criticalProps = [
-                                'display', 'position', 'top', 'left', 'right', 'bottom',
-                                'width', 'height', 'max-width', 'max-height', 'min-width', 'min-height',
-                                'margin', 'padding', 'border', 'border-radius',
-                                'background', 'background-color', 'background-image', 'background-size', 'background-position',
-                                'color', 'font-family', 'font-size', 'font-weight', 'line-height', 'text-align',
-                                'flex', 'flex-direction', 'justify-content', 'align-items', 'gap',
-                                'grid', 'grid-template-columns', 'grid-template-rows',
-                                'overflow', 'opacity', 'visibility', 'z-index',
-                                'transform', 'box-shadow', 'text-shadow'
-                            ];
-                            
-                            let inlineStyle = '';
-                            criticalProps.forEach(prop => {
-                                const value = computed.getPropertyValue(prop);
-                                if (value && value !== 'none' && value !== 'auto' && value !== 'normal' && value !== '0px') {
-                                    inlineStyle += `${prop}:${value};`;
-                                }
-                            });
-                            
-                            if (inlineStyle) {
-                                el.setAttribute('style', (el.getAttribute('style') || '') + inlineStyle);
-                            }
-                        }
-                    } catch(e) {}
-                });
-                
-                // Remove script tags
-                clone.querySelectorAll('script').forEach(s => s.remove());
-                clone.querySelectorAll('noscript').forEach(s => s.remove());
-                
-                return clone.documentElement.outerHTML;
-            }''')
+            # Computed styles, inline or as shared classes (see STYLE_SCRIPT)
+            result = await page.evaluate(STYLE_SCRIPT, self.styles)
+            print(f"         Styled {result['styled']} of {result['elements']} elements"
+                  + (f" with {result['classes']} classes" if self.styles == 'classes' else ""))
+            rendered_html = result['html']
             
             return rendered_html
             
@@ -250,78 +320,27 @@ class FullRenderCloner:
             return None
     
     def extract_and_download_assets(self, html_content, page_url):
-        """Extract all asset URLs and download them"""
-        soup = BeautifulSoup(html_content, 'lxml')
-        
-        # Image sources
-        for img in soup.find_all('img'):
-            for attr in ['src', 'data-src', 'data-lazy-src', 'srcset']:
-                value = img.get(attr)
-                if value:
-                    if 'srcset' in attr:
-                        for part in value.split(','):
-                            url_part = part.strip().split()[0]
-                            if url_part and not url_part.startswith('data:'):
-                                full_url = self.normalize_url(url_part, page_url)
-                                if full_url:
-                                    local = self.download_asset(full_url)
-                                    if local:
-                                        # Update srcset
-                                        value = value.replace(url_part, 'assets/' + os.path.basename(local))
-                        img[attr] = value
-                    else:
-                        if not value.startswith('data:'):
-                            full_url = self.normalize_url(value, page_url)
-                            if full_url:
-                                local = self.download_asset(full_url)
-                                if local:
-                                    img[attr] = 'assets/' + os.path.basename(local)
-        
-        # CSS files
-        for link in soup.find_all('link', rel='stylesheet'):
-            href = link.get('href')
-            if href and not href.startswith('data:'):
-                full_url = self.normalize_url(href, page_url)
-                if full_url:
-                    local = self.download_asset(full_url)
-                    if local:
-                        link['href'] = 'assets/' + os.path.basename(local)
-        
-        # Background images in inline styles
-        for el in soup.find_all(style=True):
-            style = el.get('style', '')
-            urls = re.findall(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', style)
-            for url in urls:
-                if not url.startswith('data:'):
-                    full_url = self.normalize_url(url, page_url)
-                    if full_url:
-                        local = self.download_asset(full_url)
-                        if local:
-                            style = style.replace(url, 'assets/' + os.path.basename(local))
-            el['style'] = style
-        
-        # Video sources
-        for video in soup.find_all(['video', 'source']):
-            for attr in ['src', 'poster']:
-                value = video.get(attr)
-                if value and not value.startswith('data:'):
-                    full_url = self.normalize_url(value, page_url)
-                    if full_url:
-                        local = self.download_asset(full_url)
-                        if local:
-                            video[attr] = 'assets/' + os.path.basename(local)
-        
-        # Extract page links
+        """Download the page's assets and point it at them and at the local pages,
+        in one tree walk (see REWRITE_RULES); returns (html, same-site page links)"""
         pages = set()
-        for a in soup.find_all('a', href=True):
-            href = a.get('href')
+        
+        def local_asset(value):
+            full_url = self.normalize_url(value.strip(), page_url)
+            local = self.download_asset(full_url) if full_url else None
+            return 'assets/' + os.path.basename(local) if local else None
+        
+        def local_styles(css):
+            return splice_refs(css, find_refs(css), lambda kind, value: local_asset(value))[0]
+        
+        def local_page(href):
             full_url = self.normalize_url(href, page_url)
             if full_url and self.is_same_domain(full_url):
                 pages.add(full_url)
-                # Update link to local file
-                a['href'] = self.url_to_filename(full_url)
+                return self.url_to_filename(full_url)
+            return None
         
-        return str(soup), pages
+        handlers = {URL: local_asset, CSS: local_styles, LINK: local_page}
+        return rewrite_html(html_content, REWRITE_RULES, handlers), pages
     
     def clone(self):
         """Main cloning method"""
@@ -336,70 +355,58 @@ class FullRenderCloner:
         
         self.pages_to_visit.append((self.base_url, 0))
         
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            )
-            page = context.new_page()
-            
-            # Capture all network requests for assets
-            asset_urls = set()
+        # Capture all network requests for assets, per page
+        asset_urls = {}
+        
+        def watch_assets(page):
+            captured = asset_urls[page] = set()
             
             def handle_response(response):
-                url = response.url
                 content_type = response.headers.get('content-type', '')
                 if any(t in content_type for t in ['image', 'video', 'font', 'css']):
-                    asset_urls.add(url)
+                    captured.add(response.url)
             
             page.on('response', handle_response)
+            page.on('close', lambda _: asset_urls.pop(page, None))
+        
+        async def visit(page, url, depth):
+            print(f"[RENDER] Depth {depth}: {url[:55]}...")
             
-            print("[PHASE 1] Rendering and capturing pages...\n")
+            html = await self.process_page_with_playwright(page, url)
+            if not html:
+                self.failed_urls.add(url)
+                return ()
             
-            while self.pages_to_visit:
-                url, depth = self.pages_to_visit.popleft()
-                
-                if url in self.visited_urls or depth > self.max_depth:
-                    continue
-                
-                self.visited_urls.add(url)
-                
-                print(f"[RENDER] Depth {depth}: {url[:55]}...")
-                
-                html = self.process_page_with_playwright(page, url)
-                if not html:
-                    self.failed_urls.add(url)
-                    continue
-                
-                # Process and save
-                processed_html, new_pages = self.extract_and_download_assets(html, url)
-                
-                # Save the page
-                filename = self.url_to_filename(url)
-                filepath = os.path.join(self.output_dir, filename)
-                
-                # Add DOCTYPE and wrap properly
-                final_html = f"<!DOCTYPE html>\n<html>\n{processed_html}\n</html>"
-                
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(final_html)
-                
-                print(f"         Saved: {filename}")
-                print(f"         Found {len(new_pages)} links, {len(asset_urls)} assets")
-                
-                # Queue new pages
-                for page_url in new_pages:
-                    if page_url not in self.visited_urls:
-                        self.pages_to_visit.append((page_url, depth + 1))
-                
-                # Download captured network assets
-                for asset_url in list(asset_urls):
-                    if asset_url not in self.downloaded_assets:
-                        self.download_asset(asset_url)
-                asset_urls.clear()
+            # Process and save; downloads block, so they run off the event loop
+            processed_html, new_pages = await asyncio.to_thread(self.extract_and_download_assets, html, url)
             
-            browser.close()
+            filename = self.url_to_filename(url)
+            filepath = os.path.join(self.output_dir, filename)
+            
+            # Add DOCTYPE and wrap properly
+            final_html = f"<!DOCTYPE html>\n<html>\n{processed_html}\n</html>"
+            
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write(final_html)
+            
+            captured = asset_urls.get(page, set())
+            page_assets = [a for a in captured if a not in self.downloaded_assets]
+            captured.clear()
+            
+            print(f"         Saved: {filename}")
+            print(f"         Found {len(new_pages)} links, {len(page_assets)} assets")
+            
+            # Download captured network assets
+            await asyncio.to_thread(self.download_all, page_assets)
+            
+            # Every link, seen or not: the frontier keeps each page's smallest depth
+            return new_pages
+        
+        print(f"[PHASE 1] Rendering and capturing pages ({self.workers} at a time)...\n")
+        
+        pool = BrowserPool(self.workers, self.recycle_after, resource_policy=self.resource_policy,
+                           on_page=watch_assets)
+        pool.run(Frontier(self.pages_to_visit, self.visited_urls, self.max_depth), visit)
         
         # Create index.html redirect
         index_file = os.path.join(self.output_dir, 'index.html')
@@ -424,6 +431,10 @@ class FullRenderCloner:
         print(f"Pages rendered: {len(self.visited_urls)}")
         print(f"Assets downloaded: {len(self.downloaded_assets)}")
         print(f"Failed: {len(self.failed_urls)}")
+        pruned = self.asset_store.prune()
+        print(f"Blob store: {self.asset_store.summary()}, {pruned} unused blobs pruned")
+        if self.resource_policy is not None:
+            print(f"Resources: {self.resource_policy.summary()}")
         print(f"\nOpen: {os.path.abspath(index_file)}")
         print("="*60 + "\n")
 
@@ -435,13 +446,37 @@ def main():
     parser.add_argument('url', nargs='?', default='https://www.stumptowncoffee.com/')
     parser.add_argument('-o', '--output', default='stumptown_rendered')
     parser.add_argument('-d', '--depth', type=int, default=3)
+    parser.add_argument('--blob-dir', default=None,
+                       help='Shared blob store for deduplicated assets (default: OUTPUT/.blobs)')
+    parser.add_argument('--max-memory', type=float, default=1.0,
+                       help='Largest download kept in memory, in MB; bigger ones stream to disk (default: 1)')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                       help=f'Pages rendered at once, each in its own browser context (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--recycle-after', type=int, default=DEFAULT_RECYCLE_AFTER,
+                       help=f'Navigations before a worker\'s browser context is replaced (default: {DEFAULT_RECYCLE_AFTER})')
+    parser.add_argument('--ready-timeout', type=float, default=DEFAULT_READY_TIMEOUT,
+                       help=f'Longest wait for a page to settle before it is captured anyway, in seconds (default: {DEFAULT_READY_TIMEOUT:g})')
+    add_policy_arguments(parser, SAVED_TYPES)
+    add_scroll_arguments(parser)
+    parser.add_argument('--styles', choices=STYLE_MODES, default='inline',
+                       help='Computed styles as inline style attributes, or as deduplicated classes '
+                            'without UA defaults (smaller pages) (default: inline)')
     
     args = parser.parse_args()
     
     cloner = FullRenderCloner(
         base_url=args.url,
         output_dir=args.output,
-        max_depth=args.depth
+        max_depth=args.depth,
+        blob_dir=args.blob_dir,
+        max_memory=int(args.max_memory * 1024 * 1024),
+        workers=args.workers,
+        recycle_after=args.recycle_after,
+        ready_timeout=args.ready_timeout,
+        resource_policy=policy_from_args(args, urlparse(args.url).netloc),
+        styles=args.styles,
+        max_scroll_height=args.scroll_max_height,
+        max_scroll_time=args.scroll_max_time
     )
     
     cloner.clone()
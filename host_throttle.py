@@ -0,0 +1,255 @@
+"""
+Host Throttle - Per-host rate and concurrency control for the cloners
+Each host gets a token bucket (one token per request, refilled every
+`interval` seconds) and a concurrency limit. Healthy, fast responses raise the
+limit by one per window and shorten the interval; 429/503, Retry-After,
+timeouts and server errors halve the limit and double the interval (AIMD).
+robots.txt Crawl-delay / Request-rate set a floor a host never goes below, so
+CDNs can run wide while the origin stays gentle.
+
+A policy can be set for one kind of request to a host (e.g. the origin's
+assets, next to its pages); slots of that kind then get a bucket of their own.
+A host whose robots.txt asks for a delay keeps one bucket for everything.
+"""
+
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+
+BACKOFF_STATUSES = {429, 503}
+MAX_INTERVAL = 30.0        # Slowest a host is ever throttled to, in seconds per request
+MAX_RETRY_AFTER = 300.0    # Longest Retry-After honoured
+SLOW_FACTOR = 3.0          # Latency this many times the host's best counts as congestion
+LATENCY_WEIGHT = 0.2       # EWMA weight of the newest latency sample
+
+
+def retry_after_seconds(value, now=None):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date), or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - (now if now is not None else time.time()))
+
+
+class HostState:
+    """Token bucket, AIMD concurrency limit and latency estimate for one host"""
+    def __init__(self, interval, floor, max_concurrency, jitter):
+        self.floor = floor
+        self.interval = max(interval, floor)
+        self.cap = max_concurrency
+        self.limit = min(2.0, float(max_concurrency))
+        self.jitter = jitter
+        self.in_flight = 0
+        self.tokens = 1.0
+        self.stamp = time.monotonic()
+        self.blocked_until = 0.0
+        self.latency = None
+        self.best_latency = None
+        self.requests = 0
+        self.backoffs = 0
+
+    def refill(self, now):
+        burst = max(1.0, float(int(self.limit)))
+        if self.interval <= 0:
+            self.tokens = burst
+        else:
+            self.tokens = min(burst, self.tokens + (now - self.stamp) / self.interval)
+        self.stamp = now
+
+    def wait_time(self, now):
+        """0 if a request may start now, seconds to wait, or None to wait for a free slot"""
+        if self.in_flight >= int(self.limit):
+            return None
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens < 1:
+            return (1 - self.tokens) * self.interval
+        return 0
+
+    def increase(self, latency):
+        """A healthy response: additive increase unless latency says the host is struggling"""
+        self.latency = latency if self.latency is None else (
+            LATENCY_WEIGHT * latency + (1 - LATENCY_WEIGHT) * self.latency)
+        if self.best_latency is None or latency < self.best_latency:
+            self.best_latency = latency
+
+        if self.latency > SLOW_FACTOR * self.best_latency and self.latency > 0.5:
+            self.interval = min(MAX_INTERVAL, max(self.floor, self.interval * 1.25))
+            return
+        self.limit = min(float(self.cap), self.limit + 1 / self.limit)
+        self.interval = max(self.floor, self.interval * 0.8)
+
+    def decrease(self, now, retry_after=None):
+        """Overload or failure: halve the limit, double the interval, honour Retry-After"""
+        self.backoffs += 1
+        self.limit = max(1.0, self.limit / 2)
+        self.interval = min(MAX_INTERVAL, max(self.floor, self.interval * 2, 0.25))
+        if retry_after is not None:
+            self.blocked_until = max(self.blocked_until, now + min(retry_after, MAX_RETRY_AFTER))
+
+
+class Slot:
+    """One admitted request; report the response with done(), release by leaving the with block"""
+    def __init__(self, throttle, host, kind=None):
+        self.throttle = throttle
+        self.host = host
+        self.kind = kind
+        self.key = None
+        self.started = None
+        self.recorded = False
+
+    def __enter__(self):
+        # The bucket actually used: (host, kind), or (host, None) without a policy for the kind
+        self.key = self.throttle.acquire(self.host, self.kind)
+        self.started = time.monotonic()
+        return self
+
+    def done(self, response):
+        """Record the status, Retry-After and time to headers of the response"""
+        self.recorded = True
+        self.throttle.observe(self.key, response.status_code, time.monotonic() - self.started,
+                              retry_after_seconds(response.headers.get('Retry-After')))
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.recorded and exc_type is not None:
+            # Timeout, refused connection, reset... - no response to look at
+            self.throttle.observe(self.key, None, time.monotonic() - self.started)
+        self.throttle.release(self.key)
+        return False
+
+
+class HostThrottle:
+    def __init__(self, session=None, interval=0.1, max_concurrency=8, robots=True):
+        """session fetches robots.txt (None: no robots lookups); interval is where every
+        host starts, and max_concurrency the most parallel requests to one host"""
+        self.session = session
+        self.interval = interval
+        self.max_concurrency = max_concurrency
+        self.robots = robots and session is not None
+        self.policies = {}  # (host, kind) -> dict(min_interval, max_concurrency, jitter)
+        self.hosts = {}     # (host, kind) -> HostState
+        self.robots_delays = {}  # host -> seconds asked for by robots.txt, or None
+        self.cond = threading.Condition()
+        self.host_locks = {}  # Held while a host's robots.txt is fetched
+        self.locks_lock = threading.Lock()
+
+    def policy(self, host, min_interval=0.0, max_concurrency=None, jitter=0.0, kind=None):
+        """Fixed limits for one host (e.g. the origin), or for one kind of request to it:
+        never faster than min_interval, never more than max_concurrency at once, plus up
+        to jitter random seconds"""
+        self.policies[(host, kind)] = {'min_interval': min_interval, 'max_concurrency': max_concurrency,
+                                       'jitter': jitter}
+
+    def slot(self, url, kind=None):
+        """Context manager that waits until the URL's host may take another request (of this kind)"""
+        return Slot(self, urlparse(url).netloc, kind)
+
+    def host_state(self, host, kind=None):
+        """(bucket key, state) for a request of kind to host"""
+        key = (host, kind) if (host, kind) in self.policies else (host, None)
+        state = self.hosts.get(key)
+        if state is not None:
+            return key, state
+
+        # First request to this host: robots.txt first, without holding up other hosts
+        with self.locks_lock:
+            host_lock = self.host_locks.setdefault(host, threading.Lock())
+        with host_lock:
+            if host not in self.robots_delays:
+                self.robots_delays[host] = self.robots_delay(host)
+            robots_delay = self.robots_delays[host]
+            if robots_delay:
+                key = (host, None)  # The delay is for the host as a whole
+            state = self.hosts.get(key)
+            if state is None:
+                policy = self.policies.get(key, {})
+                floor = max(policy.get('min_interval', 0.0), robots_delay or 0.0)
+                cap = policy.get('max_concurrency') or self.max_concurrency
+                if floor and floor >= 1.0:
+                    cap = 1  # A crawl delay means one request at a time
+                state = HostState(self.interval, floor, cap, policy.get('jitter', 0.0))
+                with self.cond:
+                    self.hosts[key] = state
+        return key, state
+
+    def robots_delay(self, host):
+        """Seconds between requests asked for by the host's robots.txt, or None"""
+        if not self.robots:
+            return None
+        parser = RobotFileParser()
+        for scheme in ('https', 'http'):
+            try:
+                response = self.session.get(f'{scheme}://{host}/robots.txt', timeout=10)
+            except Exception:
+                continue
+            if response.status_code != 200:
+                return None
+            parser.parse(response.text.splitlines())
+            break
+        else:
+            return None
+
+        agent = self.session.headers.get('User-Agent', '*')
+        delay = parser.crawl_delay(agent)
+        rate = parser.request_rate(agent)
+        delays = [float(delay)] if delay else []
+        if rate and rate.requests:
+            delays.append(rate.seconds / rate.requests)
+        return max(delays) if delays else None
+
+    def acquire(self, host, kind=None):
+        """Wait for a turn; returns the bucket key to release and observe"""
+        key, state = self.host_state(host, kind)
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                state.refill(now)
+                wait = state.wait_time(now)
+                if wait == 0:
+                    break
+                self.cond.wait(wait)
+            state.tokens -= 1
+            state.in_flight += 1
+            state.requests += 1
+            jitter = state.jitter
+        if jitter:
+            time.sleep(random.uniform(0, jitter))
+        return key
+
+    def release(self, key):
+        with self.cond:
+            self.hosts[key].in_flight -= 1
+            self.cond.notify_all()
+
+    def observe(self, key, status, latency, retry_after=None):
+        """Adjust a bucket's limits from one response (status None: the request failed)"""
+        with self.cond:
+            state = self.hosts[key]
+            now = time.monotonic()
+            if (status is None or status in BACKOFF_STATUSES or status >= 500
+                    or (retry_after is not None and status >= 400)):
+                state.decrease(now, retry_after)
+            elif status < 400:
+                state.increase(latency)
+            # Other 4xx say nothing about load
+            self.cond.notify_all()
+
+    def summary(self, top=5):
+        """Busiest hosts with the limits they settled at"""
+        with self.cond:
+            busiest = sorted(self.hosts.items(), key=lambda item: -item[1].requests)[:top]
+            return [f"{host}{f' ({kind})' if kind else ''}: {state.requests} requests, up to {int(state.limit)} at once, "
+                    f"{state.interval:.2f}s interval, {state.backoffs} backoffs"
+                    for (host, kind), state in busiest]
@@ -0,0 +1,149 @@
+"""
+HTML Extract - Single-pass URL extraction shared by the cloners
+Parses a page with lxml and walks the tree once, looking each element up in a
+precompiled tag -> attribute table, instead of one find_all() pass per
+(tag, attribute) pair. Each cloner supplies its own table (ExtractRules) and
+keeps its own URL normalisation on top of the raw values returned here.
+"""
+
+from lxml import etree
+
+
+# What an attribute value (or element text) holds
+URL = 'url'        # A single asset URL (srcset lists are split into these)
+SRCSET = 'srcset'  # Comma-separated "url descriptor" list
+CSS = 'css'        # CSS text; the caller pulls url() references out of it
+LINK = 'link'      # A hyperlink to crawl (<a href>)
+PAGE = 'page'      # Another page reference (canonical, alternate)
+REFRESH = 'refresh'  # <meta http-equiv="refresh"> content; the URL follows "url="
+DATA = 'data'      # Value of any data-* attribute, when ExtractRules(data_attrs=True)
+
+KINDS = (URL, CSS, LINK, PAGE, REFRESH, DATA)
+
+
+class ExtractRules:
+    """Precompiled extraction table
+
+    tag_attrs: iterable of (tag, attr, kind) or (tag, attr, kind, when), where
+               when(attrib) decides per element whether the rule applies
+    any_attrs: iterable of (attr, kind) checked on every element
+    text_tags: {tag: kind} for element text (e.g. {'style': CSS})
+    data_attrs: report every data-* attribute value as DATA
+    """
+    def __init__(self, tag_attrs=(), any_attrs=(), text_tags=None, data_attrs=False):
+        self.by_tag = {}
+        for rule in tag_attrs:
+            tag, attr, kind = rule[:3]
+            when = rule[3] if len(rule) > 3 else None
+            self.by_tag.setdefault(tag, []).append((attr, kind, when))
+        self.by_tag = {tag: tuple(rules) for tag, rules in self.by_tag.items()}
+        self.any_attrs = tuple(any_attrs)
+        self.text_tags = dict(text_tags or {})
+        self.data_attrs = data_attrs
+
+
+def split_srcset(srcset):
+    """URLs in a srcset value, skipping empty entries"""
+    urls = []
+    for part in srcset.split(','):
+        part = part.strip()
+        if part:
+            urls.append(part.split()[0])
+    return urls
+
+
+def parse_html(html_content):
+    """Parse HTML with lxml's HTML parser (the same one BeautifulSoup(..., 'lxml') uses)"""
+    # No made-up HTML 4 doctype for pages without one (html_rewrite serializes it)
+    parser = etree.HTMLParser(default_doctype=False)
+    try:
+        return etree.fromstring(html_content, parser)
+    except ValueError:
+        # str input with an XML encoding declaration
+        parser = etree.HTMLParser(encoding='utf-8', default_doctype=False)
+        return etree.fromstring(html_content.encode('utf-8'), parser)
+
+
+def is_soup(doc):
+    """True for a BeautifulSoup document (the bs4 backend), False for an lxml tree"""
+    return hasattr(doc, 'find_all')
+
+
+def elements(doc):
+    """(element, tag, attributes) for every element of an lxml tree or a BeautifulSoup"""
+    if is_soup(doc):
+        for element in doc.find_all(True):
+            yield element, element.name, element.attrs
+        return
+
+    for element in doc.iter():
+        tag = element.tag
+        if isinstance(tag, str):  # Skip comments and processing instructions
+            yield element, tag, element.attrib
+
+
+def element_text(element):
+    """Text content of a <style>-like element, None if it has none"""
+    if hasattr(element, 'string'):
+        return element.string
+    return element.text
+
+
+def extract(html_content, rules):
+    """Walk the page once and return {kind: [raw values]} for every rule that matched
+
+    html_content may be HTML text, or a document already parsed with lxml
+    (parse_html) or BeautifulSoup, so a page can be extracted and then rewritten
+    from the same tree.
+    """
+    found = {kind: [] for kind in KINDS}
+    root = parse_html(html_content) if isinstance(html_content, (str, bytes)) else html_content
+    if root is None:
+        return found
+
+    by_tag = rules.by_tag
+    any_attrs = rules.any_attrs
+    text_tags = rules.text_tags
+    data_attrs = rules.data_attrs
+
+    def emit(kind, value):
+        if kind == SRCSET:
+            found[URL].extend(split_srcset(value))
+        else:
+            found[kind].append(value)
+
+    for element, tag, attrib in elements(root):
+        for attr, kind, when in by_tag.get(tag, ()):
+            value = attrib.get(attr)
+            if value and (when is None or when(attrib)):
+                emit(kind, value)
+
+        if attrib:
+            for attr, kind in any_attrs:
+                value = attrib.get(attr)
+                if value:
+                    emit(kind, value)
+
+            if data_attrs:
+                for attr, value in attrib.items():
+                    if attr.startswith('data-'):
+                        found[DATA].append(value)
+
+        if tag in text_tags:
+            text = element_text(element)
+            if text:
+                emit(text_tags[tag], text)
+
+    return found
+
+
+def rel_has(*names):
+    """when() for rules that depend on <link rel="..."> tokens"""
+    names = set(names)
+
+    def when(attrib):
+        rel = attrib.get('rel', '')
+        # BeautifulSoup already splits rel into a list
+        return not names.isdisjoint(rel if isinstance(rel, list) else rel.split())
+
+    return when
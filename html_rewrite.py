@@ -0,0 +1,331 @@
+"""
+HTML Rewrite - Attribute rewriting shared by the cloners, on lxml or BeautifulSoup
+The lxml backend edits the parsed lxml tree in place and serializes it the way
+str(BeautifulSoup(html, 'lxml')) would, so both backends write the same bytes
+while lxml skips building (and holding) a second, BeautifulSoup copy of the DOM.
+Which attributes get rewritten is the same ExtractRules table used for extraction.
+"""
+
+import re
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+from html_extract import parse_html, elements, element_text, is_soup, URL, SRCSET
+
+
+BACKENDS = ('lxml', 'bs4')
+DEFAULT_BACKEND = 'lxml'
+
+# BeautifulSoup's HTML serialization rules (bs4.builder.HTMLTreeBuilder, formatter="minimal")
+VOID_TAGS = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem',
+    'meta', 'param', 'source', 'track', 'wbr',
+    'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex', 'nextid', 'spacer',
+}
+RAW_TEXT_TAGS = {'script', 'style'}        # Text written without escaping
+PRESERVE_WHITESPACE_TAGS = {'pre', 'textarea'}
+LIST_ATTRS = {                             # Whitespace-separated values, normalised to single spaces
+    '*': {'class', 'accesskey', 'dropzone'},
+    'a': {'rel', 'rev'},
+    'link': {'rel', 'rev'},
+    'td': {'headers'},
+    'th': {'headers'},
+    'form': {'accept-charset'},
+    'object': {'archive'},
+    'area': {'rel'},
+    'icon': {'sizes'},
+    'iframe': {'sandbox'},
+    'output': {'for'},
+}
+ASCII_SPACES = ' \n\t\x0c\r'
+
+# libxml2 fills in the name as the value of these when they are written bare
+# (<script defer> reads as defer="defer"), where BeautifulSoup sees defer="".
+# parse() checks such elements against the source, see restore_bare_attributes().
+BOOLEAN_ATTRS = (
+    'checked', 'compact', 'declare', 'defer', 'disabled', 'ismap', 'multiple',
+    'nohref', 'noresize', 'noshade', 'nowrap', 'readonly', 'selected',
+)
+BOOLEAN_ATTR_VALUES = etree.XPath('|'.join(f'//@{a}' for a in BOOLEAN_ATTRS))
+RAW_TEXT_SKIP = ('script', 'style', 'textarea', 'title')
+RAW_TEXT_PATTERN = '|'.join(RAW_TEXT_SKIP)
+START_TAG_PATTERN = r'''<!--|<(%s)(?=[\s/>])((?:[^>"']|"[^"]*"|'[^']*')*)>'''
+COMMENT_PATTERN = re.compile(r'(<!--.*?-->)', re.S)
+ATTR_PATTERN = re.compile(r'''([^\s"'>/=]+)(\s*=\s*(?:"[^"]*"|'[^']*'|[^\s>]+))?''')
+
+# BeautifulSoup writes the declared charset of a page as the output encoding
+META_CHARSET_PATTERN = re.compile(r'((^|;)\s*charset=)([^;]*)', re.M)
+OUTPUT_ENCODING = 'utf-8'
+
+
+def escape_text(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def quote_attr(value):
+    value = escape_text(value)
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    return '"' + value.replace('"', '&quot;') + '"'
+
+
+def collapse_space(text, preserve):
+    """BeautifulSoup keeps whitespace-only strings as a single newline or space"""
+    if preserve or text.strip(ASCII_SPACES):
+        return text
+    return '\n' if '\n' in text else ' '
+
+
+def has_doctype(tree):
+    # parse_html() turns off lxml's made-up default doctype
+    return tree.docinfo.internalDTD is not None
+
+
+def doctype_html(tree):
+    docinfo = tree.docinfo
+    value = docinfo.root_name or ''
+    if docinfo.public_id is not None:
+        value += f' PUBLIC "{docinfo.public_id}"'
+        if docinfo.system_url is not None:
+            value += f' "{docinfo.system_url}"'
+    elif docinfo.system_url is not None:
+        value += f' SYSTEM "{docinfo.system_url}"'
+    return f'<!DOCTYPE {value}>\n'
+
+
+def meta_charset(attrib):
+    """Attributes of a <meta> tag with the page encoding replaced, as BeautifulSoup does"""
+    if 'charset' in attrib:
+        return dict(attrib, charset=OUTPUT_ENCODING)
+    if 'content' in attrib and attrib.get('http-equiv', '').lower() == 'content-type':
+        content = META_CHARSET_PATTERN.sub(lambda m: m.group(1) + OUTPUT_ENCODING, attrib['content'])
+        return dict(attrib, content=content)
+    return attrib
+
+
+def soup_html(root):
+    """Serialize an lxml HTML tree byte for byte like str(BeautifulSoup(html, 'lxml'))"""
+    out = []
+    write = out.append
+
+    def node(el, preserve):
+        tag = el.tag
+        if tag is etree.Comment:
+            write(f'<!--{el.text or ""}-->')
+        elif tag is etree.ProcessingInstruction:
+            write(f'<?{el.target} {el.text or ""}>')
+        elif isinstance(tag, str):
+            element(el, preserve)
+
+        if el.tail:
+            write(escape_text(collapse_space(el.tail, preserve)))
+
+    def element(el, preserve):
+        tag = el.tag
+        attrib = el.attrib
+        if tag == 'meta':
+            attrib = meta_charset(attrib)
+
+        write('<' + tag)
+        for name, value in sorted(attrib.items()):
+            if name in LIST_ATTRS['*'] or name in LIST_ATTRS.get(tag, ()):
+                value = ' '.join(value.split())
+            write(f' {name}={quote_attr(value)}')
+
+        if tag in VOID_TAGS and not el.text and len(el) == 0:
+            write('/>')
+            return
+        write('>')
+
+        inner = preserve or tag in PRESERVE_WHITESPACE_TAGS
+        if el.text:
+            text = collapse_space(el.text, inner)
+            write(text if tag in RAW_TEXT_TAGS else escape_text(text))
+        for child in el:
+            node(child, inner)
+        write(f'</{tag}>')
+
+    tree = root.getroottree()
+    if has_doctype(tree):
+        write(doctype_html(tree))
+    for sibling in reversed(list(root.itersiblings(preceding=True))):
+        node(sibling, False)
+    node(root, False)
+    for sibling in root.itersiblings():
+        node(sibling, False)
+
+    return ''.join(out)
+
+
+def restore_trailing_space(root, html_content):
+    """Put back the whitespace after </html> (and between trailing comments) that lxml
+    drops and BeautifulSoup keeps"""
+    if isinstance(html_content, bytes):
+        html_content = html_content.decode('latin-1')
+    end = html_content.lower().rfind('</html>')
+    if end == -1:
+        return
+
+    # Whitespace runs between the top-level nodes that follow </html>
+    parts = COMMENT_PATTERN.split(html_content[end + len('</html>'):])
+    nodes = [root] + list(root.itersiblings())
+    spaces = parts[::2]
+    if len(spaces) != len(nodes) or any(space.strip(ASCII_SPACES) for space in spaces):
+        return  # Not just comments and whitespace after all
+
+    for node, space in zip(nodes, spaces):
+        if space:
+            node.tail = collapse_space(space, False)
+
+
+def restore_bare_attributes(root, html_content):
+    """Set bare boolean attributes (<script defer>) back to "" as BeautifulSoup has them
+
+    The tree cannot tell them from an explicit defer="defer", so each such
+    element is matched to its start tag in the source: libxml2 records the
+    line a start tag ends on, and tags of one name on one line keep their order.
+    """
+    filled_in = [value.getparent() for value in BOOLEAN_ATTR_VALUES(root) if value == value.attrname]
+    if not filled_in:
+        return
+    if isinstance(html_content, bytes):
+        html_content = html_content.decode('latin-1')
+    source = html_content.lower()
+
+    for tag in {el.tag for el in filled_in}:
+        parsed = {}     # line -> elements whose start tag ends there, in order
+        for element in root.iter(tag):
+            parsed.setdefault(element.sourceline, []).append(element)
+        in_source = {}  # line -> attribute text of the start tags ending there
+        for line, attrs in scan_start_tags(source, tag):
+            in_source.setdefault(line, []).append(attrs)
+
+        for line in {el.sourceline for el in filled_in if el.tag == tag}:
+            group, start_tag_attrs = parsed[line], in_source.get(line, [])
+            if len(group) != len(start_tag_attrs):
+                continue  # Could not pair them up; leave the values as parsed
+            for element, attrs in zip(group, start_tag_attrs):
+                bare = {name for name, value in ATTR_PATTERN.findall(attrs) if not value}
+                for attr in BOOLEAN_ATTRS:
+                    if attr in bare and element.get(attr) == attr:
+                        element.set(attr, '')
+
+
+def scan_start_tags(source, tag):
+    """(line, attribute text) of each <tag ...> in lowercased source, skipping
+    comments and the contents of script, style, textarea and title"""
+    pattern = re.compile(START_TAG_PATTERN % (re.escape(tag) + '|' + RAW_TEXT_PATTERN))
+    pos = 0
+    line, counted = 1, 0
+    while pos != -1:
+        m = pattern.search(source, pos)
+        if m is None:
+            return
+        name = m.group(1)
+        if name is None:
+            pos = source.find('-->', m.end())  # A comment
+            continue
+
+        if name == tag:
+            # Line of the closing '>', which is what lxml reports as sourceline
+            line += source.count('\n', counted, m.end())
+            counted = m.end()
+            yield line, m.group(2)
+        pos = m.end()
+        if name in RAW_TEXT_SKIP:
+            pos = source.find('</' + name, pos)
+
+
+def parse(html_content, backend=DEFAULT_BACKEND):
+    """Parse a page for extract() and rewrite(): an lxml root, or a BeautifulSoup for 'bs4'"""
+    if backend == 'bs4':
+        return BeautifulSoup(html_content, 'lxml')
+
+    root = parse_html(html_content)
+    if root is not None:
+        restore_bare_attributes(root, html_content)
+        restore_trailing_space(root, html_content)
+    return root
+
+
+def serialize(doc):
+    """HTML text of a parsed page, identical for both backends"""
+    if doc is None:
+        return ''
+    if is_soup(doc):
+        return str(doc)
+    return soup_html(doc)
+
+
+def rewrite_srcset(srcset, rewrite_url):
+    """Apply rewrite_url to each URL of a srcset value, keeping the descriptors"""
+    new_parts = []
+    for part in srcset.split(','):
+        parts = part.strip().split()
+        if parts:
+            new_url = rewrite_url(parts[0])
+            if new_url is not None:
+                parts[0] = new_url
+            new_parts.append(' '.join(parts))
+    return ', '.join(new_parts)
+
+
+def rewrite(doc, rules, handlers):
+    """Rewrite a parsed page in place, in one walk
+
+    handlers maps a kind (URL, CSS, ...) to fn(value) returning the new value,
+    or None to keep it. SRCSET values go through the URL handler one URL at a
+    time unless a SRCSET handler is given.
+    """
+    if doc is None:
+        return doc
+
+    by_tag = rules.by_tag
+    any_attrs = rules.any_attrs
+    text_tags = rules.text_tags
+
+    def handle(kind, value):
+        if kind in handlers:
+            return handlers[kind](value)
+        if kind == SRCSET and URL in handlers:
+            return rewrite_srcset(value, handlers[URL])
+        return None
+
+    soup = is_soup(doc)
+
+    for element, tag, attrib in elements(doc):
+        for attr, kind, when in by_tag.get(tag, ()):
+            value = attrib.get(attr)
+            if value and (when is None or when(attrib)):
+                new_value = handle(kind, value)
+                if new_value is not None:
+                    attrib[attr] = new_value
+
+        if attrib:
+            for attr, kind in any_attrs:
+                value = attrib.get(attr)
+                if value:
+                    new_value = handle(kind, value)
+                    if new_value is not None:
+                        attrib[attr] = new_value
+
+        if tag in text_tags:
+            text = element_text(element)
+            if text and (soup or len(element) == 0):
+                new_text = handle(text_tags[tag], text)
+                if new_text is not None:
+                    if soup:
+                        element.string = new_text
+                    else:
+                        element.text = new_text
+
+    return doc
+
+
+def rewrite_html(html_content, rules, handlers, backend=DEFAULT_BACKEND):
+    """Parse, rewrite and serialize a page. html_content may already be parsed (see parse())"""
+    doc = parse(html_content, backend) if isinstance(html_content, (str, bytes)) else html_content
+    return serialize(rewrite(doc, rules, handlers))
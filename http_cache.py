@@ -0,0 +1,135 @@
+"""
+HTTP Cache - Validator sidecar for incremental re-mirroring
+Remembers ETag, Last-Modified, content hash, fetch time and the URLs each saved
+file referenced, so a later run against the same output directory can send
+conditional requests and leave unchanged files alone
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+
+def body_digest(body):
+    """SHA-256 of a body given as bytes or as an already hashed ResponseBody"""
+    if hasattr(body, 'sha256'):
+        return body.sha256
+    return hashlib.sha256(body).hexdigest()
+
+
+class HttpCache:
+    def __init__(self, output_dir, filename='.http_cache.sqlite', enabled=True):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, filename)
+        self.enabled = enabled  # False: still record, but never revalidate
+        self.conn = None
+        self.lock = threading.Lock()
+        self.recorded = set()  # URLs written by this run
+
+    def open(self):
+        """Open (or create) the sidecar. Unlike crawl state, it is kept between runs."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                sha256 TEXT,
+                fetched_at REAL,
+                local_path TEXT,
+                assets TEXT,
+                pages TEXT
+            )
+        ''')
+        self.conn.commit()
+
+    def get(self, url):
+        """Cached entry for a URL as a dict, or None"""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT etag, last_modified, sha256, fetched_at, local_path, assets, pages '
+                'FROM entries WHERE url = ?', (url,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'etag': row[0],
+            'last_modified': row[1],
+            'sha256': row[2],
+            'fetched_at': row[3],
+            'local_path': os.path.join(self.output_dir, row[4]),
+            'assets': json.loads(row[5] or '[]'),
+            'pages': json.loads(row[6] or '[]'),
+        }
+
+    def _usable(self, url):
+        """Entry whose saved file is still on disk, when revalidation is on"""
+        if not self.enabled:
+            return None
+        entry = self.get(url)
+        if entry is None or not os.path.exists(entry['local_path']):
+            return None
+        return entry
+
+    def conditional_headers(self, url):
+        """If-None-Match / If-Modified-Since headers for a URL saved by an earlier run"""
+        entry = self._usable(url)
+        if entry is None:
+            return None
+        headers = {}
+        if entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers or None
+
+    def unchanged(self, url, status, headers, body):
+        """True when the saved copy is current: a 304, or a body identical to last time"""
+        entry = self._usable(url)
+        if entry is None:
+            return False
+        if status != 304 and body_digest(body) != entry['sha256']:
+            return False
+
+        # Servers may send fresh validators with a 304
+        with self.lock, self.conn:
+            self.conn.execute(
+                'UPDATE entries SET fetched_at = ?, etag = COALESCE(?, etag), '
+                'last_modified = COALESCE(?, last_modified) WHERE url = ?',
+                (time.time(), headers.get('ETag'), headers.get('Last-Modified'), url))
+        return True
+
+    def links(self, url):
+        """(assets, pages) the saved file for a URL referenced when it was fetched"""
+        entry = self.get(url)
+        if entry is None:
+            return set(), set()
+        return set(entry['assets']), set(entry['pages'])
+
+    def record(self, url, local_path, headers, body, assets=(), pages=()):
+        """Store validators for a file that has just been written"""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO entries '
+                '(url, etag, last_modified, sha256, fetched_at, local_path, assets, pages) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, headers.get('ETag'), headers.get('Last-Modified'),
+                 body_digest(body), time.time(),
+                 os.path.relpath(local_path, self.output_dir),
+                 json.dumps(sorted(assets)), json.dumps(sorted(pages))))
+            self.recorded.add(url)
+
+    def from_earlier_run(self, urls):
+        """The URLs whose cache entry was not written by this run"""
+        with self.lock:
+            return {url for url in urls if url not in self.recorded}
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,117 @@
+"""
+Lazy Scroll - Scroll a rendered page just far and long enough to load lazy content
+Instead of a fixed timer stepping a few hundred pixels at a time, each step
+scrolls most of a screen and then waits only as long as the page is busy:
+  - an IntersectionObserver tracks the images now in view that are still loading,
+  - a MutationObserver counts the nodes added,
+  - the page's RequestWatcher (see page_ready) says whether requests went out.
+A step that sets nothing off moves on almost at once. At the bottom, the
+scroll stops as soon as waiting brings no new nodes, requests or height; an
+infinite grid keeps growing until max_height or max_time is reached.
+"""
+
+import time
+import asyncio
+
+from page_ready import watch
+
+
+DEFAULT_MAX_SCROLL_HEIGHT = 30000  # Pixels; infinite grids are cut off here
+DEFAULT_MAX_SCROLL_TIME = 20.0     # Seconds for the whole scroll
+STEP_QUIET = 0.3      # Seconds a busy step has to stay still before the next one
+STEP_MIN_WAIT = 0.1   # Time for observers to fire and requests to start after a scroll
+STEP_TIMEOUT = 3.0    # Longest wait on one step
+POLL_INTERVAL = 0.05
+STEP_FRACTION = 0.9   # Of the viewport height per step, so nothing is skipped
+
+PROBE_SCRIPT = '''() => {
+    let state = window.__lazyScrollState;
+    if (!state) {
+        state = window.__lazyScrollState = {nodes: 0, last: performance.now(), visible: new Set()};
+        state.io = new IntersectionObserver(entries => {
+            entries.forEach(e => e.isIntersecting ? state.visible.add(e.target) : state.visible.delete(e.target));
+        });
+        const observe = (node) => {
+            if (node.tagName === 'IMG') state.io.observe(node);
+            if (node.querySelectorAll) node.querySelectorAll('img').forEach(img => state.io.observe(img));
+        };
+        new MutationObserver(records => {
+            records.forEach(r => r.addedNodes.forEach(node => { state.nodes++; observe(node); }));
+            state.last = performance.now();
+        }).observe(document, {childList: true, subtree: true});
+        observe(document);
+    }
+    const root = document.scrollingElement || document.documentElement;
+    return {
+        nodes: state.nodes,
+        quietMs: performance.now() - state.last,
+        pendingImages: [...state.visible].filter(img => !img.complete).length,
+        y: window.scrollY,
+        viewport: window.innerHeight,
+        height: Math.max(root.scrollHeight, document.body ? document.body.scrollHeight : 0),
+    };
+}'''
+
+STEP_SCRIPT = f'() => window.scrollBy(0, Math.round(window.innerHeight * {STEP_FRACTION}))'
+
+
+async def settle(page, watcher, before, requests_before, deadline):
+    """Wait out one step; returns the page state once it is idle (or the step timed out)"""
+    started = time.monotonic()
+    while True:
+        await asyncio.sleep(POLL_INTERVAL)
+        state = await page.evaluate(PROBE_SCRIPT)
+        now = time.monotonic()
+        if now - started >= STEP_TIMEOUT or now >= deadline:
+            return state
+
+        busy = (state['nodes'] != before['nodes'] or watcher.count != requests_before
+                or state['pendingImages'])
+        if not busy:
+            if now - started >= STEP_MIN_WAIT:
+                return state
+        elif (state['quietMs'] >= STEP_QUIET * 1000 and not state['pendingImages']
+                and watcher.idle_for(now) >= STEP_QUIET):
+            return state
+
+
+async def scroll_page(page, max_height=DEFAULT_MAX_SCROLL_HEIGHT, max_time=DEFAULT_MAX_SCROLL_TIME):
+    """Scroll down until nothing new loads (or a cap is hit), then back to the top.
+    Returns (screens scrolled, why it stopped: 'end', 'height' or 'time')"""
+    watcher = watch(page)
+    deadline = time.monotonic() + max_time
+    steps = 0
+    reason = 'end'
+    try:
+        state = await page.evaluate(PROBE_SCRIPT)
+        while True:
+            if time.monotonic() >= deadline:
+                reason = 'time'
+                break
+            if state['y'] + state['viewport'] >= max_height:
+                reason = 'height'
+                break
+
+            at_bottom = state['y'] + state['viewport'] >= state['height'] - 2
+            if not at_bottom:
+                await page.evaluate(STEP_SCRIPT)
+                steps += 1
+
+            before, requests_before = state, watcher.count
+            state = await settle(page, watcher, before, requests_before, deadline)
+            grew = (state['nodes'] != before['nodes'] or state['height'] != before['height']
+                    or watcher.count != requests_before)
+            if at_bottom and not grew:
+                break
+        await page.evaluate('() => window.scrollTo(0, 0)')
+    except Exception:
+        reason = 'page gone'  # Navigated away or closed mid-scroll; capture what is there
+    return steps, reason
+
+
+def add_scroll_arguments(parser):
+    """--scroll-max-height / --scroll-max-time, shared by the Playwright cloners"""
+    parser.add_argument('--scroll-max-height', type=int, default=DEFAULT_MAX_SCROLL_HEIGHT,
+                       help=f'Deepest the lazy-load scroll goes, in pixels (default: {DEFAULT_MAX_SCROLL_HEIGHT})')
+    parser.add_argument('--scroll-max-time', type=float, default=DEFAULT_MAX_SCROLL_TIME,
+                       help=f'Longest the lazy-load scroll takes per page, in seconds (default: {DEFAULT_MAX_SCROLL_TIME:g})')
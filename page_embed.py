@@ -0,0 +1,313 @@
+"""
+Page Embed - Self-contained HTML from a rendered page, with the encoding done in Python
+The browser only marks what has to be embedded: PREPARE_SCRIPT copies the
+rendered DOM into an inert document, swaps every image, poster, srcset entry
+and style url() in the copy for a short token and every stylesheet link for a
+placeholder, then returns that (small) HTML and the URLs. The page itself is
+left as it was.
+The bodies come from the responses the page already received, caught while it
+loaded; anything it never requested is fetched through the page's own request
+context. Each distinct body is base64-encoded once per run, in worker threads,
+and its data URI cached by content hash, so a logo shared by every page costs
+one encode. Inlined stylesheets are cached by URL the same way.
+
+With shared_dir set, images and stylesheets are written once into that
+directory (named by content hash) and every page links to the same files, so
+a big clone stops repeating its fonts and CSS in each page. Fonts stay data
+URIs inside the shared stylesheets: browsers refuse font files across file://
+pages, and this way every page still opens offline.
+"""
+
+import os
+import re
+import html
+import base64
+import asyncio
+import hashlib
+import mimetypes
+from urllib.parse import urljoin, urlparse
+
+
+# Responses worth keeping: what ends up embedded (media stays a link, it is far too big)
+CAPTURED_TYPES = {'image', 'stylesheet', 'font'}
+FETCH_CONCURRENCY = 8
+
+# Directory next to the pages for --shared-assets output
+SHARED_DIR = '_shared'
+FONT_TYPES = ('font/', 'application/font', 'application/x-font', 'application/vnd.ms-fontobject')
+FONT_EXTENSIONS = ('.woff2', '.woff', '.ttf', '.otf', '.eot')
+
+TOKEN_PATTERN = re.compile(r'__embed_(\d+)__')
+STYLESHEET_PATTERN = re.compile(r'<style data-embed-href="([^"]*)"></style>')
+CSS_URL_PATTERN = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+# Elements whose computed background is copied into their inline style, for pages
+# where the image is set by a script or a stylesheet rule that does not survive
+CRITICAL_BACKGROUNDS = ('header, nav, main, section, article, footer, '
+                        'div[class*="hero"], div[class*="banner"], div[class*="slider"]')
+
+PREPARE_SCRIPT = '''(options) => {
+    // Everything is done on an inert copy: the page being rendered keeps its
+    // layout, and never requests the tokens as relative URLs
+    const doc = document.implementation.createHTMLDocument('');
+    doc.replaceChild(doc.importNode(document.documentElement, true), doc.documentElement);
+
+    const urls = [];
+    const index = new Map();
+    const token = (url) => {
+        if (!url || url.startsWith('data:') || url.startsWith('blob:')) return null;
+        let absolute;
+        try { absolute = new URL(url, document.baseURI).href; } catch (e) { return null; }
+        if (!index.has(absolute)) {
+            index.set(absolute, urls.length);
+            urls.push(absolute);
+        }
+        return '__embed_' + index.get(absolute) + '__';
+    };
+    const tokenizeCss = (css) => css.replace(/url\\(\\s*(["']?)([^"')]+)\\1\\s*\\)/g,
+        (match, quote, url) => { const t = token(url.trim()); return t ? 'url("' + t + '")' : match; });
+
+    if (options.backgrounds) {
+        // The copy has no layout; pair its elements with the page's by index
+        const copies = doc.querySelectorAll(options.backgrounds);
+        document.querySelectorAll(options.backgrounds).forEach((el, i) => {
+            const bg = getComputedStyle(el).backgroundImage;
+            if (copies[i] && bg && bg !== 'none' && !bg.includes('data:')) copies[i].style.backgroundImage = bg;
+        });
+    }
+
+    doc.querySelectorAll('img').forEach(img => {
+        ['src', 'data-src', 'data-lazy-src'].forEach(attr => {
+            const t = token(img.getAttribute(attr));
+            if (t) img.setAttribute(attr, t);
+        });
+    });
+    doc.querySelectorAll('img[srcset], source[srcset]').forEach(el => {
+        el.setAttribute('srcset', el.getAttribute('srcset').split(',').map(part => {
+            const [url, ...size] = part.trim().split(/\\s+/);
+            const t = token(url);
+            return t ? [t, ...size].join(' ') : part.trim();
+        }).join(', '));
+    });
+    doc.querySelectorAll('video[poster]').forEach(v => {
+        const t = token(v.getAttribute('poster'));
+        if (t) v.setAttribute('poster', t);
+    });
+    doc.querySelectorAll('[style*="url"]').forEach(el => {
+        el.setAttribute('style', tokenizeCss(el.getAttribute('style')));
+    });
+    doc.querySelectorAll('style').forEach(s => { s.textContent = tokenizeCss(s.textContent); });
+
+    const stylesheets = [];
+    doc.querySelectorAll('link[rel~="stylesheet"][href]').forEach(link => {
+        let href;
+        try { href = new URL(link.getAttribute('href'), document.baseURI).href; } catch (e) { return; }
+        const style = doc.createElement('style');
+        style.setAttribute('data-embed-href', href);
+        stylesheets.push(href);
+        link.replaceWith(style);
+    });
+
+    // Scripts will not work offline anyway
+    doc.querySelectorAll('script').forEach(s => s.remove());
+    if (options.unwrapNoscript) {
+        doc.querySelectorAll('noscript').forEach(s => {
+            const div = doc.createElement('div');
+            div.innerHTML = s.children.length ? s.innerHTML : s.textContent;  // Raw text when parsed with scripting on
+            s.replaceWith(div);
+        });
+    }
+
+    return {html: '<!DOCTYPE html>\\n' + doc.documentElement.outerHTML, urls: urls, stylesheets: stylesheets};
+}'''
+
+
+def media_type(content_type, url):
+    """Bare media type from a Content-Type header, guessed from the URL when missing"""
+    value = (content_type or '').split(';')[0].strip().lower()
+    return value or mimetypes.guess_type(url.split('?')[0])[0] or 'application/octet-stream'
+
+
+def is_font(media, url):
+    """Font by media type, or by extension (CDNs often send application/octet-stream)"""
+    return media.startswith(FONT_TYPES) or urlparse(url).path.lower().endswith(FONT_EXTENSIONS)
+
+
+def css_charset(content_type):
+    match = re.search(r'charset=["\']?([\w-]+)', content_type or '', re.I)
+    return match.group(1) if match else 'utf-8'
+
+
+class EmbedCache:
+    """Data URIs and inlined stylesheets for one run, shared by all pages and workers"""
+    def __init__(self, shared_dir=None):
+        """shared_dir: write images and stylesheets there once instead of inlining
+        them; pages are expected in its parent directory"""
+        self.shared_dir = shared_dir
+        if shared_dir:
+            os.makedirs(shared_dir, exist_ok=True)
+            self.shared_prefix = os.path.basename(os.path.normpath(shared_dir)) + '/'
+        self.digests = {}   # asset url -> sha1 of its body
+        self.uris = {}      # sha1 -> data URI, or file name in shared_dir
+        self.styles = {}    # stylesheet url -> css text as served
+        self.inlined = {}   # stylesheet url -> css text with its url()s embedded (or its shared file name)
+        self.fetching = {}  # url -> task, so concurrent pages fetch a URL once
+        self.failed = set() # urls that could not be fetched; not tried again
+        self.counts = {'encoded': 0, 'embedded': 0, 'fetched': 0, 'missing': 0, 'written': 0}
+
+    def attach(self, page):
+        """Keep the bodies of the page's responses (BrowserPool on_page)"""
+        page.on('response', self.on_response)
+
+    async def on_response(self, response):
+        request = response.request
+        if (request.resource_type not in CAPTURED_TYPES or request.method != 'GET'
+                or response.status != 200 or response.url in self.digests or response.url in self.styles):
+            return
+        try:
+            body = await response.body()
+        except Exception:
+            return  # Page navigated away or the body was evicted
+        await asyncio.to_thread(self.store, response.url, response.headers.get('content-type'),
+                                body, request.resource_type == 'stylesheet', request.resource_type == 'font')
+
+    def store(self, url, content_type, body, stylesheet=False, font=False):
+        """Remember one body; encodes it unless the same bytes were seen before.
+        Fonts (font=True, or by type or extension) are always data URIs."""
+        if stylesheet:
+            self.styles[url] = body.decode(css_charset(content_type), errors='replace')
+            return
+        digest = hashlib.sha1(body).hexdigest()
+        if digest not in self.uris:
+            media = media_type(content_type, url)
+            if self.shared_dir and not (font or is_font(media, url)):
+                extension = mimetypes.guess_extension(media) or os.path.splitext(urlparse(url).path)[1][:8]
+                self.uris[digest] = self.write_shared(digest[:16] + extension, body)
+            else:
+                encoded = base64.b64encode(body).decode('ascii')
+                self.uris[digest] = f"data:{media};base64,{encoded}"
+                self.counts['encoded'] += 1
+        self.digests[url] = digest
+
+    def write_shared(self, name, body):
+        """Write one shared file (content-addressed, so an existing one is already right)"""
+        path = os.path.join(self.shared_dir, name)
+        if not os.path.exists(path):
+            temp = f"{path}.{os.getpid()}.{id(body)}.tmp"
+            with open(temp, 'wb') as f:
+                f.write(body)
+            os.replace(temp, path)
+            self.counts['written'] += 1
+        return name
+
+    def data_uri(self, url, in_shared_dir=False):
+        """What to put in place of url: a data URI, or the path of its shared file
+        (relative to the pages, or to the shared directory itself for stylesheets)"""
+        digest = self.digests.get(url)
+        if digest is None:
+            return None
+        self.counts['embedded'] += 1
+        uri = self.uris[digest]
+        if uri.startswith('data:') or in_shared_dir:
+            return uri
+        return self.shared_prefix + uri
+
+    async def fetch(self, page, url, stylesheet=False):
+        """Body the page never loaded itself, through its request context (same cookies)"""
+        try:
+            response = await page.request.get(url, timeout=30000)
+            body = await response.body() if response.ok else None
+        except Exception:
+            body = None
+        if body is None:
+            self.failed.add(url)
+            self.counts['missing'] += 1
+            return
+        self.counts['fetched'] += 1
+        await asyncio.to_thread(self.store, url, response.headers.get('content-type'), body, stylesheet)
+
+    async def ensure(self, page, urls, stylesheets=False):
+        """Fetch whichever of urls are not cached yet, FETCH_CONCURRENCY at a time"""
+        known = self.styles if stylesheets else self.digests
+        limit = asyncio.Semaphore(FETCH_CONCURRENCY)
+
+        async def one(url):
+            async with limit:
+                await self.fetch(page, url, stylesheets)
+
+        tasks = []
+        for url in dict.fromkeys(urls):
+            if url in known or url in self.failed:
+                continue
+            task = self.fetching.get(url)
+            if task is None:
+                task = self.fetching[url] = asyncio.ensure_future(one(url))
+                task.add_done_callback(lambda _, url=url: self.fetching.pop(url, None))
+            tasks.append(task)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def inline_css(self, page, url):
+        """A stylesheet with every url() in it turned into a data URI (cached per URL);
+        with shared_dir, the name of the shared file it was written to instead"""
+        if url in self.inlined:
+            return self.inlined[url]
+        css = self.styles.get(url)
+        if css is None:
+            return None
+
+        refs = {}
+        for _, ref in CSS_URL_PATTERN.findall(css):
+            ref = ref.strip()
+            if not ref.startswith(('data:', '#')):
+                refs[ref] = urljoin(url, ref)
+        await self.ensure(page, refs.values())
+
+        def embed(match):
+            ref = match.group(2).strip()
+            if ref not in refs:
+                return match.group(0)
+            uri = self.data_uri(refs[ref], in_shared_dir=True)
+            return f'url("{uri or refs[ref]}")'
+
+        css = CSS_URL_PATTERN.sub(embed, css)
+        if self.shared_dir:
+            text = css.encode('utf-8')
+            css = await asyncio.to_thread(self.write_shared, hashlib.sha1(text).hexdigest()[:16] + '.css', text)
+        self.inlined[url] = css
+        return css
+
+    async def embed(self, page, backgrounds=CRITICAL_BACKGROUNDS, unwrap_noscript=True):
+        """The rendered page as one self-contained HTML document (or one that links
+        to the shared directory)"""
+        prepared = await page.evaluate(PREPARE_SCRIPT, {'backgrounds': backgrounds,
+                                                        'unwrapNoscript': unwrap_noscript})
+        urls = prepared['urls']
+        await asyncio.gather(self.ensure(page, urls), self.ensure(page, prepared['stylesheets'], stylesheets=True))
+
+        css = {}
+        for href in dict.fromkeys(prepared['stylesheets']):
+            css[href] = await self.inline_css(page, href)
+
+        def asset(match):
+            url = urls[int(match.group(1))]
+            return self.data_uri(url) or url
+
+        def stylesheet(match):
+            text = css.get(html.unescape(match.group(1)))
+            if text is None:
+                return f'<link rel="stylesheet" href="{match.group(1)}">'
+            if self.shared_dir:
+                return f'<link rel="stylesheet" href="{self.shared_prefix}{text}">'
+            return '<style>' + text.replace('</style', '<\\/style') + '</style>'
+
+        document = TOKEN_PATTERN.sub(asset, prepared['html'])
+        return STYLESHEET_PATTERN.sub(stylesheet, document)
+
+    def summary(self):
+        if self.shared_dir:
+            return (f"{self.counts['embedded']} references to {self.counts['written']} shared files "
+                    f"(+{self.counts['encoded']} inlined fonts), {self.counts['fetched']} fetched separately, "
+                    f"{self.counts['missing']} unavailable")
+        return (f"{self.counts['embedded']} embeds from {self.counts['encoded']} encoded assets, "
+                f"{self.counts['fetched']} fetched separately, {self.counts['missing']} unavailable")
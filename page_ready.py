@@ -0,0 +1,105 @@
+"""
+Page Ready - Decide when a rendered page has settled, instead of sleeping
+A page counts as ready once, for `quiet` seconds in a row:
+  - the DOM has stopped changing (MutationObserver on nodes, text and src/href),
+  - every eagerly loaded <img> is complete,
+  - document.fonts has finished loading,
+  - no requests are in flight (long-lived streams and stuck requests aside).
+wait_until_ready() polls that state and gives up after a per-page timeout, so a
+busy page is captured anyway, just no later than the old fixed sleeps.
+"""
+
+import time
+import asyncio
+
+
+DEFAULT_READY_TIMEOUT = 15.0  # Seconds before a page that never settles is captured anyway
+DEFAULT_QUIET = 0.5           # Seconds everything has to stay still
+POLL_INTERVAL = 0.1
+
+# Requests that never block readiness: streams stay open, and one stuck
+# request should not hold the page for the whole timeout
+IGNORED_RESOURCE_TYPES = {'websocket', 'eventsource', 'media'}
+STUCK_REQUEST_AGE = 5.0
+
+PROBE_SCRIPT = '''() => {
+    let state = window.__pageReadyState;
+    if (!state) {
+        state = window.__pageReadyState = {last: performance.now()};
+        new MutationObserver(() => { state.last = performance.now(); }).observe(document, {
+            childList: true, subtree: true, characterData: true,
+            attributes: true, attributeFilter: ['src', 'srcset', 'href'],
+        });
+    }
+    const pendingImages = [...document.images].filter(
+        img => !img.complete && img.loading !== 'lazy' && (img.currentSrc || img.src)).length;
+    return {
+        readyState: document.readyState,
+        quietMs: performance.now() - state.last,
+        pendingImages: pendingImages,
+        fontsLoaded: !document.fonts || document.fonts.status === 'loaded',
+    };
+}'''
+
+
+class RequestWatcher:
+    """In-flight requests of one page, from Playwright's request events"""
+    def __init__(self, page):
+        self.started = {}  # request -> time it was sent
+        self.last_activity = time.monotonic()
+        self.count = 0     # Requests seen so far, to tell whether anything new was asked for
+        page.on('request', self.on_request)
+        page.on('requestfinished', self.on_done)
+        page.on('requestfailed', self.on_done)
+
+    def on_request(self, request):
+        if request.resource_type not in IGNORED_RESOURCE_TYPES:
+            self.count += 1
+            self.started[request] = time.monotonic()
+            self.last_activity = self.started[request]
+
+    def on_done(self, request):
+        if self.started.pop(request, None) is not None:
+            self.last_activity = time.monotonic()
+
+    def idle_for(self, now):
+        """Seconds without a request in flight (0 while any that is not stuck is pending)"""
+        if any(now - sent < STUCK_REQUEST_AGE for sent in self.started.values()):
+            return 0.0
+        return now - self.last_activity
+
+
+watchers = {}  # page -> RequestWatcher
+
+
+def watch(page):
+    """Start counting a page's requests; call before navigating (BrowserPool on_page)"""
+    watcher = watchers.get(page)
+    if watcher is None:
+        watcher = watchers[page] = RequestWatcher(page)
+        page.on('close', lambda _: watchers.pop(page, None))
+    return watcher
+
+
+async def wait_until_ready(page, timeout=DEFAULT_READY_TIMEOUT, quiet=DEFAULT_QUIET):
+    """Wait until the page has settled; returns seconds waited, or None if it timed out"""
+    watcher = watch(page)
+    started = time.monotonic()
+    deadline = started + timeout
+
+    while True:
+        now = time.monotonic()
+        if now >= deadline:
+            return None
+
+        try:
+            state = await page.evaluate(PROBE_SCRIPT)
+        except Exception:
+            state = None  # Navigating, or the context is being replaced
+
+        if (state and state['readyState'] == 'complete' and state['quietMs'] >= quiet * 1000
+                and not state['pendingImages'] and state['fontsLoaded']
+                and watcher.idle_for(time.monotonic()) >= quiet):
+            return time.monotonic() - started
+
+        await asyncio.sleep(POLL_INTERVAL)
@@ -0,0 +1,89 @@
+"""
+Parse Pool - HTML, CSS and JS parsing in worker processes
+lxml and the regex scans hold the GIL, so however many download threads a
+crawl runs, its parsing and rewriting share one core. ParsePool moves that work
+into a ProcessPoolExecutor. Bodies reach the workers as file paths (a temp file
+in spill_dir, or the file that was just saved); only small results go back and
+forth: URL sets, a URL -> reference table, counts.
+
+Each worker process builds its own parser once, factory(**kwargs) - for the
+website cloner, a PageParser, which has no crawl state, session or stores -
+and a task names one of its methods. Network threads submit a task and wait
+on its result, which releases the GIL while the worker runs.
+
+Only website_cloner uses it. smart_cloner and robust_cloner fetch one page at
+a time, at least 0.5-3 s apart, so parsing never holds anything up there, and
+site_downloader's async crawl already parses off its event loop.
+"""
+
+import os
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from requests.compat import chardet
+
+
+_worker = None  # The parser object of this worker process
+
+
+def _start_worker(factory, kwargs):
+    global _worker
+    _worker = factory(**kwargs)
+
+
+def _run(method, args):
+    return getattr(_worker, method)(*args)
+
+
+def read_bytes(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def decode_body(body, encoding=None):
+    """Bytes to text the way requests' response.text does"""
+    if encoding is None:
+        encoding = chardet.detect(body)['encoding'] or 'utf-8'
+    try:
+        return str(body, encoding, errors='replace')
+    except LookupError:
+        return str(body, 'utf-8', errors='replace')
+
+
+def default_workers():
+    """One worker per core, leaving one for the crawl itself"""
+    return max(1, (os.cpu_count() or 2) - 1)
+
+
+class ParsePool:
+    def __init__(self, workers, factory, kwargs=None, spill_dir=None):
+        """workers: processes; factory(**kwargs) builds the object whose methods
+        the tasks call (it is pickled by reference, so a module-level class);
+        spill_dir holds bodies stashed for the workers"""
+        self.workers = max(1, workers)
+        self.spill_dir = spill_dir or tempfile.gettempdir()
+        # spawn, not fork: the crawl has threads (and their locks) running by now
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_start_worker, initargs=(factory, kwargs or {}))
+        self.tasks = 0
+
+    def call(self, method, *args):
+        """Run method(*args) on a worker's parser and wait for the result (exceptions are re-raised here)"""
+        self.tasks += 1
+        return self.executor.submit(_run, method, args).result()
+
+    def stash(self, body):
+        """Write a body to a temp file the workers can read; the caller removes it"""
+        os.makedirs(self.spill_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix='.parse', dir=self.spill_dir)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(body)
+        return path
+
+    def close(self, wait=True):
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    def summary(self):
+        return f"{self.tasks} tasks on {self.workers} worker processes"
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Precompress - Write .br and .gz siblings of a site's compressible files
+The build step behind static_server's Accept-Encoding support: each HTML, CSS,
+JS, SVG (...) file gets a brotli and a gzip copy next to it, compressed once at
+the highest levels instead of on every request. A variant is stamped with its
+source's mtime; the server only uses one that still matches, so editing a file
+never serves a stale copy, and re-running this only redoes the changed files.
+Variants that would not be smaller than the file are not written.
+
+Usage: python precompress.py [stumptown_static] [--min-size 256]
+"""
+
+import os
+import sys
+import gzip
+import argparse
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # .gz only
+
+from static_server import COMPRESSIBLE, VARIANTS, variant_is_current
+
+
+DEFAULT_MIN_SIZE = 256  # Bytes; below this the headers outweigh the savings
+
+
+def compress(encoding, data):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)  # mtime=0: same input, same bytes
+
+
+def precompress_file(path, stat=None, force=False):
+    """Write path's missing or outdated variants; returns {encoding: size written}"""
+    stat = stat or os.stat(path)
+    written = {}
+    data = None
+    for encoding, suffix in VARIANTS:
+        if encoding == 'br' and brotli is None:
+            continue
+        variant = path + suffix
+        if not force and variant_is_current(variant, stat):
+            continue
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        body = compress(encoding, data)
+        if len(body) >= len(data):
+            if os.path.exists(variant):
+                os.remove(variant)  # An older, smaller variant of a file that no longer compresses
+            continue
+        temp = variant + '.tmp'
+        with open(temp, 'wb') as f:
+            f.write(body)
+        os.utime(temp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        os.replace(temp, variant)
+        written[encoding] = len(body)
+    return written
+
+
+def precompress_tree(root, min_size=DEFAULT_MIN_SIZE, force=False):
+    """precompress_file() every compressible file under root (dot-directories skipped);
+    returns (files checked, files compressed, bytes in, {encoding: bytes out})"""
+    checked = compressed = size_in = 0
+    size_out = {}
+    for directory, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]  # .blobs, .crawl_state, ...
+        for name in files:
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE:
+                continue
+            path = os.path.join(directory, name)
+            stat = os.stat(path)
+            if stat.st_size < min_size:
+                continue
+            checked += 1
+            written = precompress_file(path, stat, force)
+            if written:
+                compressed += 1
+                size_in += stat.st_size
+                for encoding, size in written.items():
+                    size_out[encoding] = size_out.get(encoding, 0) + size
+    return checked, compressed, size_in, size_out
+
+
+def summary(checked, compressed, size_in, size_out):
+    sizes = ', '.join(f"{encoding} {size / 1024:.0f}KB" for encoding, size in size_out.items())
+    return (f"{checked} compressible files, {compressed} (re)compressed"
+            + (f": {size_in / 1024:.0f}KB -> {sizes}" if compressed else ''))
+
+
+def main():
+    root = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description='Write .br/.gz siblings of compressible files for static_server')
+    parser.add_argument('directories', nargs='*', default=[os.path.join(root, 'stumptown_static')],
+                       help='Site directories to precompress (default: stumptown_static)')
+    parser.add_argument('--min-size', type=int, default=DEFAULT_MIN_SIZE,
+                       help=f'Skip files smaller than this many bytes (default: {DEFAULT_MIN_SIZE})')
+    parser.add_argument('--force', action='store_true',
+                       help='Recompress files whose variants are up to date')
+    args = parser.parse_args()
+
+    if brotli is None:
+        print("brotli is not installed; writing .gz only (pip install brotli)")
+    for directory in args.directories:
+        print(f"{directory}: {summary(*precompress_tree(directory, args.min_size, args.force))}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Resource Policy - What a Playwright page may load
+Installed with page.route(); every request is let through, stubbed (an empty
+200 response, so scripts waiting on onload carry on) or aborted, by resource
+type and by host. Presets:
+  capture   full fidelity, nothing blocked (no route installed at all)
+  lean      everything a clone saves, but no beacons or trackers
+  render    rendered DOM only: no images, media, fonts, beacons or trackers
+  discover  link graph only: also no stylesheets and no third-party hosts
+allow_hosts always load; deny_hosts never do.
+
+The cloners render each page once and save what that render loaded, so a
+policy applies to the whole run. Each cloner names the resource types it
+saves, and a policy that would block one of them (render and discover, for
+all of them) is refused; those presets are for stages that only read the
+DOM, such as critical_css.
+"""
+
+import argparse
+from urllib.parse import urlparse
+
+
+# Analytics, ads, tag managers and session recorders
+TRACKER_HOSTS = (
+    'google-analytics.com', 'googletagmanager.com', 'doubleclick.net', 'googlesyndication.com',
+    'googleadservices.com', 'facebook.net', 'facebook.com', 'hotjar.com', 'segment.io', 'segment.com',
+    'clarity.ms', 'bing.com', 'tiktok.com', 'pinterest.com', 'snapchat.com', 'criteo.com',
+    'newrelic.com', 'nr-data.net', 'fullstory.com', 'optimizely.com', 'klaviyo.com', 'attn.tv',
+    'yotpo.com', 'gorgias.chat', 'intercom.io', 'zendesk.com', 'sentry.io',
+)
+
+PRESETS = {
+    'capture': {},
+    'lean': {
+        'block_types': {'ping'},
+        'deny_hosts': TRACKER_HOSTS,
+    },
+    'render': {
+        'block_types': {'image', 'media', 'font', 'ping'},
+        'deny_hosts': TRACKER_HOSTS,
+    },
+    'discover': {
+        'block_types': {'image', 'media', 'font', 'ping', 'stylesheet', 'texttrack', 'manifest'},
+        'deny_hosts': TRACKER_HOSTS,
+        'first_party_only': True,
+    },
+}
+DEFAULT_PRESET = 'capture'
+
+# Blocked resources of these types get an empty body instead of an error
+STUB_BODIES = {
+    'script': 'application/javascript',
+    'stylesheet': 'text/css',
+}
+
+
+def host_matches(host, domains):
+    """True if host is one of domains or a subdomain of one"""
+    return any(host == d or host.endswith('.' + d) for d in domains)
+
+
+class ResourcePolicy:
+    def __init__(self, first_party, block_types=(), allow_hosts=(), deny_hosts=(), first_party_only=False):
+        """first_party: the site's own host; its subdomains (and www.) count as first party"""
+        first_party = first_party.split(':')[0]
+        self.first_party = first_party[4:] if first_party.startswith('www.') else first_party
+        self.block_types = set(block_types)
+        self.allow_hosts = tuple(allow_hosts)
+        self.deny_hosts = tuple(deny_hosts)
+        self.first_party_only = first_party_only
+        self.counts = {'stubbed': 0, 'aborted': 0}
+
+    @classmethod
+    def preset(cls, name, first_party, block_types=(), allow_hosts=(), deny_hosts=()):
+        """A preset, with extra types and hosts on top"""
+        options = PRESETS[name]
+        return cls(first_party,
+                   block_types=set(options.get('block_types', ())) | set(block_types),
+                   allow_hosts=allow_hosts,
+                   deny_hosts=tuple(options.get('deny_hosts', ())) + tuple(deny_hosts),
+                   first_party_only=options.get('first_party_only', False))
+
+    def removes(self, saved_types):
+        """Which of saved_types this policy keeps from loading (all of them when third-party hosts are cut)"""
+        if self.first_party_only:
+            return sorted(saved_types)
+        return sorted(set(saved_types) & self.block_types)
+
+    def blocks_nothing(self):
+        return not (self.block_types or self.deny_hosts or self.first_party_only)
+
+    def decide(self, url, resource_type, navigation=False):
+        """'continue', 'stub' or 'abort' for one request"""
+        if navigation or resource_type == 'document' or url.startswith('data:'):
+            return 'continue'
+
+        host = urlparse(url).hostname or ''
+        if host_matches(host, self.allow_hosts):
+            return 'continue'
+
+        blocked = (
+            host_matches(host, self.deny_hosts)
+            or (self.first_party_only and not host_matches(host, (self.first_party,)))
+            or resource_type in self.block_types
+        )
+        if not blocked:
+            return 'continue'
+        return 'stub' if resource_type in STUB_BODIES else 'abort'
+
+    async def handle(self, route):
+        request = route.request
+        action = self.decide(request.url, request.resource_type, request.is_navigation_request())
+        if action == 'continue':
+            await route.continue_()
+        elif action == 'stub':
+            self.counts['stubbed'] += 1
+            await route.fulfill(status=200, content_type=STUB_BODIES[request.resource_type], body='')
+        else:
+            self.counts['aborted'] += 1
+            await route.abort('blockedbyclient')
+
+    async def attach(self, page):
+        """Route the page's requests through this policy (nothing to do for full capture)"""
+        if not self.blocks_nothing():
+            await page.route('**/*', self.handle)
+
+    def summary(self):
+        return f"{self.counts['aborted']} requests blocked, {self.counts['stubbed']} stubbed"
+
+
+def check_policy(policy, saved_types):
+    """policy, unless it blocks a resource type the cloner saves (ValueError)"""
+    if policy is not None:
+        removed = policy.removes(saved_types)
+        if removed:
+            raise ValueError(f"resource policy blocks {', '.join(removed)}, which this cloner saves")
+    return policy
+
+
+def add_policy_arguments(parser, saved_types=(), default=DEFAULT_PRESET):
+    """--resources and friends, shared by the Playwright cloners; presets and
+    --block-types that would drop saved_types from the output are not offered"""
+    choices = [name for name in sorted(PRESETS) if not ResourcePolicy.preset(name, '').removes(saved_types)]
+    descriptions = {
+        'capture': 'capture (everything)',
+        'lean': 'lean (no beacons or trackers)',
+        'render': 'render (DOM only, no images/media/fonts/trackers)',
+        'discover': 'discover (links only, first-party, no styles)',
+    }
+
+    def block_types(value):
+        types = [t.strip() for t in value.split(',') if t.strip()]
+        saved = sorted(set(types) & set(saved_types))
+        if saved:
+            raise argparse.ArgumentTypeError(f"this cloner saves {', '.join(saved)}; not blockable")
+        return types
+
+    parser.add_argument('--resources', choices=choices, default=default,
+                       help=f"What pages may load: {' or '.join(descriptions[name] for name in choices)} "
+                            f'(default: {default})')
+    parser.add_argument('--block-types', type=block_types, default=[],
+                       help='Extra resource types to block, comma-separated (e.g. media,websocket)')
+    parser.add_argument('--allow-host', action='append', default=[],
+                       help='Host (and subdomains) always loaded, whatever the preset; repeatable')
+    parser.add_argument('--deny-host', action='append', default=[],
+                       help='Host (and subdomains) never loaded; repeatable')
+
+
+def policy_from_args(args, first_party):
+    return ResourcePolicy.preset(args.resources, first_party, block_types=args.block_types,
+                                 allow_hosts=args.allow_host, deny_hosts=args.deny_host)
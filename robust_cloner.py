@@ -6,7 +6,6 @@ Handles compression, cookies, and bot protection
 import os
 import re
 import sys
-import time
 import hashlib
 import random
 from urllib.parse import urljoin, urlparse, unquote
@@ -14,19 +13,72 @@ from collections import deque
 
 try:
     import requests
-    from bs4 import BeautifulSoup
     import brotli
 except ImportError:
     print("Installing required packages...")
     import subprocess
     subprocess.check_call([sys.executable, "-m", "pip", "install", "requests", "beautifulsoup4", "lxml", "brotli", "-q"])
     import requests
-    from bs4 import BeautifulSoup
     import brotli
 
+from crawl_state import CrawlState
+from asset_store import AssetStore
+from host_throttle import HostThrottle
+from html_extract import ExtractRules, extract, URL, SRCSET, CSS, LINK
+from html_rewrite import parse, rewrite_html, BACKENDS, DEFAULT_BACKEND
+from css_scan import find_refs, splice_refs, css_urls
+
+
+# What extract_from_html() collects, as one tag -> attribute table
+EXTRACT_RULES = ExtractRules(
+    tag_attrs=[
+        ('link', 'href', URL),
+        ('script', 'src', URL),
+        ('img', 'src', URL),
+        ('img', 'data-src', URL),
+        ('img', 'data-lazy-src', URL),
+        ('source', 'src', URL),
+        ('video', 'src', URL),
+        ('video', 'poster', URL),
+        ('audio', 'src', URL),
+        ('a', 'href', LINK),
+        # SEO meta images (favicons are covered by link href)
+        ('meta', 'content', URL, lambda a: 'image' in (a.get('property', '') or a.get('name', '')).lower()),
+    ],
+    any_attrs=[
+        ('srcset', SRCSET),
+        ('style', CSS),
+        # Background images from data attributes
+        ('data-background', URL),
+        ('data-bg', URL),
+        ('data-image', URL),
+        ('data-src', URL),
+    ],
+    text_tags={'style': CSS},
+)
+
+
+# What rewrite_html() points at local copies
+REWRITE_RULES = ExtractRules(
+    any_attrs=[
+        ('href', URL),
+        ('src', URL),
+        ('data-src', URL),
+        ('data-lazy-src', URL),
+        ('poster', URL),
+        ('data-background', URL),
+        ('data-bg', URL),
+        ('data-image', URL),
+        ('srcset', SRCSET),
+        ('style', CSS),
+    ],
+    text_tags={'style': CSS},
+)
+
 
 class RobustWebsiteCloner:
-    def __init__(self, base_url, output_dir="cloned_site", max_depth=10):
+    def __init__(self, base_url, output_dir="cloned_site", max_depth=10, resume=False, blob_dir=None,
+                 max_memory=1024 * 1024, html_parser=DEFAULT_BACKEND):
         self.base_url = base_url.rstrip('/')
         self.parsed_base = urlparse(self.base_url)
         self.base_domain = self.parsed_base.netloc
@@ -39,6 +91,17 @@ class RobustWebsiteCloner:
         self.failed_urls = set()
         self.pages_to_visit = deque()
         
+        # Checkpoints for --resume
+        self.resume = resume
+        self.state = CrawlState(self.output_dir)
+        
+        # Binary assets are stored once per distinct body and hardlinked into place.
+        # Downloads are streamed; bodies over max_memory bytes go to a temp file.
+        self.asset_store = AssetStore(self.output_dir, blob_dir, max_memory)
+        
+        # HTML backend for extraction and rewriting: 'lxml' or 'bs4' (same output)
+        self.html_parser = html_parser
+        
         # More realistic browser session
         self.session = requests.Session()
         
@@ -63,6 +126,12 @@ class RobustWebsiteCloner:
             'Upgrade-Insecure-Requests': '1',
         })
         
+        # The site's pages see 1-3 s between requests, to appear more human, and
+        # its assets 0.2 s; CDN hosts adapt their own rate (robots.txt crawl-delay permitting)
+        self.throttle = HostThrottle(self.session, interval=0.2)
+        self.throttle.policy(self.base_domain, min_interval=1.0, max_concurrency=1, jitter=2.0)
+        self.throttle.policy(self.base_domain, min_interval=0.2, max_concurrency=1, kind='assets')
+        
         self.asset_extensions = {
             '.css', '.js', '.png', '.jpg', '.jpeg', '.gif', '.svg', '.webp', '.ico',
             '.woff', '.woff2', '.ttf', '.eot', '.otf',
@@ -72,10 +141,6 @@ class RobustWebsiteCloner:
         
         os.makedirs(self.output_dir, exist_ok=True)
     
-    def get_random_delay(self):
-        """Random delay to appear more human"""
-        return random.uniform(1.0, 3.0)
-    
     def url_to_filepath(self, url, content_type=None):
         """Convert URL to local file path"""
         parsed = urlparse(url)
@@ -145,47 +210,54 @@ class RobustWebsiteCloner:
         
         return url
     
-    def fetch_url(self, url, is_page=False):
-        """Fetch a URL with retries and error handling"""
+    def fetch_url(self, url, is_page=False, read_body=None):
+        """Fetch a URL with retries and error handling
+        
+        With read_body, the body is streamed and read_body(response) reads it
+        while the host's slot is still held; returns (response, its result),
+        or (None, None).
+        """
         max_retries = 3
         
         for attempt in range(max_retries):
             try:
-                time.sleep(self.get_random_delay() if is_page else 0.2)
-                
                 # Rotate user agent occasionally
                 if random.random() < 0.1:
                     self.session.headers['User-Agent'] = random.choice(self.user_agents)
                 
-                response = self.session.get(url, timeout=30, allow_redirects=True)
-                response.raise_for_status()
-                
-                return response
+                # Waits for the host's turn, and after a 429/503 for as long as it asked
+                with self.throttle.slot(url, None if is_page else 'assets') as slot:
+                    response = self.session.get(url, timeout=30, allow_redirects=True,
+                                                stream=read_body is not None)
+                    slot.done(response)
+                    response.raise_for_status()
+                    if read_body is None:
+                        return response
+                    return response, read_body(response)
                 
             except requests.exceptions.Timeout:
                 print(f"  Timeout (attempt {attempt + 1}/{max_retries}): {url[:50]}...")
-                if attempt < max_retries - 1:
-                    time.sleep(5)
             except requests.exceptions.HTTPError as e:
                 if e.response.status_code == 403:
                     print(f"  Access denied (403): {url[:50]}...")
-                    return None
+                    break
                 elif e.response.status_code == 404:
                     print(f"  Not found (404): {url[:50]}...")
-                    return None
+                    break
                 else:
                     print(f"  HTTP error {e.response.status_code}: {url[:50]}...")
             except Exception as e:
                 print(f"  Error: {str(e)[:50]} - {url[:50]}...")
         
-        return None
+        return None if read_body is None else (None, None)
     
     def download_asset(self, url):
         """Download an asset"""
         if url in self.downloaded_assets or url in self.failed_urls:
             return self.url_to_local.get(url)
         
-        response = self.fetch_url(url)
+        # The body is read inside the host's slot, so the slot covers the whole download
+        response, body = self.fetch_url(url, read_body=self.asset_store.read)
         if not response:
             self.failed_urls.add(url)
             return None
@@ -196,12 +268,12 @@ class RobustWebsiteCloner:
             
             is_text = any(t in content_type for t in ['text', 'javascript', 'json', 'xml', 'css', 'svg'])
             
-            if is_text:
-                with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
-                    f.write(response.text)
-            else:
-                with open(local_path, 'wb') as f:
-                    f.write(response.content)
+            with body:
+                if is_text:
+                    with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
+                        f.write(body.text(response.encoding))
+                else:
+                    self.asset_store.save_body(local_path, body, content_type)
             
             self.downloaded_assets.add(url)
             self.url_to_local[url] = local_path
@@ -214,175 +286,103 @@ class RobustWebsiteCloner:
             return None
     
     def extract_from_html(self, html_content, page_url):
-        """Extract assets and links from HTML"""
-        soup = BeautifulSoup(html_content, 'lxml')
+        """Extract assets and links from HTML (one tree walk, see EXTRACT_RULES)"""
+        found = extract(html_content, EXTRACT_RULES)
         assets = set()
         pages = set()
         
-        # Extract assets from various elements
-        asset_selectors = [
-            ('link[href]', 'href'),
-            ('script[src]', 'src'),
-            ('img[src]', 'src'),
-            ('img[data-src]', 'data-src'),
-            ('img[data-lazy-src]', 'data-lazy-src'),
-            ('source[src]', 'src'),
-            ('video[src]', 'src'),
-            ('video[poster]', 'poster'),
-            ('audio[src]', 'src'),
-        ]
-        
-        for selector, attr in asset_selectors:
-            for element in soup.select(selector):
-                value = element.get(attr)
-                if value:
-                    url = self.normalize_url(value, page_url)
-                    if url:
-                        assets.add(url)
-        
-        # Handle srcset
-        for element in soup.select('[srcset]'):
-            srcset = element.get('srcset', '')
-            for part in srcset.split(','):
-                url_part = part.strip().split()[0] if part.strip() else None
-                if url_part:
-                    url = self.normalize_url(url_part, page_url)
-                    if url:
-                        assets.add(url)
-        
-        # Extract from inline styles
-        style_pattern = r'url\([\'"]?([^\'")\s]+)[\'"]?\)'
-        
-        for element in soup.find_all(style=True):
-            for url in re.findall(style_pattern, element.get('style', '')):
-                normalized = self.normalize_url(url, page_url)
-                if normalized:
-                    assets.add(normalized)
-        
-        for style in soup.find_all('style'):
-            if style.string:
-                for url in re.findall(style_pattern, style.string):
-                    normalized = self.normalize_url(url, page_url)
-                    if normalized:
-                        assets.add(normalized)
-        
-        # Extract background images from data attributes
-        for attr in ['data-background', 'data-bg', 'data-image', 'data-src']:
-            for element in soup.find_all(attrs={attr: True}):
-                url = self.normalize_url(element.get(attr), page_url)
-                if url:
-                    assets.add(url)
+        # Tag attributes, srcset entries and data-* backgrounds, plus url()
+        # references in style attributes and <style> tags
+        values = found[URL] + [url for css in found[CSS] for url in css_urls(css)]
+        for value in values:
+            url = self.normalize_url(value, page_url)
+            if url:
+                assets.add(url)
         
         # Extract page links
-        for a in soup.find_all('a', href=True):
-            href = a.get('href')
+        for href in found[LINK]:
             url = self.normalize_url(href, page_url)
             if url and self.is_same_domain(url) and not self.is_asset_url(url):
                 pages.add(url)
         
-        # Extract SEO meta images
-        for meta in soup.find_all('meta'):
-            prop = meta.get('property', '') or meta.get('name', '')
-            if 'image' in prop.lower():
-                url = self.normalize_url(meta.get('content', ''), page_url)
-                if url:
-                    assets.add(url)
-        
-        # Extract favicon
-        for link in soup.find_all('link', rel=lambda x: x and 'icon' in str(x).lower()):
-            url = self.normalize_url(link.get('href'), page_url)
-            if url:
-                assets.add(url)
-        
         return assets, pages
     
     def extract_from_css(self, css_content, css_url):
-        """Extract assets from CSS"""
+        """Extract assets from CSS: url() references, @imports and @font-face sources, in one pass"""
         assets = set()
-        patterns = [
-            r'url\([\'"]?([^\'")\s]+)[\'"]?\)',
-            r'@import\s+[\'"]([^\'"]+)[\'"]',
-        ]
-        for pattern in patterns:
-            for match in re.findall(pattern, css_content):
-                url = self.normalize_url(match, css_url)
-                if url:
-                    assets.add(url)
+        for value in css_urls(css_content):
+            url = self.normalize_url(value, css_url)
+            if url:
+                assets.add(url)
         return assets
     
     def rewrite_html(self, html_content, page_url):
-        """Rewrite URLs to local paths"""
-        soup = BeautifulSoup(html_content, 'lxml')
+        """Rewrite URLs to local paths (one tree walk, see REWRITE_RULES)"""
         page_local = self.url_to_filepath(page_url)
         
-        # Rewrite element attributes
-        attrs_to_rewrite = ['href', 'src', 'data-src', 'data-lazy-src', 'poster', 'data-background', 'data-bg', 'data-image']
-        
-        for attr in attrs_to_rewrite:
-            for element in soup.find_all(attrs={attr: True}):
-                value = element.get(attr)
-                if value:
-                    url = self.normalize_url(value, page_url)
-                    if url and url in self.url_to_local:
-                        try:
-                            rel_path = os.path.relpath(self.url_to_local[url], os.path.dirname(page_local))
-                            element[attr] = rel_path.replace('\\', '/')
-                        except ValueError:
-                            pass
-        
-        # Rewrite srcset
-        for element in soup.find_all(srcset=True):
-            srcset = element.get('srcset', '')
-            new_parts = []
-            for part in srcset.split(','):
-                parts = part.strip().split()
-                if parts:
-                    url = self.normalize_url(parts[0], page_url)
-                    if url and url in self.url_to_local:
-                        try:
-                            rel_path = os.path.relpath(self.url_to_local[url], os.path.dirname(page_local))
-                            parts[0] = rel_path.replace('\\', '/')
-                        except ValueError:
-                            pass
-                    new_parts.append(' '.join(parts))
-            element['srcset'] = ', '.join(new_parts)
-        
-        # Rewrite inline styles
-        def rewrite_css_url(match):
-            url = match.group(1)
-            normalized = self.normalize_url(url, page_url)
-            if normalized and normalized in self.url_to_local:
+        def rewrite_url(value):
+            url = self.normalize_url(value, page_url)
+            if url and url in self.url_to_local:
                 try:
-                    rel_path = os.path.relpath(self.url_to_local[normalized], os.path.dirname(page_local))
-                    return f'url("{rel_path.replace(chr(92), "/")}")'
+                    rel_path = os.path.relpath(self.url_to_local[url], os.path.dirname(page_local))
+                    return rel_path.replace('\\', '/')
                 except ValueError:
                     pass
-            return match.group(0)
-        
-        for element in soup.find_all(style=True):
-            style = element.get('style', '')
-            element['style'] = re.sub(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', rewrite_css_url, style)
+            return None
         
-        for style in soup.find_all('style'):
-            if style.string:
-                style.string = re.sub(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', rewrite_css_url, style.string)
+        # Inline styles and style tags
+        def rewrite_css_url(kind, value):
+            return rewrite_url(value)
         
-        return str(soup)
+        handlers = {
+            URL: rewrite_url,
+            CSS: lambda css: splice_refs(css, find_refs(css), rewrite_css_url)[0],
+        }
+        return rewrite_html(html_content, REWRITE_RULES, handlers, self.html_parser)
     
     def rewrite_css(self, css_content, css_url, css_local):
         """Rewrite URLs in CSS"""
-        def replace_url(match):
-            url = match.group(1)
-            normalized = self.normalize_url(url, css_url)
+        def replace_url(kind, value):
+            normalized = self.normalize_url(value, css_url)
             if normalized and normalized in self.url_to_local:
                 try:
                     rel_path = os.path.relpath(self.url_to_local[normalized], os.path.dirname(css_local))
-                    return f'url("{rel_path.replace(chr(92), "/")}")'
+                    return rel_path.replace('\\', '/')
                 except ValueError:
                     pass
-            return match.group(0)
+            return None
         
-        return re.sub(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', replace_url, css_content)
+        return splice_refs(css_content, find_refs(css_content), replace_url)[0]
+    
+    def save_checkpoint(self, phase, assets=(), processed=(), in_progress=None):
+        """Persist crawl progress so an interrupted run can be resumed"""
+        frontier = list(self.pages_to_visit)
+        visited = self.visited_urls
+        if in_progress:
+            frontier.insert(0, in_progress)
+            visited = visited - {in_progress[0]}
+        
+        self.state.save(
+            sets={
+                'visited': visited,
+                'downloaded': self.downloaded_assets,
+                'failed': self.failed_urls,
+                'assets': assets,
+                'processed': processed,
+            },
+            maps={'url_to_local': self.url_to_local},
+            frontier=frontier,
+            meta={'phase': phase},
+        )
+    
+    def restore_checkpoint(self):
+        """Load progress saved by save_checkpoint(); returns (phase, assets, processed)"""
+        self.visited_urls = self.state.load_set('visited')
+        self.downloaded_assets = self.state.load_set('downloaded')
+        self.failed_urls = self.state.load_set('failed')
+        self.url_to_local = self.state.load_map('url_to_local')
+        self.pages_to_visit = deque(self.state.load_frontier())
+        return self.state.get_meta('phase'), self.state.load_set('assets'), self.state.load_set('processed')
     
     def clone(self):
         """Main cloning method"""
@@ -397,74 +397,96 @@ class RobustWebsiteCloner:
         # First, establish a session by visiting the homepage
         print("[INIT] Establishing session...")
         
-        all_assets = set()
-        self.pages_to_visit.append((self.base_url, 0))
+        all_assets, processed = set(), set()
+        if self.state.open(resume=self.resume):
+            phase, all_assets, processed = self.restore_checkpoint()
+            print(f"[RESUME] Continuing from {phase} checkpoint: {len(self.visited_urls)} pages visited, "
+                  f"{len(self.pages_to_visit)} queued, {len(self.downloaded_assets)} files saved\n")
+        else:
+            self.pages_to_visit.append((self.base_url, 0))
         
         print("\n[PHASE 1] Crawling pages...\n")
         
-        while self.pages_to_visit:
-            url, depth = self.pages_to_visit.popleft()
-            
-            if url in self.visited_urls or depth > self.max_depth:
-                continue
-            
-            self.visited_urls.add(url)
-            
-            print(f"[PAGE] Depth {depth}: {url[:60]}...")
-            
-            response = self.fetch_url(url, is_page=True)
-            if not response:
-                self.failed_urls.add(url)
-                continue
-            
-            content_type = response.headers.get('Content-Type', '')
-            
-            if 'text/html' not in content_type:
-                # Not a page, download as asset
-                self.download_asset(url)
-                continue
-            
-            html_content = response.text
-            local_path = self.url_to_filepath(url)
-            
-            # Save HTML
-            with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
-                f.write(html_content)
-            
-            self.url_to_local[url] = local_path
-            self.downloaded_assets.add(url)
-            
-            # Extract assets and links
-            assets, pages = self.extract_from_html(html_content, url)
-            all_assets.update(assets)
-            
-            print(f"       Found {len(assets)} assets, {len(pages)} links")
-            
-            # Queue new pages
-            for page_url in pages:
-                if page_url not in self.visited_urls:
-                    self.pages_to_visit.append((page_url, depth + 1))
+        current = None
+        try:
+            while self.pages_to_visit:
+                current = None
+                if self.state.due():
+                    self.save_checkpoint('pages', all_assets, processed)
+                
+                url, depth = self.pages_to_visit.popleft()
+                
+                if url in self.visited_urls or depth > self.max_depth:
+                    continue
+                
+                self.visited_urls.add(url)
+                current = (url, depth)
+                
+                print(f"[PAGE] Depth {depth}: {url[:60]}...")
+                
+                response = self.fetch_url(url, is_page=True)
+                if not response:
+                    self.failed_urls.add(url)
+                    continue
+                
+                content_type = response.headers.get('Content-Type', '')
+                
+                if 'text/html' not in content_type:
+                    # Not a page, download as asset
+                    self.download_asset(url)
+                    continue
+                
+                html_content = response.text
+                local_path = self.url_to_filepath(url)
+                
+                # Save HTML
+                with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
+                    f.write(html_content)
+                
+                self.url_to_local[url] = local_path
+                self.downloaded_assets.add(url)
+                
+                # Extract assets and links
+                assets, pages = self.extract_from_html(parse(html_content, self.html_parser), url)
+                all_assets.update(assets)
+                
+                print(f"       Found {len(assets)} assets, {len(pages)} links")
+                
+                # Queue new pages
+                for page_url in pages:
+                    if page_url not in self.visited_urls:
+                        self.pages_to_visit.append((page_url, depth + 1))
+            current = None
+        finally:
+            self.save_checkpoint('pages', all_assets, processed, in_progress=current)
         
         # Phase 2: Download assets
         print(f"\n[PHASE 2] Downloading {len(all_assets)} assets...\n")
         
-        processed = set()
         to_process = all_assets.copy()
+        current_asset = None
         
-        while to_process - processed:
-            for asset_url in list(to_process - processed):
-                processed.add(asset_url)
-                local_path = self.download_asset(asset_url)
-                
-                # Process CSS for nested assets
-                if local_path and local_path.endswith('.css'):
-                    try:
-                        with open(local_path, 'r', encoding='utf-8', errors='replace') as f:
-                            css_content = f.read()
-                        nested = self.extract_from_css(css_content, asset_url)
-                        to_process.update(nested)
-                    except:
-                        pass
+        try:
+            while to_process - processed:
+                for asset_url in list(to_process - processed):
+                    if self.state.due():
+                        self.save_checkpoint('assets', to_process, processed)
+                    current_asset = asset_url
+                    processed.add(asset_url)
+                    local_path = self.download_asset(asset_url)
+                    
+                    # Process CSS for nested assets
+                    if local_path and local_path.endswith('.css'):
+                        try:
+                            with open(local_path, 'r', encoding='utf-8', errors='replace') as f:
+                                css_content = f.read()
+                            nested = self.extract_from_css(css_content, asset_url)
+                            to_process.update(nested)
+                        except:
+                            pass
+            current_asset = None
+        finally:
+            self.save_checkpoint('assets', to_process, processed - {current_asset})
         
         # Phase 3: Rewrite URLs
         print("\n[PHASE 3] Rewriting URLs to local paths...")
@@ -486,6 +508,9 @@ class RobustWebsiteCloner:
             except Exception as e:
                 print(f"  Warning: {local_path}: {e}")
         
+        self.save_checkpoint('done', to_process, processed)
+        self.state.close()
+        
         # Create root redirect
         main_domain_dir = os.path.join(self.output_dir, self.base_domain.replace(':', '_'))
         main_index = os.path.join(main_domain_dir, 'index.html')
@@ -513,6 +538,10 @@ class RobustWebsiteCloner:
         print(f"Pages downloaded: {len(self.visited_urls)}")
         print(f"Assets downloaded: {len(self.downloaded_assets)}")
         print(f"Failed downloads: {len(self.failed_urls)}")
+        pruned = self.asset_store.prune()
+        print(f"Blob store: {self.asset_store.summary()}, {pruned} unused blobs pruned")
+        for line in self.throttle.summary():
+            print(f"Host {line}")
         print(f"Output directory: {os.path.abspath(self.output_dir)}")
         
         if os.path.exists(root_index):
@@ -541,16 +570,31 @@ def main():
                        help='Output directory')
     parser.add_argument('-d', '--depth', type=int, default=5,
                        help='Max crawl depth')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue an interrupted clone from its last checkpoint')
+    parser.add_argument('--blob-dir', default=None,
+                       help='Shared blob store for deduplicated assets (default: OUTPUT/.blobs)')
+    parser.add_argument('--max-memory', type=float, default=1.0,
+                       help='Largest download kept in memory, in MB; bigger ones stream to disk (default: 1)')
+    parser.add_argument('--parser', choices=BACKENDS, default=DEFAULT_BACKEND,
+                       help='HTML backend for extraction and rewriting; both write the same output (default: lxml)')
     
     args = parser.parse_args()
     
     cloner = RobustWebsiteCloner(
         base_url=args.url,
         output_dir=args.output,
-        max_depth=args.depth
+        max_depth=args.depth,
+        resume=args.resume,
+        blob_dir=args.blob_dir,
+        max_memory=int(args.max_memory * 1024 * 1024),
+        html_parser=args.parser
     )
     
-    cloner.clone()
+    try:
+        cloner.clone()
+    except KeyboardInterrupt:
+        print("\n\nInterrupted - progress saved. Run again with --resume to continue.")
 
 
 if __name__ == '__main__':
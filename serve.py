@@ -1,58 +1,68 @@
 """
 Simple HTTP server to view Grainhouse Coffee site
 Serves the static site with all pages and cart functionality
+(threaded, keep-alive, ETag/304 and in-memory hot files; see static_server.py)
 """
 
-import http.server
 import os
-import socketserver
+import argparse
 import webbrowser
-import sys
+
+from static_server import StaticServer, add_server_arguments, serve_forever
+from precompress import precompress_tree, summary
 
 PORT = 8080
 # Use relative path from script location
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DIRECTORY = os.path.join(SCRIPT_DIR, "stumptown_static")
 
-class Handler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=DIRECTORY, **kwargs)
-    
-    def end_headers(self):
-        # Allow CORS for local testing
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Cache-Control', 'no-cache')
-        super().end_headers()
 
-if __name__ == "__main__":
-    os.chdir(DIRECTORY)
-    
+def main():
+    parser = argparse.ArgumentParser(description='Serve the Grainhouse Coffee site locally')
+    add_server_arguments(parser, PORT)
+    parser.add_argument('--directory', default=DIRECTORY,
+                       help='Directory to serve (default: stumptown_static)')
+    parser.add_argument('--no-browser', action='store_true',
+                       help='Do not open a browser window')
+    parser.add_argument('--precompress', action='store_true',
+                       help='Write .br/.gz copies of changed HTML, CSS and JS first (see precompress.py)')
+    args = parser.parse_args()
+    port = args.port
+
+    if args.precompress:
+        print(f"Precompressing: {summary(*precompress_tree(args.directory))}")
+
+    # Allow CORS for local testing. A fingerprinted build (build_assets.py) has
+    # its hashed assets cached for a year; everything else is revalidated.
+    server = StaticServer(args.directory, (args.bind, port), quiet=args.quiet,
+                          extra_headers=[('Access-Control-Allow-Origin', '*')])
+
     print("\n" + "="*55)
     print("   GRAINHOUSE COFFEE - LOCAL SERVER")
     print("="*55)
-    print(f"\n  Serving from: {DIRECTORY}")
+    print(f"\n  Serving from: {server.root}")
     print(f"\n  Open in browser:")
-    print(f"    http://localhost:{PORT}/")
+    print(f"    http://localhost:{port}/")
     print(f"\n  Available pages:")
-    print(f"    - Home:        http://localhost:{PORT}/index.html")
-    print(f"    - Shop:        http://localhost:{PORT}/collections.html")
-    print(f"    - Subscribe:   http://localhost:{PORT}/subscribe.html")
-    print(f"    - Locations:   http://localhost:{PORT}/locations.html")
-    print(f"    - Brew Guides: http://localhost:{PORT}/brew-guides.html")
-    print(f"    - Our Story:   http://localhost:{PORT}/our-story.html")
-    print(f"    - Gear:        http://localhost:{PORT}/gear.html")
+    print(f"    - Home:        http://localhost:{port}/index.html")
+    print(f"    - Shop:        http://localhost:{port}/collections.html")
+    print(f"    - Subscribe:   http://localhost:{port}/subscribe.html")
+    print(f"    - Locations:   http://localhost:{port}/locations.html")
+    print(f"    - Brew Guides: http://localhost:{port}/brew-guides.html")
+    print(f"    - Our Story:   http://localhost:{port}/our-story.html")
+    print(f"    - Gear:        http://localhost:{port}/gear.html")
     print(f"\n  Press Ctrl+C to stop the server")
     print("="*55 + "\n")
-    
+
     # Try to open browser
-    try:
-        webbrowser.open(f"http://localhost:{PORT}/")
-    except:
-        pass
-    
-    with socketserver.TCPServer(("", PORT), Handler) as httpd:
+    if not args.no_browser:
         try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print("\n\n  Server stopped. Thanks for brewing with us!\n")
+            webbrowser.open(f"http://localhost:{port}/")
+        except:
+            pass
+
+    serve_forever(server, "\n  Server stopped. Thanks for brewing with us!\n")
 
+
+if __name__ == "__main__":
+    main()
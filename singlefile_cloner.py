@@ -5,25 +5,23 @@ Works 100% offline - no external dependencies
 """
 
 import os
-import sys
-import time
-import base64
 import re
 import hashlib
 from urllib.parse import urljoin, urlparse, unquote
 from collections import deque
 
-try:
-    from playwright.sync_api import sync_playwright
-except ImportError:
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "playwright", "-q"])
-    subprocess.check_call([sys.executable, "-m", "playwright", "install", "chromium"])
-    from playwright.sync_api import sync_playwright
+from browser_pool import BrowserPool, Frontier, DEFAULT_WORKERS, DEFAULT_RECYCLE_AFTER
+from page_ready import watch, wait_until_ready, DEFAULT_READY_TIMEOUT
+from lazy_scroll import scroll_page, add_scroll_arguments, DEFAULT_MAX_SCROLL_HEIGHT, DEFAULT_MAX_SCROLL_TIME
+from page_embed import EmbedCache, SHARED_DIR, CAPTURED_TYPES
+from resource_policy import add_policy_arguments, policy_from_args, check_policy
 
 
 class SingleFileCloner:
-    def __init__(self, base_url, output_dir="cloned_site", max_depth=3):
+    def __init__(self, base_url, output_dir="cloned_site", max_depth=3, workers=DEFAULT_WORKERS,
+                 recycle_after=DEFAULT_RECYCLE_AFTER, ready_timeout=DEFAULT_READY_TIMEOUT,
+                 resource_policy=None, shared_assets=False, max_scroll_height=DEFAULT_MAX_SCROLL_HEIGHT,
+                 max_scroll_time=DEFAULT_MAX_SCROLL_TIME):
         self.base_url = base_url.rstrip('/')
         self.parsed_base = urlparse(self.base_url)
         self.base_domain = self.parsed_base.netloc
@@ -34,6 +32,24 @@ class SingleFileCloner:
         self.pages_to_visit = deque()
         self.page_files = {}  # url -> local filename
         
+        # Pages render in parallel, one browser context per worker
+        self.workers = workers
+        self.recycle_after = recycle_after
+        
+        # Longest wait for a rendered page to settle (see page_ready)
+        self.ready_timeout = ready_timeout
+        
+        # What rendered pages may load (see resource_policy); None loads everything
+        self.resource_policy = check_policy(resource_policy, CAPTURED_TYPES)
+        
+        # Caps on the lazy-load scroll, for infinite grids (see lazy_scroll)
+        self.max_scroll_height = max_scroll_height
+        self.max_scroll_time = max_scroll_time
+        
+        # Data URIs shared by every page: each asset is encoded once per run.
+        # shared_assets writes images and stylesheets once to OUTPUT/_shared instead.
+        self.embed_cache = EmbedCache(os.path.join(self.output_dir, SHARED_DIR) if shared_assets else None)
+        
         os.makedirs(self.output_dir, exist_ok=True)
     
     def url_to_filename(self, url):
@@ -65,235 +81,39 @@ class SingleFileCloner:
             url = 'https:' + url
         return urljoin(base or self.base_url, url).split('#')[0]
     
-    def capture_page_as_singlefile(self, page, url):
+    async def wait_ready(self, page):
+        """Wait for the page to settle (see page_ready), at most ready_timeout seconds"""
+        waited = await wait_until_ready(page, self.ready_timeout)
+        if waited is None:
+            print(f"    Still busy after {self.ready_timeout:g}s, carrying on")
+        else:
+            print(f"    Settled in {waited:.1f}s")
+    
+    async def capture_page_as_singlefile(self, page, url):
         """
         Capture a page with ALL resources embedded as base64
-        Uses Playwright to execute the embedding in-browser
+        The browser marks what to embed; bodies come from the page's own
+        responses and are encoded in Python, once per run (see page_embed)
         """
         try:
             print(f"    Navigating...")
-            page.goto(url, wait_until='networkidle', timeout=90000)
+            watch(page)
+            await page.goto(url, wait_until='networkidle', timeout=90000)
             
             # Wait for content
-            time.sleep(4)
+            await self.wait_ready(page)
             
-            # Scroll to trigger lazy loading
-            print(f"    Scrolling for lazy content...")
-            page.evaluate('''async () => {
-                await new Promise((resolve) => {
-                    let totalHeight = 0;
-                    const distance = 400;
-                    const timer = setInterval(() => {
-                        window.scrollBy(0, distance);
-                        totalHeight += distance;
-                        if (totalHeight >= document.body.scrollHeight) {
-                            clearInterval(timer);
-                            window.scrollTo(0, 0);
-                            resolve();
-                        }
-                    }, 150);
-                });
-            }''')
+            # Scroll until lazy content stops appearing (see lazy_scroll)
+            steps, stopped = await scroll_page(page, self.max_scroll_height, self.max_scroll_time)
+            print(f"    Scrolled {steps} screens for lazy content ({stopped})")
             
-            time.sleep(2)
+            # Lazy content the scroll triggered
+            await self.wait_ready(page)
             
             print(f"    Embedding all resources...")
             
-            # Comprehensive resource embedding script
-            single_html = page.evaluate('''async () => {
-                // Helper to convert blob/fetch to base64
-                async function toBase64(url) {
-                    try {
-                        const response = await fetch(url, { mode: 'cors', credentials: 'omit' });
-                        const blob = await response.blob();
-                        return new Promise((resolve, reject) => {
-                            const reader = new FileReader();
-                            reader.onloadend = () => resolve(reader.result);
-                            reader.onerror = reject;
-                            reader.readAsDataURL(blob);
-                        });
-                    } catch (e) {
-                        console.log('Failed to fetch:', url);
-                        return null;
-                    }
-                }
-                
-                // Helper to get computed background images
-                function getBackgroundImages(element) {
-                    const style = window.getComputedStyle(element);
-                    const bg = style.backgroundImage;
-                    const urls = [];
-                    const regex = /url\\(["']?([^"')]+)["']?\\)/g;
-                    let match;
-                    while ((match = regex.exec(bg)) !== null) {
-                        if (!match[1].startsWith('data:')) {
-                            urls.push(match[1]);
-                        }
-                    }
-                    return urls;
-                }
-                
-                // Collect all resource URLs
-                const resources = new Map();
-                
-                // Images
-                document.querySelectorAll('img').forEach(img => {
-                    ['src', 'data-src', 'data-lazy-src'].forEach(attr => {
-                        const url = img.getAttribute(attr);
-                        if (url && !url.startsWith('data:')) {
-                            resources.set(url, null);
-                        }
-                    });
-                    
-                    // srcset
-                    const srcset = img.getAttribute('srcset');
-                    if (srcset) {
-                        srcset.split(',').forEach(part => {
-                            const url = part.trim().split(' ')[0];
-                            if (url && !url.startsWith('data:')) {
-                                resources.set(url, null);
-                            }
-                        });
-                    }
-                });
-                
-                // Background images from computed styles
-                document.querySelectorAll('*').forEach(el => {
-                    getBackgroundImages(el).forEach(url => {
-                        resources.set(url, null);
-                    });
-                });
-                
-                // Videos (poster images)
-                document.querySelectorAll('video').forEach(v => {
-                    const poster = v.getAttribute('poster');
-                    if (poster && !poster.startsWith('data:')) {
-                        resources.set(poster, null);
-                    }
-                });
-                
-                // CSS files (we'll inline their content)
-                const styleSheets = [];
-                document.querySelectorAll('link[rel="stylesheet"]').forEach(link => {
-                    const href = link.getAttribute('href');
-                    if (href) {
-                        styleSheets.push({ element: link, url: href });
-                    }
-                });
-                
-                // Fetch and convert all images to base64
-                console.log('Fetching', resources.size, 'resources...');
-                
-                const fetchPromises = [];
-                for (const url of resources.keys()) {
-                    fetchPromises.push(
-                        toBase64(url).then(data => {
-                            if (data) resources.set(url, data);
-                        })
-                    );
-                }
-                
-                await Promise.all(fetchPromises);
-                
-                // Fetch and inline CSS
-                for (const { element, url } of styleSheets) {
-                    try {
-                        const absoluteUrl = new URL(url, window.location.href).href;
-                        const response = await fetch(absoluteUrl);
-                        let cssText = await response.text();
-                        
-                        // Replace url() in CSS with base64
-                        const cssUrls = cssText.match(/url\\(["']?([^"')]+)["']?\\)/g) || [];
-                        for (const cssUrl of cssUrls) {
-                            const match = cssUrl.match(/url\\(["']?([^"')]+)["']?\\)/);
-                            if (match && !match[1].startsWith('data:')) {
-                                const fullUrl = new URL(match[1], absoluteUrl).href;
-                                const data = await toBase64(fullUrl);
-                                if (data) {
-                                    cssText = cssText.replace(match[1], data);
-                                }
-                            }
-                        }
-                        
-                        // Replace link with style
-                        const style = document.createElement('style');
-                        style.textContent = cssText;
-                        element.parentNode.replaceChild(style, element);
-                    } catch (e) {
-                        console.log('CSS fetch failed:', url);
-                    }
-                }
-                
-                // Update all image sources to base64
-                document.querySelectorAll('img').forEach(img => {
-                    ['src', 'data-src', 'data-lazy-src'].forEach(attr => {
-                        const url = img.getAttribute(attr);
-                        if (url && resources.has(url) && resources.get(url)) {
-                            img.setAttribute(attr, resources.get(url));
-                        }
-                    });
-                    
-                    // Fix srcset
-                    const srcset = img.getAttribute('srcset');
-                    if (srcset) {
-                        let newSrcset = srcset;
-                        srcset.split(',').forEach(part => {
-                            const [url, size] = part.trim().split(' ');
-                            if (url && resources.has(url) && resources.get(url)) {
-                                newSrcset = newSrcset.replace(url, resources.get(url));
-                            }
-                        });
-                        img.setAttribute('srcset', newSrcset);
-                    }
-                    
-                    // Set src to actual rendered source if available
-                    if (img.currentSrc && img.currentSrc.startsWith('data:')) {
-                        img.src = img.currentSrc;
-                    }
-                });
-                
-                // Update background images in inline styles
-                document.querySelectorAll('[style*="url"]').forEach(el => {
-                    let style = el.getAttribute('style') || '';
-                    for (const [url, data] of resources.entries()) {
-                        if (data && style.includes(url)) {
-                            style = style.split(url).join(data);
-                        }
-                    }
-                    el.setAttribute('style', style);
-                });
-                
-                // Update video posters
-                document.querySelectorAll('video[poster]').forEach(v => {
-                    const poster = v.getAttribute('poster');
-                    if (poster && resources.has(poster) && resources.get(poster)) {
-                        v.setAttribute('poster', resources.get(poster));
-                    }
-                });
-                
-                // Inline all computed styles for key elements
-                const criticalElements = document.querySelectorAll('header, nav, main, section, article, footer, div[class*="hero"], div[class*="banner"], div[class*="slider"]');
-                criticalElements.forEach(el => {
-                    const computed = window.getComputedStyle(el);
-                    const bg = computed.backgroundImage;
-                    if (bg && bg !== 'none') {
-                        el.style.backgroundImage = bg;
-                    }
-                });
-                
-                // Remove scripts (they won't work offline anyway)
-                document.querySelectorAll('script').forEach(s => s.remove());
-                document.querySelectorAll('noscript').forEach(s => {
-                    // Show noscript content
-                    const content = s.innerHTML;
-                    const div = document.createElement('div');
-                    div.innerHTML = content;
-                    s.parentNode.replaceChild(div, s);
-                });
-                
-                // Get final HTML
-                return '<!DOCTYPE html>\\n' + document.documentElement.outerHTML;
-            }''')
+            # Images, backgrounds, posters and stylesheets as data URIs
+            single_html = await self.embed_cache.embed(page)
             
             return single_html
             
@@ -301,9 +121,9 @@ class SingleFileCloner:
             print(f"    Error: {str(e)[:60]}")
             return None
     
-    def extract_links(self, page, current_url):
+    async def extract_links(self, page, current_url):
         """Extract same-domain links from page"""
-        links = page.evaluate('''() => {
+        links = await page.evaluate('''() => {
             const links = [];
             document.querySelectorAll('a[href]').forEach(a => {
                 const href = a.getAttribute('href');
@@ -334,50 +154,36 @@ class SingleFileCloner:
         
         self.pages_to_visit.append((self.base_url, 0))
         
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-            )
-            page = context.new_page()
+        async def visit(page, url, depth):
+            filename = self.url_to_filename(url)
+            self.page_files[url] = filename
             
-            while self.pages_to_visit:
-                url, depth = self.pages_to_visit.popleft()
-                
-                if url in self.visited_urls or depth > self.max_depth:
-                    continue
-                
-                self.visited_urls.add(url)
-                filename = self.url_to_filename(url)
-                self.page_files[url] = filename
-                
-                print(f"[PAGE {len(self.visited_urls)}] Depth {depth}: {url[:50]}...")
-                
-                # Capture page
-                html = self.capture_page_as_singlefile(page, url)
-                
-                if html:
-                    # Save
-                    filepath = os.path.join(self.output_dir, filename)
-                    with open(filepath, 'w', encoding='utf-8') as f:
-                        f.write(html)
-                    print(f"    Saved: {filename} ({len(html)//1024}KB)")
-                    
-                    # Extract links for further crawling
-                    if depth < self.max_depth:
-                        links = self.extract_links(page, url)
-                        new_links = [l for l in links if l not in self.visited_urls]
-                        print(f"    Found {len(new_links)} new links")
-                        
-                        for link in new_links:
-                            self.pages_to_visit.append((link, depth + 1))
-                else:
-                    print(f"    FAILED to capture")
-                
-                print()
+            print(f"[PAGE {len(self.visited_urls)}] Depth {depth}: {url[:50]}...")
+            
+            # Capture page
+            html = await self.capture_page_as_singlefile(page, url)
             
-            browser.close()
+            if not html:
+                print(f"    FAILED to capture")
+                return ()
+            
+            # Save
+            filepath = os.path.join(self.output_dir, filename)
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write(html)
+            print(f"    Saved: {filename} ({len(html)//1024}KB)")
+            
+            # Extract links for further crawling. All of them, even at max depth or
+            # already seen: the frontier keeps each page's smallest depth
+            links = await self.extract_links(page, url)
+            print(f"    Found {len(links)} links")
+            return links
+        
+        pool = BrowserPool(self.workers, self.recycle_after, context_options={
+            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        }, on_page=self.embed_cache.attach, resource_policy=self.resource_policy)
+        pool.run(Frontier(self.pages_to_visit, self.visited_urls, self.max_depth), visit)
+        print()
         
         # Update internal links in all pages
         print("[FINALIZING] Updating internal links...")
@@ -424,6 +230,9 @@ class SingleFileCloner:
         print("  CLONE COMPLETE!")
         print("="*65)
         print(f"  Pages captured: {len(self.visited_urls)}")
+        print(f"  Embedding:      {self.embed_cache.summary()}")
+        if self.resource_policy is not None:
+            print(f"  Resources:      {self.resource_policy.summary()}")
         print(f"  Output folder:  {os.path.abspath(self.output_dir)}")
         print(f"\n  >>> Open: {os.path.abspath(index_path)}")
         print("="*65 + "\n")
@@ -436,10 +245,23 @@ def main():
     parser.add_argument('url', nargs='?', default='https://www.stumptowncoffee.com/')
     parser.add_argument('-o', '--output', default='stumptown_offline')
     parser.add_argument('-d', '--depth', type=int, default=2)
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                       help=f'Pages captured at once, each in its own browser context (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--recycle-after', type=int, default=DEFAULT_RECYCLE_AFTER,
+                       help=f'Navigations before a worker\'s browser context is replaced (default: {DEFAULT_RECYCLE_AFTER})')
+    parser.add_argument('--ready-timeout', type=float, default=DEFAULT_READY_TIMEOUT,
+                       help=f'Longest wait for a page to settle before it is captured anyway, in seconds (default: {DEFAULT_READY_TIMEOUT:g})')
+    add_policy_arguments(parser, CAPTURED_TYPES)
+    add_scroll_arguments(parser)
+    parser.add_argument('--shared-assets', action='store_true',
+                       help=f'Store images and stylesheets once in OUTPUT/{SHARED_DIR} and link them from every page, '
+                            'instead of inlining them into each one')
     
     args = parser.parse_args()
     
-    cloner = SingleFileCloner(args.url, args.output, args.depth)
+    cloner = SingleFileCloner(args.url, args.output, args.depth, args.workers, args.recycle_after, args.ready_timeout,
+                              policy_from_args(args, urlparse(args.url).netloc), args.shared_assets,
+                              max_scroll_height=args.scroll_max_height, max_scroll_time=args.scroll_max_time)
     cloner.clone()
 
 
@@ -9,6 +9,9 @@ import os
 import re
 import sys
 import time
+import asyncio
+import argparse
+import shutil
 import hashlib
 import mimetypes
 from urllib.parse import urljoin, urlparse, unquote, urlunparse
@@ -16,23 +19,87 @@ from collections import deque
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import requests
-from bs4 import BeautifulSoup
 from tqdm import tqdm
 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None  # Only needed for the async page crawl
+
+from crawl_state import CrawlState
+from http_cache import HttpCache
+from asset_store import AssetStore
+from html_extract import ExtractRules, extract, URL, SRCSET, CSS, LINK, DATA
+from html_rewrite import parse, BACKENDS, DEFAULT_BACKEND
+from precompress import precompress_tree, summary
+import static_server
+
+
+# What process_html() collects, as one tag -> attribute table
+EXTRACT_RULES = ExtractRules(
+    tag_attrs=[
+        ('a', 'href', LINK),
+        ('link', 'href', URL),          # CSS files, icons, preload, etc
+        ('script', 'src', URL),
+        ('img', 'src', URL),
+        ('img', 'srcset', SRCSET),
+        ('source', 'srcset', SRCSET),   # Picture sources
+        ('source', 'src', URL),
+        ('video', 'src', URL),
+        ('video', 'poster', URL),
+        ('audio', 'src', URL),
+        ('audio', 'poster', URL),
+        # Meta images (OG, Twitter cards for SEO)
+        ('meta', 'content', URL, lambda a: 'image' in a.get('property', '')),
+        ('meta', 'content', URL, lambda a: 'image' in a.get('name', '')),
+    ],
+    any_attrs=[('style', CSS)],
+    text_tags={'style': CSS},
+    data_attrs=True,
+)
+
 
 class WebsiteDownloader:
-    def __init__(self, base_url, output_dir="downloaded_site", max_workers=10):
+    def __init__(self, base_url, output_dir="downloaded_site", max_workers=10,
+                 async_pages=False, page_concurrency=16, per_host_limit=8, max_frontier=100000,
+                 resume=False, revalidate=True, blob_dir=None, max_memory=1024 * 1024,
+                 html_parser=DEFAULT_BACKEND, precompress=False):
         self.base_url = base_url.rstrip('/')
         self.parsed_base = urlparse(self.base_url)
         self.base_domain = self.parsed_base.netloc
         self.output_dir = output_dir
         self.max_workers = max_workers
         
+        # Async page crawl settings (Phase 1)
+        self.async_pages = async_pages
+        self.page_concurrency = page_concurrency  # Page fetches kept in flight
+        self.per_host_limit = per_host_limit      # Open connections per host
+        self.max_frontier = max_frontier          # Max queued pages before new links are dropped
+        
         # Tracking sets
         self.visited_urls = set()
         self.downloaded_assets = set()
         self.urls_to_visit = deque()
         self.failed_downloads = []
+        self.frontier_overflow = 0
+        
+        # Checkpoints for --resume
+        self.resume = resume
+        self.state = CrawlState(self.output_dir)
+        
+        # Validators from earlier runs, for conditional re-downloads
+        self.http_cache = HttpCache(self.output_dir, enabled=revalidate)
+        self.unchanged_urls = set()
+        
+        # Binary assets are stored once per distinct body and hardlinked into place.
+        # Downloads are streamed; bodies over max_memory bytes go to a temp file.
+        self.asset_store = AssetStore(self.output_dir, blob_dir, max_memory)
+        
+        # HTML backend for link extraction: 'lxml' or 'bs4' (same results)
+        self.html_parser = html_parser
+        
+        # Write .br/.gz siblings of pages, CSS and JS for serve_local.py
+        self.precompress = precompress
         
         # Session with retry logic
         self.session = requests.Session()
@@ -114,20 +181,37 @@ class WebsiteDownloader:
         return os.path.join(self.output_dir, path)
     
     def download_file(self, url, filepath=None, timeout=30):
-        """Download a file from URL"""
+        """Download a file from URL
+        
+        Returns (response, body), or (None, None) on failure. With a filepath the
+        body is streamed to disk and returned as a ResponseBody; without one
+        (pages, which are parsed whole anyway) it is the content bytes.
+        
+        A copy saved by an earlier run is revalidated; if it is still current
+        (304, or the same body) the URL goes in unchanged_urls and nothing is written.
+        """
+        body = None
         try:
-            response = self.session.get(url, timeout=timeout, allow_redirects=True)
+            response = self.session.get(url, timeout=timeout, allow_redirects=True, stream=True,
+                                        headers=self.http_cache.conditional_headers(url))
             response.raise_for_status()
             
+            body = self.asset_store.read(response) if filepath else response.content
+            
+            if self.http_cache.unchanged(url, response.status_code, response.headers, body):
+                self.unchanged_urls.add(url)
+                return response, body
+            
             if filepath:
-                os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                with open(filepath, 'wb') as f:
-                    f.write(response.content)
+                self.asset_store.save_body(filepath, body, response.headers.get('content-type', ''))
             
-            return response
+            return response, body
         except Exception as e:
             self.failed_downloads.append((url, str(e)))
-            return None
+            return None, None
+        finally:
+            if filepath and body is not None:
+                body.discard()
     
     def extract_urls_from_css(self, css_content, base_url):
         """Extract URLs from CSS content (url() references)"""
@@ -246,14 +330,13 @@ class WebsiteDownloader:
         return content
     
     def process_html(self, html_content, page_url):
-        """Process HTML content - extract links and assets"""
-        soup = BeautifulSoup(html_content, 'lxml')
+        """Process HTML content - extract links and assets (one tree walk, see EXTRACT_RULES)"""
+        found = extract(parse(html_content, self.html_parser), EXTRACT_RULES)
         assets = set()
         pages = set()
         
         # Extract all links (pages to crawl)
-        for tag in soup.find_all('a', href=True):
-            href = tag['href']
+        for href in found[LINK]:
             if href.startswith(('#', 'javascript:', 'mailto:', 'tel:')):
                 continue
             full_url = urljoin(page_url, href)
@@ -261,101 +344,21 @@ class WebsiteDownloader:
                 normalized = self.normalize_url(full_url)
                 pages.add(normalized)
         
-        # Extract CSS files
-        for tag in soup.find_all('link', rel='stylesheet'):
-            href = tag.get('href')
-            if href:
-                full_url = urljoin(page_url, href)
-                assets.add(full_url)
-        
-        # Extract all link tags (icons, preload, etc)
-        for tag in soup.find_all('link', href=True):
-            href = tag['href']
-            full_url = urljoin(page_url, href)
-            assets.add(full_url)
-        
-        # Extract JavaScript files
-        for tag in soup.find_all('script', src=True):
-            src = tag['src']
-            full_url = urljoin(page_url, src)
-            assets.add(full_url)
-        
-        # Extract images
-        for tag in soup.find_all('img', src=True):
-            src = tag['src']
+        # Stylesheets, icons, scripts, images, srcset entries, media sources
+        # and SEO meta images
+        for src in found[URL]:
             if not src.startswith('data:'):
-                full_url = urljoin(page_url, src)
-                assets.add(full_url)
-            # Also check srcset
-            srcset = tag.get('srcset')
-            if srcset:
-                for src_item in srcset.split(','):
-                    src_url = src_item.strip().split()[0]
-                    if not src_url.startswith('data:'):
-                        full_url = urljoin(page_url, src_url)
-                        assets.add(full_url)
-        
-        # Extract picture sources
-        for tag in soup.find_all('source'):
-            srcset = tag.get('srcset')
-            if srcset:
-                for src_item in srcset.split(','):
-                    src_url = src_item.strip().split()[0]
-                    if not src_url.startswith('data:'):
-                        full_url = urljoin(page_url, src_url)
-                        assets.add(full_url)
-        
-        # Extract video/audio sources
-        for tag in soup.find_all(['video', 'audio']):
-            src = tag.get('src')
-            if src:
-                full_url = urljoin(page_url, src)
-                assets.add(full_url)
-            poster = tag.get('poster')
-            if poster:
-                full_url = urljoin(page_url, poster)
-                assets.add(full_url)
-        
-        for tag in soup.find_all('source', src=True):
-            src = tag['src']
-            full_url = urljoin(page_url, src)
-            assets.add(full_url)
-        
-        # Extract background images from inline styles
-        for tag in soup.find_all(style=True):
-            style = tag['style']
-            urls = self.extract_urls_from_css(style, page_url)
-            assets.update(urls)
-        
-        # Extract from style tags
-        for tag in soup.find_all('style'):
-            if tag.string:
-                urls = self.extract_urls_from_css(tag.string, page_url)
-                assets.update(urls)
-        
-        # Extract meta images (OG, Twitter cards for SEO)
-        for tag in soup.find_all('meta', attrs={'property': True}):
-            if 'image' in tag.get('property', ''):
-                content = tag.get('content')
-                if content and not content.startswith('data:'):
-                    full_url = urljoin(page_url, content)
-                    assets.add(full_url)
-        
-        for tag in soup.find_all('meta', attrs={'name': True}):
-            if 'image' in tag.get('name', ''):
-                content = tag.get('content')
-                if content and not content.startswith('data:'):
-                    full_url = urljoin(page_url, content)
-                    assets.add(full_url)
+                assets.add(urljoin(page_url, src))
+        
+        # Background images from inline styles and style tags
+        for css in found[CSS]:
+            assets.update(self.extract_urls_from_css(css, page_url))
         
         # Extract data-* attributes that might contain URLs
-        for tag in soup.find_all(True):
-            for attr, value in tag.attrs.items():
-                if attr.startswith('data-') and isinstance(value, str):
-                    if any(ext in value.lower() for ext in ['.jpg', '.png', '.gif', '.svg', '.webp', '.css', '.js']):
-                        if not value.startswith('data:'):
-                            full_url = urljoin(page_url, value)
-                            assets.add(full_url)
+        for value in found[DATA]:
+            if any(ext in value.lower() for ext in ['.jpg', '.png', '.gif', '.svg', '.webp', '.css', '.js']):
+                if not value.startswith('data:'):
+                    assets.add(urljoin(page_url, value))
         
         return pages, assets
     
@@ -367,20 +370,31 @@ class WebsiteDownloader:
         self.downloaded_assets.add(url)
         filepath = self.url_to_filepath(url)
         
-        response = self.download_file(url, filepath)
+        response, body = self.download_file(url, filepath)
         if response is None:
             return False
         
+        # Saved copy is current - just follow what it referenced last time
+        if url in self.unchanged_urls:
+            nested_urls, _ = self.http_cache.links(url)
+            for nested_url in nested_urls:
+                if nested_url not in self.downloaded_assets:
+                    self.download_asset(nested_url)
+            return True
+        
+        nested_urls = set()
+        
         # If it's CSS, extract and download referenced assets
         content_type = response.headers.get('content-type', '')
         if 'css' in content_type or url.endswith('.css'):
             try:
-                css_content = response.text
+                css_content = body.text(response.encoding)
                 css_urls = self.extract_urls_from_css(css_content, url)
+                nested_urls = {css_url for css_url in css_urls if self.is_same_domain(css_url)}
                 
                 # Download CSS-referenced assets
-                for css_url in css_urls:
-                    if css_url not in self.downloaded_assets and self.is_same_domain(css_url):
+                for css_url in nested_urls:
+                    if css_url not in self.downloaded_assets:
                         self.download_asset(css_url)
                 
                 # Rewrite URLs in CSS
@@ -393,14 +407,15 @@ class WebsiteDownloader:
         # If it's JS, try to extract asset URLs
         elif 'javascript' in content_type or url.endswith('.js'):
             try:
-                js_content = response.text
-                js_urls = self.extract_urls_from_js(js_content, url)
-                for js_url in js_urls:
+                js_content = body.text(response.encoding)
+                nested_urls = self.extract_urls_from_js(js_content, url)
+                for js_url in nested_urls:
                     if js_url not in self.downloaded_assets:
                         self.download_asset(js_url)
             except Exception:
                 pass
         
+        self.http_cache.record(url, filepath, response.headers, body, assets=nested_urls)
         return True
     
     def rewrite_css_urls(self, css_content, base_url, css_filepath):
@@ -441,21 +456,34 @@ class WebsiteDownloader:
         
         self.visited_urls.add(url)
         
-        response = self.download_file(url)
+        response, body = self.download_file(url)
         if response is None:
             return set(), set()
         
-        content_type = response.headers.get('content-type', '')
+        if url in self.unchanged_urls:
+            assets, pages = self.http_cache.links(url)
+            return pages, assets
+        
+        encoding = response.encoding or response.apparent_encoding
+        return self.save_page(url, body, response.headers, encoding)
+    
+    def save_page(self, url, body, headers, encoding):
+        """Save a fetched page (rewriting HTML) and return its links and assets"""
+        content_type = headers.get('content-type', '')
         if 'text/html' not in content_type:
             # Not an HTML page, treat as asset
             filepath = self.url_to_filepath(url)
-            os.makedirs(os.path.dirname(filepath), exist_ok=True)
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
+            self.asset_store.save(filepath, body, content_type)
+            self.http_cache.record(url, filepath, headers, body)
             return set(), set()
         
+        # Decode the same way requests' response.text does
+        try:
+            html_content = str(body, encoding or 'utf-8', errors='replace')
+        except LookupError:
+            html_content = str(body, errors='replace')
+        
         # Process HTML
-        html_content = response.text
         pages, assets = self.process_html(html_content, url)
         
         # Save HTML with rewritten URLs
@@ -467,8 +495,159 @@ class WebsiteDownloader:
         with open(filepath, 'w', encoding='utf-8') as f:
             f.write(rewritten_html)
         
+        self.http_cache.record(url, filepath, headers, body, assets=assets, pages=pages)
         return pages, assets
     
+    async def download_page_async(self, client, url, parser_pool):
+        """Fetch a page over the shared aiohttp client, then parse and save it off the event loop"""
+        try:
+            async with client.get(url, allow_redirects=True,
+                                  headers=self.http_cache.conditional_headers(url)) as response:
+                response.raise_for_status()
+                body = await response.read()
+                status = response.status
+                headers = response.headers
+                encoding = requests.utils.get_encoding_from_headers(headers)
+        except Exception as e:
+            self.failed_downloads.append((url, str(e)))
+            return set(), set()
+        
+        if self.http_cache.unchanged(url, status, headers, body):
+            self.unchanged_urls.add(url)
+            assets, pages = self.http_cache.links(url)
+            return pages, assets
+        
+        # Parsing and writing run in worker threads so other fetches keep going
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(parser_pool, self.save_page, url, body, headers, encoding)
+        except Exception as e:
+            # One bad page is recorded like a failed fetch instead of ending the crawl
+            self.failed_downloads.append((url, str(e)))
+            return set(), set()
+    
+    def crawl_pages(self, all_assets):
+        """Phase 1: crawl pages one at a time, adding every asset URL found to all_assets"""
+        pbar = tqdm(desc="Pages", unit="page")
+        current_url = None
+        
+        try:
+            while self.urls_to_visit:
+                current_url = self.urls_to_visit.popleft()
+                
+                if current_url in self.visited_urls:
+                    continue
+                
+                pages, assets = self.download_page(current_url)
+                all_assets.update(assets)
+                
+                # Add new pages to queue
+                for page in pages:
+                    if page not in self.visited_urls:
+                        self.urls_to_visit.append(page)
+                current_url = None
+                
+                pbar.update(1)
+                pbar.set_postfix({'queued': len(self.urls_to_visit), 'found': len(all_assets)})
+                
+                if self.state.due():
+                    self.save_checkpoint('pages', all_assets)
+                
+                # Small delay to be polite to the server
+                time.sleep(0.1)
+        finally:
+            self.save_checkpoint('pages', all_assets, in_progress=[current_url] if current_url else [])
+            pbar.close()
+        
+        return all_assets
+    
+    async def crawl_pages_async(self, all_assets):
+        """Phase 1: crawl pages with several fetches in flight, adding every asset URL found to all_assets"""
+        if aiohttp is None:
+            raise RuntimeError("Async page crawl requires aiohttp: pip install aiohttp")
+        
+        queued = set(self.urls_to_visit) | self.visited_urls
+        in_flight = {}  # task -> url
+        
+        connector = aiohttp.TCPConnector(limit=self.page_concurrency, limit_per_host=self.per_host_limit)
+        timeout = aiohttp.ClientTimeout(total=30)
+        pbar = tqdm(desc="Pages", unit="page")
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as parser_pool:
+                async with aiohttp.ClientSession(headers=dict(self.session.headers),
+                                                 connector=connector, timeout=timeout) as client:
+                    await self._run_async_frontier(client, parser_pool, all_assets, queued, in_flight, pbar)
+        finally:
+            # Pages still in flight are put back at the head of the saved queue
+            self.save_checkpoint('pages', all_assets, in_progress=list(in_flight.values()))
+            pbar.close()
+        
+        if self.frontier_overflow:
+            print(f"\n⚠ Frontier full: skipped {self.frontier_overflow} links (raise max_frontier to keep them)")
+        return all_assets
+    
+    async def _run_async_frontier(self, client, parser_pool, all_assets, queued, in_flight, pbar):
+        """Keep page_concurrency fetches running until the frontier is empty"""
+        while self.urls_to_visit or in_flight:
+            # Top up the in-flight window from the frontier
+            while self.urls_to_visit and len(in_flight) < self.page_concurrency:
+                url = self.urls_to_visit.popleft()
+                if url in self.visited_urls:
+                    continue
+                self.visited_urls.add(url)
+                task = asyncio.ensure_future(self.download_page_async(client, url, parser_pool))
+                in_flight[task] = url
+            
+            if not in_flight:
+                break
+            
+            done, _ = await asyncio.wait(list(in_flight), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                del in_flight[task]
+                pages, assets = task.result()
+                all_assets.update(assets)
+                
+                for page in pages:
+                    if page in queued:
+                        continue
+                    if len(self.urls_to_visit) >= self.max_frontier:
+                        self.frontier_overflow += 1
+                        continue
+                    queued.add(page)
+                    self.urls_to_visit.append(page)
+                
+                pbar.update(1)
+                pbar.set_postfix({'queued': len(self.urls_to_visit), 'in_flight': len(in_flight),
+                                  'found': len(all_assets)})
+                
+                if self.state.due():
+                    self.save_checkpoint('pages', all_assets, in_progress=list(in_flight.values()))
+    
+    def save_checkpoint(self, phase, all_assets, in_progress=(), finished_assets=()):
+        """Persist crawl progress so an interrupted run can be resumed"""
+        in_progress = list(in_progress)
+        self.state.save(
+            sets={
+                'visited': self.visited_urls - set(in_progress),
+                'assets': all_assets,
+                'finished_assets': finished_assets,
+            },
+            maps={'failed': dict(self.failed_downloads)},
+            frontier=[(url, 0) for url in in_progress + list(self.urls_to_visit)],
+            meta={'phase': phase},
+        )
+    
+    def restore_checkpoint(self):
+        """Load progress saved by save_checkpoint(); returns (all_assets, finished_assets)"""
+        self.visited_urls = self.state.load_set('visited')
+        self.failed_downloads = list(self.state.load_map('failed').items())
+        self.urls_to_visit = deque(url for url, _ in self.state.load_frontier())
+        finished_assets = self.state.load_set('finished_assets')
+        # Top-level assets finish with their nested CSS/JS assets, so these are complete
+        self.downloaded_assets = set(finished_assets)
+        return self.state.load_set('assets'), finished_assets
+    
     def crawl(self):
         """Main crawl function"""
         print(f"\n{'='*60}")
@@ -476,35 +655,23 @@ class WebsiteDownloader:
         print(f"Output Directory: {os.path.abspath(self.output_dir)}")
         print(f"{'='*60}\n")
         
-        # Start with base URL
-        self.urls_to_visit.append(self.base_url)
-        all_assets = set()
+        self.http_cache.open()
+        if self.state.open(resume=self.resume):
+            all_assets, finished_assets = self.restore_checkpoint()
+            print(f"[Resume] {len(self.visited_urls)} pages done, {len(self.urls_to_visit)} queued, "
+                  f"{len(finished_assets)} assets done\n")
+        else:
+            # Start with base URL
+            self.urls_to_visit.append(self.base_url)
+            all_assets, finished_assets = set(), set()
         
         # Phase 1: Crawl all pages
         print("[Phase 1] Discovering and downloading pages...")
-        pbar = tqdm(desc="Pages", unit="page")
-        
-        while self.urls_to_visit:
-            current_url = self.urls_to_visit.popleft()
-            
-            if current_url in self.visited_urls:
-                continue
-            
-            pages, assets = self.download_page(current_url)
-            all_assets.update(assets)
-            
-            # Add new pages to queue
-            for page in pages:
-                if page not in self.visited_urls:
-                    self.urls_to_visit.append(page)
-            
-            pbar.update(1)
-            pbar.set_postfix({'queued': len(self.urls_to_visit), 'found': len(all_assets)})
-            
-            # Small delay to be polite to the server
-            time.sleep(0.1)
+        if self.async_pages:
+            asyncio.run(self.crawl_pages_async(all_assets))
+        else:
+            self.crawl_pages(all_assets)
         
-        pbar.close()
         print(f"\n✓ Downloaded {len(self.visited_urls)} pages")
         
         # Phase 2: Download all assets
@@ -513,16 +680,35 @@ class WebsiteDownloader:
         # Filter to same-domain assets only
         same_domain_assets = [a for a in all_assets if self.is_same_domain(a)]
         
-        with tqdm(total=len(same_domain_assets), desc="Assets", unit="file") as pbar:
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                futures = {executor.submit(self.download_asset, url): url for url in same_domain_assets}
+        remaining_assets = [a for a in same_domain_assets if a not in finished_assets]
+        
+        with tqdm(total=len(same_domain_assets), initial=len(same_domain_assets) - len(remaining_assets),
+                  desc="Assets", unit="file") as pbar:
+            executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            try:
+                futures = {executor.submit(self.download_asset, url): url for url in remaining_assets}
                 for future in as_completed(futures):
+                    finished_assets.add(futures[future])
                     pbar.update(1)
+                    if self.state.due():
+                        self.save_checkpoint('assets', all_assets, finished_assets=finished_assets)
+                executor.shutdown()
+            except BaseException:
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            finally:
+                self.save_checkpoint('assets', all_assets, finished_assets=finished_assets)
         
         print(f"\n✓ Downloaded {len(self.downloaded_assets)} assets")
         
+        self.save_checkpoint('done', all_assets, finished_assets=finished_assets)
+        self.state.close()
+        self.http_cache.close()
+        
         # Create a simple local server script
         self.create_server_script()
+        if self.precompress:
+            print(f"\nPrecompressed: {summary(*precompress_tree(self.output_dir))}")
         
         # Summary
         print(f"\n{'='*60}")
@@ -530,7 +716,11 @@ class WebsiteDownloader:
         print(f"{'='*60}")
         print(f"Pages downloaded: {len(self.visited_urls)}")
         print(f"Assets downloaded: {len(self.downloaded_assets)}")
+        # A page also linked as an asset matches the entry this run just wrote; not counted
+        print(f"Unchanged since last run: {len(self.http_cache.from_earlier_run(self.unchanged_urls))}")
         print(f"Failed downloads: {len(self.failed_downloads)}")
+        pruned = self.asset_store.prune()
+        print(f"Blob store: {self.asset_store.summary()}, {pruned} unused blobs pruned")
         print(f"\nSite saved to: {os.path.abspath(self.output_dir)}")
         print(f"\nTo view the site:")
         print(f"  1. Run: python serve_local.py")
@@ -545,66 +735,68 @@ class WebsiteDownloader:
         return True
     
     def create_server_script(self):
-        """Create a simple Python HTTP server script"""
+        """Create serve_local.py, with the static_server module it runs on beside it"""
         server_script = '''#!/usr/bin/env python3
-"""Simple HTTP server for viewing the downloaded site locally"""
+"""Threaded HTTP server for viewing the downloaded site locally (see static_server.py)"""
 
-import http.server
-import socketserver
 import os
 import webbrowser
-from functools import partial
+
+from static_server import StaticServer, serve_forever
 
 PORT = 8000
 DIRECTORY = os.path.dirname(os.path.abspath(__file__))
 
-class Handler(http.server.SimpleHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, directory=DIRECTORY, **kwargs)
-    
-    def end_headers(self):
-        # Add CORS headers for local development
-        self.send_header('Access-Control-Allow-Origin', '*')
-        self.send_header('Cache-Control', 'no-store')
-        super().end_headers()
-    
-    def do_GET(self):
-        # Serve index.html for directory requests
-        if self.path.endswith('/'):
-            self.path += 'index.html'
-        elif not os.path.splitext(self.path)[1]:
-            # No extension, try to serve as directory with index.html
-            test_path = os.path.join(DIRECTORY, self.path.lstrip('/'), 'index.html')
-            if os.path.exists(test_path):
-                self.path = self.path + '/index.html'
-        return super().do_GET()
-
 if __name__ == '__main__':
-    os.chdir(DIRECTORY)
+    # Add CORS headers for local development; pages are revalidated on every
+    # load (Cache-Control: no-cache), which is a 304 when they have not changed.
+    # .br/.gz siblings written by precompress.py are served to clients that accept them.
+    server = StaticServer(DIRECTORY, ('', PORT), extra_headers=[('Access-Control-Allow-Origin', '*')])
+    print(f"\\nServing downloaded site at: http://localhost:{PORT}")
+    print(f"Directory: {DIRECTORY}")
+    print("Press Ctrl+C to stop\\n")
     
-    with socketserver.TCPServer(("", PORT), Handler) as httpd:
-        print(f"\\nServing downloaded site at: http://localhost:{PORT}")
-        print(f"Directory: {DIRECTORY}")
-        print("Press Ctrl+C to stop\\n")
-        
-        # Open browser automatically
-        webbrowser.open(f'http://localhost:{PORT}')
-        
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print("\\nServer stopped.")
+    # Open browser automatically
+    webbrowser.open(f'http://localhost:{PORT}')
+    
+    serve_forever(server, "\\nServer stopped.")
 '''
         
         server_path = os.path.join(self.output_dir, 'serve_local.py')
         with open(server_path, 'w') as f:
             f.write(server_script)
+        shutil.copyfile(static_server.__file__, os.path.join(self.output_dir, 'static_server.py'))
 
 
 def main():
-    # Target website
-    target_url = "https://www.stumptowncoffee.com/"
-    output_directory = "stumptowncoffee_mirror"
+    parser = argparse.ArgumentParser(description='Download an entire website for offline viewing')
+    parser.add_argument('url', nargs='?', default="https://www.stumptowncoffee.com/",
+                       help='URL of the website to download')
+    parser.add_argument('-o', '--output', default="stumptowncoffee_mirror",
+                       help='Output directory (default: stumptowncoffee_mirror)')
+    parser.add_argument('-w', '--max-workers', type=int, default=8,
+                       help='Asset download threads (default: 8)')
+    parser.add_argument('--async-pages', action='store_true',
+                       help='Crawl pages with asyncio, keeping several fetches in flight')
+    parser.add_argument('--concurrency', type=int, default=16,
+                       help='Page fetches in flight with --async-pages (default: 16)')
+    parser.add_argument('--per-host', type=int, default=8,
+                       help='Connections per host with --async-pages (default: 8)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue an interrupted download from its last checkpoint')
+    parser.add_argument('--full', action='store_true',
+                       help='Re-download everything instead of revalidating files from earlier runs')
+    parser.add_argument('--blob-dir', default=None,
+                       help='Shared blob store for deduplicated assets (default: OUTPUT/.blobs)')
+    parser.add_argument('--max-memory', type=float, default=1.0,
+                       help='Largest download kept in memory, in MB; bigger ones stream to disk (default: 1)')
+    parser.add_argument('--parser', choices=BACKENDS, default=DEFAULT_BACKEND,
+                       help='HTML backend for link extraction; both find the same links (default: lxml)')
+    parser.add_argument('--precompress', action='store_true',
+                       help='Write .br/.gz copies of pages, CSS and JS for serve_local.py to send')
+    
+    args = parser.parse_args()
+    output_directory = args.output
     
     print("\n" + "="*60)
     print("  COMPLETE WEBSITE DOWNLOADER")
@@ -612,9 +804,18 @@ def main():
     print("="*60)
     
     downloader = WebsiteDownloader(
-        base_url=target_url,
+        base_url=args.url,
         output_dir=output_directory,
-        max_workers=8
+        max_workers=args.max_workers,
+        async_pages=args.async_pages,
+        page_concurrency=args.concurrency,
+        per_host_limit=args.per_host,
+        resume=args.resume,
+        revalidate=not args.full,
+        blob_dir=args.blob_dir,
+        max_memory=int(args.max_memory * 1024 * 1024),
+        html_parser=args.parser,
+        precompress=args.precompress
     )
     
     try:
@@ -622,6 +823,7 @@ def main():
     except KeyboardInterrupt:
         print("\n\nDownload interrupted by user.")
         print(f"Partial download saved to: {os.path.abspath(output_directory)}")
+        print("Run again with --resume to continue.")
     except Exception as e:
         print(f"\nError: {e}")
         raise
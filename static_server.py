@@ -0,0 +1,494 @@
+"""
+Static Server - Threaded file server for the static site and downloaded mirrors
+One thread per connection, HTTP/1.1 keep-alive, so a browser (or a load test)
+is not queued behind every other client's connection. Each response has an
+ETag and Last-Modified, and a conditional request that still matches gets a
+bodiless 304. Small files are kept in an in-memory LRU; larger ones go out
+with sendfile(), straight from the page cache to the socket.
+
+Requests are answered from a RouteIndex built at startup: URL path -> file,
+size, mtime, Content-Type, ETag, Cache-Control and precompressed variants, so
+resolving a request is a dict lookup with no stat() or exists() calls. inotify
+(Linux) tells the index when the tree changes and it is rebuilt and swapped
+in whole; elsewhere it is rebuilt every POLL_INTERVAL seconds.
+
+Compressible files are sent as their precompressed .br or .gz sibling when
+the client accepts that encoding and the sibling is current (precompress.py
+writes them stamped with the source's mtime), with Vary: Accept-Encoding.
+Nothing is compressed per request.
+
+In a fingerprinted build (build_assets.py), the files listed in its
+asset-manifest.json never change under their name and are sent with a
+one-year immutable Cache-Control; see manifest_cache_control().
+
+Paths resolve the way the mirrors are laid out: /dir/ -> /dir/index.html,
+/page -> /page.html, and /dir -> a redirect to /dir/ (so relative links in
+dir/index.html resolve). Dot-files and dot-directories (.blobs, crawl state)
+are not served.
+"""
+
+import os
+import sys
+import json
+import time
+import ctypes
+import ctypes.util
+import select
+import threading
+import posixpath
+import mimetypes
+from collections import OrderedDict, namedtuple
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+
+DEFAULT_CACHE_CONTROL = 'no-cache'  # Always revalidate; with ETags that is a 304, not a download
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'  # Content-hashed names
+MANIFEST_NAME = 'asset-manifest.json'  # Original -> hashed path, written by build_assets.py
+CACHE_MAX_FILE = 256 * 1024         # Largest file kept in memory (the biggest pages are ~75KB)
+CACHE_MAX_BYTES = 32 * 1024 * 1024  # All cached bodies together
+KEEP_ALIVE_TIMEOUT = 15             # Seconds an idle connection is kept open
+POLL_INTERVAL = 2.0                 # Seconds between index rebuilds without inotify
+SETTLE_DELAY = 0.05                 # After an inotify event, for the rest of a batch of writes
+TEXT_TYPES = ('application/javascript', 'application/json', 'application/xml', 'image/svg+xml')
+EXTRA_TYPES = {'.js': 'application/javascript', '.mjs': 'application/javascript', '.woff': 'font/woff',
+               '.woff2': 'font/woff2', '.webp': 'image/webp', '.avif': 'image/avif', '.svg': 'image/svg+xml'}
+
+# Extensions worth compressing, and the precompressed siblings, best first
+COMPRESSIBLE = ('.html', '.htm', '.css', '.js', '.mjs', '.json', '.svg', '.xml', '.txt', '.map',
+                '.ico', '.webmanifest')
+VARIANTS = (('br', '.br'), ('gzip', '.gz'))
+
+# inotify(7) events that change what the index holds
+IN_ATTRIB = 0x4
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = (IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+              | IN_DELETE_SELF | IN_MOVE_SELF)
+
+_types = {}  # Extension -> Content-Type
+
+# What a URL path serves. variants: (encoding, file, size, etag), best first.
+# A redirect has file None and location set.
+Route = namedtuple('Route', 'file size mtime content_type etag last_modified cache_control vary variants location')
+
+
+class FileCache:
+    """LRU of small file bodies; an entry is used while the file's mtime and size match"""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES, max_file=CACHE_MAX_FILE):
+        self.max_bytes = max_bytes
+        self.max_file = max_file
+        self.entries = OrderedDict()  # path -> (mtime_ns, size, body)
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, path, mtime, size):
+        with self.lock:
+            entry = self.entries.get(path)
+            if entry is None:
+                return None
+            if entry[0] != mtime or entry[1] != size:
+                self.size -= len(self.entries.pop(path)[2])
+                return None
+            self.entries.move_to_end(path)
+            return entry[2]
+
+    def put(self, path, mtime, size, body):
+        if len(body) > self.max_file:
+            return
+        with self.lock:
+            old = self.entries.pop(path, None)
+            if old is not None:
+                self.size -= len(old[2])
+            self.entries[path] = (mtime, size, body)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self.size -= len(self.entries.popitem(last=False)[1][2])
+
+
+def etag_for(stat, encoding=None):
+    """Weak enough to compute without reading the file: mtime and size, like nginx
+    (plus the content coding, so each variant has its own)"""
+    if encoding:
+        return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}-{encoding}"'
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def variant_is_current(variant, stat):
+    """The variant's stat if it exists and was made from the file stat describes, else None"""
+    try:
+        variant_stat = os.stat(variant)
+    except OSError:
+        return None
+    return variant_stat if variant_stat.st_mtime_ns == stat.st_mtime_ns else None
+
+
+def content_type(path):
+    """Content-Type for a file name, with a charset for text (memoized per extension)"""
+    ext = os.path.splitext(path)[1].lower()
+    value = _types.get(ext)
+    if value is None:
+        value = EXTRA_TYPES.get(ext) or mimetypes.guess_type('x' + ext)[0] or 'application/octet-stream'
+        if value.startswith('text/') or value in TEXT_TYPES:
+            value += '; charset=utf-8'
+        _types[ext] = value
+    return value
+
+
+def manifest_cache_control(root, default=DEFAULT_CACHE_CONTROL):
+    """cache_control for StaticServer: immutable for the hashed files in root's
+    asset manifest, default for everything else (and everything, without one)"""
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return default
+    hashed = {os.path.normpath(os.path.join(os.path.abspath(root), path)) for path in manifest.values()}
+    return lambda path: IMMUTABLE_CACHE_CONTROL if path in hashed else default
+
+
+@lru_cache(maxsize=64)  # Each browser sends the same few values over and over
+def accepted_encodings(header):
+    """Content codings an Accept-Encoding value allows (q=0 excluded)"""
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(coding.strip().lower())
+    return frozenset(accepted)
+
+
+def inotify_fd():
+    """A non-blocking inotify descriptor, or None where inotify is not available"""
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    inotify_fd.add_watch = libc.inotify_add_watch
+    return fd
+
+
+class RouteIndex:
+    """URL path -> Route for everything under root. Each rebuild makes a new dict
+    and swaps it in, so request threads read it without a lock."""
+
+    def __init__(self, root, cache_control=None, watch=True):
+        """cache_control: header value, a function of the file path returning
+        one, or None for manifest_cache_control(root) (re-read on each rebuild);
+        watch: keep the index current (inotify, or polling without it)"""
+        self.root = root
+        self.cache_control = cache_control
+        self.fd = inotify_fd() if watch else None
+        self.mode = 'inotify' if self.fd is not None else 'polling' if watch else 'static'
+        self.closed = False
+        self.rebuilds = 0
+        self.routes = {}
+        self.rebuild()
+        if watch:
+            threading.Thread(target=self.watch_loop, daemon=True).start()
+
+    def __len__(self):
+        return len(self.routes)
+
+    def lookup(self, url_path):
+        """Route for an unquoted URL path, or None"""
+        routes = self.routes
+        route = routes.get(url_path)
+        if route is None and ('//' in url_path or '/.' in url_path):
+            # "//", "./" and "../" segments; leading ".." cannot climb above the root
+            path = '/' + posixpath.normpath(url_path).lstrip('/')
+            if url_path.endswith('/') and path != '/':
+                path += '/'
+            route = routes.get(path)
+        return route
+
+    def policy(self):
+        if self.cache_control is None:
+            policy = manifest_cache_control(self.root)
+        else:
+            policy = self.cache_control
+        return policy if callable(policy) else (lambda path: policy)
+
+    def watch_dir(self, directory):
+        if self.fd is None:
+            return
+        if inotify_fd.add_watch(self.fd, os.fsencode(directory), WATCH_MASK) < 0:
+            # Out of watches (fs.inotify.max_user_watches): fall back to polling
+            os.close(self.fd)
+            self.fd = None
+            self.mode = 'polling'
+
+    def route(self, path, stat, name, siblings, policy):
+        variants = []
+        for encoding, suffix in VARIANTS:
+            variant_stat = siblings.get(name + suffix)
+            if variant_stat is not None and variant_stat.st_mtime_ns == stat.st_mtime_ns:
+                variants.append((encoding, path + suffix, variant_stat.st_size, etag_for(variant_stat, encoding)))
+        return Route(path, stat.st_size, stat.st_mtime_ns, content_type(path), etag_for(stat),
+                     formatdate(stat.st_mtime, usegmt=True), policy(path),
+                     os.path.splitext(name)[1].lower() in COMPRESSIBLE, tuple(variants), None)
+
+    def scan(self):
+        """Routes for the tree as it is now. Each directory is watched before it
+        is listed, so nothing created in between goes unnoticed."""
+        policy = self.policy()
+        routes = {}
+        aliases = {}    # /page -> page.html, /dir/ -> dir/index.html
+        redirects = {}  # /dir -> /dir/
+        pending = ['']
+        while pending:
+            rel_dir = pending.pop()
+            directory = os.path.join(self.root, rel_dir)
+            self.watch_dir(directory)
+            prefix = f'/{rel_dir}/' if rel_dir else '/'
+            files = {}
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.name.startswith('.'):
+                            continue
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                pending.append(posixpath.join(rel_dir, entry.name))
+                                redirects[prefix + entry.name] = prefix + entry.name + '/'
+                            elif entry.is_file():
+                                files[entry.name] = entry.stat()
+                        except OSError:
+                            continue  # Gone while we looked
+            except OSError:
+                continue
+
+            for name, stat in files.items():
+                route = self.route(os.path.join(directory, name), stat, name, files, policy)
+                routes[prefix + name] = route
+                if name == 'index.html':
+                    aliases[prefix] = route
+                elif name.endswith('.html'):
+                    aliases[prefix + name[:-len('.html')]] = route
+
+        # A real file wins over page.html, which wins over a directory redirect
+        for path, route in aliases.items():
+            routes.setdefault(path, route)
+        for path, location in redirects.items():
+            routes.setdefault(path, Route(None, 0, 0, None, None, None, None, False, (), location))
+        return routes
+
+    def rebuild(self):
+        self.routes = self.scan()
+        self.rebuilds += 1
+
+    def watch_loop(self):
+        while not self.closed:
+            try:
+                if self.fd is None:
+                    time.sleep(POLL_INTERVAL)
+                else:
+                    select.select([self.fd], [], [])
+                    time.sleep(SETTLE_DELAY)  # One rebuild for a whole copy or build
+                    while True:
+                        try:
+                            os.read(self.fd, 65536)
+                        except BlockingIOError:
+                            break
+                self.rebuild()
+            except (OSError, ValueError):
+                if self.closed:
+                    return
+                time.sleep(POLL_INTERVAL)  # Keep serving the last index; try again
+
+    def close(self):
+        self.closed = True
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class StaticHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+    server_version = 'StaticServer'
+    timeout = KEEP_ALIVE_TIMEOUT
+    # Headers and body are separate writes; with Nagle on, a kept-alive
+    # connection waits out the client's delayed ACK (~40ms) before the body
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.serve(head=False)
+
+    def do_HEAD(self):
+        self.serve(head=True)
+
+    def not_modified(self, etag, mtime):
+        tags = self.headers.get('If-None-Match')
+        if tags is not None:
+            # If-None-Match wins over If-Modified-Since when both are sent
+            return tags.strip() == '*' or etag in (tag.strip().removeprefix('W/') for tag in tags.split(','))
+        since = self.headers.get('If-Modified-Since')
+        if since is None:
+            return False
+        try:
+            return mtime // 1_000_000_000 <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+
+    def negotiate(self, route):
+        """(encoding, file, size, etag) to send: the best variant the client accepts, or the file itself"""
+        if route.variants:
+            header = self.headers.get('Accept-Encoding')
+            if header:
+                accepted = accepted_encodings(header)
+                for variant in route.variants:
+                    if variant[0] in accepted or '*' in accepted:
+                        return variant
+        return None, route.file, route.size, route.etag
+
+    def send_common_headers(self, route, etag):
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', route.last_modified)
+        self.send_header('Cache-Control', route.cache_control)
+        if route.vary:
+            self.send_header('Vary', 'Accept-Encoding')
+        for name, value in self.server.extra_headers:
+            self.send_header(name, value)
+
+    def serve(self, head):
+        server = self.server
+        route = server.routes.lookup(unquote(urlsplit(self.path).path))
+        if route is None:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        if route.location is not None:
+            self.send_response(HTTPStatus.MOVED_PERMANENTLY)
+            self.send_header('Location', route.location)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        encoding, file_path, size, etag = self.negotiate(route)
+        if self.not_modified(etag, route.mtime):
+            server.count('not_modified')
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_common_headers(route, etag)
+            self.end_headers()
+            return
+
+        body = server.cache.get(file_path, route.mtime, size)
+        if body is None and size <= server.cache.max_file and not head:
+            try:
+                with open(file_path, 'rb') as f:
+                    body = f.read()
+            except OSError:
+                self.send_error(HTTPStatus.NOT_FOUND)  # Deleted since the index was built
+                return
+            if len(body) == size:
+                server.cache.put(file_path, route.mtime, size, body)
+            server.count('read')
+        elif body is not None:
+            server.count('memory')
+        if encoding:
+            server.count(encoding)
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-Type', route.content_type)
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(body) if body is not None else size))
+        self.send_common_headers(route, etag)
+        self.end_headers()
+        if head:
+            return
+        if body is not None:
+            self.wfile.write(body)
+            return
+
+        server.count('sendfile')
+        try:
+            with open(file_path, 'rb') as f:
+                # Headers are already on the wire (wfile is unbuffered); the body
+                # goes with os.sendfile where the platform has it
+                if self.connection.sendfile(f, 0, size) != size:
+                    self.close_connection = True  # Truncated since the index was built
+        except OSError:
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class StaticServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # The default of 5 drops connections under a burst
+
+    def __init__(self, root, address=('', 8080), cache_control=None, extra_headers=(),
+                 quiet=False, cache=None, watch=True, handler=StaticHandler):
+        """root: directory served; cache_control: see RouteIndex (by default
+        no-cache, and immutable for a fingerprinted build's hashed files);
+        extra_headers: (name, value) pairs sent on every response; watch: pick
+        up changes to the tree while serving"""
+        self.root = os.path.abspath(root)
+        self.extra_headers = list(extra_headers)
+        self.quiet = quiet
+        self.cache = cache or FileCache()
+        self.routes = RouteIndex(self.root, cache_control, watch)
+        self.counts = {'memory': 0, 'read': 0, 'sendfile': 0, 'not_modified': 0, 'br': 0, 'gzip': 0}
+        super().__init__(address, handler)
+
+    def server_close(self):
+        super().server_close()
+        self.routes.close()
+
+    def count(self, key):
+        self.counts[key] += 1  # Approximate under contention; only reported
+
+    def summary(self):
+        counts = self.counts
+        return (f"{counts['memory']} from memory, {counts['read']} read, "
+                f"{counts['sendfile']} sendfile, {counts['not_modified']} not modified, "
+                f"{counts['br']} br, {counts['gzip']} gzip "
+                f"({len(self.cache.entries)} files, {self.cache.size / 1024:.0f}KB cached; "
+                f"{len(self.routes)} routes, {self.routes.rebuilds} index builds, {self.routes.mode})")
+
+
+def add_server_arguments(parser, port):
+    """--port / --bind / --quiet, shared by the serve scripts"""
+    parser.add_argument('-p', '--port', type=int, default=port,
+                       help=f'Port to listen on (default: {port})')
+    parser.add_argument('--bind', default='',
+                       help='Address to listen on (default: all interfaces)')
+    parser.add_argument('-q', '--quiet', action='store_true',
+                       help='Do not log each request (logging costs throughput under load)')
+
+
+def serve_forever(server, stopped_message):
+    """Run until Ctrl+C, then print the request summary"""
+    with server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print(f"\n  {server.summary()}", file=sys.stderr)
+            print(stopped_message)
@@ -5,25 +5,29 @@ Captures fully rendered pages with embedded resources
 """
 
 import os
-import sys
-import time
-import base64
 import re
 import hashlib
 from urllib.parse import urljoin, urlparse, unquote
 from collections import deque
 
-try:
-    from playwright.sync_api import sync_playwright
-except ImportError:
-    import subprocess
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "playwright", "-q"])
-    subprocess.check_call([sys.executable, "-m", "playwright", "install", "chromium"])
-    from playwright.sync_api import sync_playwright
+from browser_pool import BrowserPool, Frontier, DEFAULT_RECYCLE_AFTER
+from page_ready import watch, wait_until_ready, DEFAULT_READY_TIMEOUT
+from lazy_scroll import scroll_page, add_scroll_arguments, DEFAULT_MAX_SCROLL_HEIGHT, DEFAULT_MAX_SCROLL_TIME
+from page_embed import EmbedCache, SHARED_DIR, CAPTURED_TYPES
+from resource_policy import add_policy_arguments, policy_from_args, check_policy
+
+# Visible windows open side by side; a couple is plenty and looks less like a bot
+VISIBLE_WORKERS = 2
+
+# New pages followed from each page, to keep a visible crawl short
+MAX_NEW_LINKS = 15
 
 
 class VisibleCloner:
-    def __init__(self, base_url, output_dir="cloned_site", max_depth=2):
+    def __init__(self, base_url, output_dir="cloned_site", max_depth=2, workers=VISIBLE_WORKERS,
+                 recycle_after=DEFAULT_RECYCLE_AFTER, ready_timeout=DEFAULT_READY_TIMEOUT,
+                 resource_policy=None, shared_assets=False, max_scroll_height=DEFAULT_MAX_SCROLL_HEIGHT,
+                 max_scroll_time=DEFAULT_MAX_SCROLL_TIME):
         self.base_url = base_url.rstrip('/')
         self.parsed_base = urlparse(self.base_url)
         self.base_domain = self.parsed_base.netloc
@@ -34,6 +38,24 @@ class VisibleCloner:
         self.pages_to_visit = deque()
         self.page_files = {}
         
+        # Pages render in parallel, one browser context (window) per worker
+        self.workers = workers
+        self.recycle_after = recycle_after
+        
+        # Longest wait for a rendered page to settle (see page_ready)
+        self.ready_timeout = ready_timeout
+        
+        # What rendered pages may load (see resource_policy); None loads everything
+        self.resource_policy = check_policy(resource_policy, CAPTURED_TYPES)
+        
+        # Caps on the lazy-load scroll, for infinite grids (see lazy_scroll)
+        self.max_scroll_height = max_scroll_height
+        self.max_scroll_time = max_scroll_time
+        
+        # Data URIs shared by every page: each asset is encoded once per run.
+        # shared_assets writes images and stylesheets once to OUTPUT/_shared instead.
+        self.embed_cache = EmbedCache(os.path.join(self.output_dir, SHARED_DIR) if shared_assets else None)
+        
         os.makedirs(self.output_dir, exist_ok=True)
     
     def url_to_filename(self, url):
@@ -53,140 +75,38 @@ class VisibleCloner:
         d2 = self.base_domain.replace('www.', '')
         return d1 == d2
     
-    def capture_page(self, page, url):
+    async def wait_ready(self, page):
+        """Wait for the page to settle (see page_ready), at most ready_timeout seconds"""
+        waited = await wait_until_ready(page, self.ready_timeout)
+        if waited is None:
+            print(f"    Still busy after {self.ready_timeout:g}s, carrying on")
+        else:
+            print(f"    Settled in {waited:.1f}s")
+    
+    async def capture_page(self, page, url):
         """Capture page with resources embedded"""
         try:
             print(f"    Loading page...")
             
             # Navigate with longer timeout
-            page.goto(url, wait_until='domcontentloaded', timeout=120000)
+            watch(page)
+            await page.goto(url, wait_until='domcontentloaded', timeout=120000)
             
-            # Wait for network to settle
+            # Wait for network, DOM, images and fonts to settle
             print(f"    Waiting for content...")
-            time.sleep(8)
+            await self.wait_ready(page)
             
-            # Try to wait for specific elements
-            try:
-                page.wait_for_selector('img', timeout=10000)
-            except:
-                pass
+            # Scroll until lazy content stops appearing (see lazy_scroll)
+            steps, stopped = await scroll_page(page, self.max_scroll_height, self.max_scroll_time)
+            print(f"    Scrolled {steps} screens for lazy content ({stopped})")
             
-            # Scroll to load lazy content
-            print(f"    Triggering lazy loading...")
-            page.evaluate('''() => {
-                return new Promise(resolve => {
-                    let y = 0;
-                    const step = () => {
-                        y += 300;
-                        window.scrollTo(0, y);
-                        if (y < document.body.scrollHeight) {
-                            setTimeout(step, 200);
-                        } else {
-                            window.scrollTo(0, 0);
-                            setTimeout(resolve, 2000);
-                        }
-                    };
-                    step();
-                });
-            }''')
-            
-            time.sleep(3)
+            # Lazy content the scroll triggered
+            await self.wait_ready(page)
             
             print(f"    Embedding resources...")
             
-            # Embed all resources
-            html = page.evaluate('''async () => {
-                const toBase64 = async (url) => {
-                    try {
-                        const r = await fetch(url);
-                        const blob = await r.blob();
-                        return new Promise((res, rej) => {
-                            const reader = new FileReader();
-                            reader.onloadend = () => res(reader.result);
-                            reader.onerror = rej;
-                            reader.readAsDataURL(blob);
-                        });
-                    } catch { return null; }
-                };
-                
-                // Process all images
-                const imgs = document.querySelectorAll('img');
-                for (const img of imgs) {
-                    const src = img.src || img.dataset.src;
-                    if (src && !src.startsWith('data:')) {
-                        const data = await toBase64(src);
-                        if (data) {
-                            img.src = data;
-                            img.removeAttribute('data-src');
-                            img.removeAttribute('srcset');
-                        }
-                    }
-                }
-                
-                // Process background images
-                const allEls = document.querySelectorAll('*');
-                for (const el of allEls) {
-                    const style = window.getComputedStyle(el);
-                    const bg = style.backgroundImage;
-                    if (bg && bg !== 'none' && !bg.includes('data:')) {
-                        const urls = bg.match(/url\\(["']?([^"')]+)["']?\\)/g) || [];
-                        let newBg = bg;
-                        for (const u of urls) {
-                            const match = u.match(/url\\(["']?([^"')]+)["']?\\)/);
-                            if (match && match[1]) {
-                                const data = await toBase64(match[1]);
-                                if (data) {
-                                    newBg = newBg.replace(match[1], data);
-                                }
-                            }
-                        }
-                        if (newBg !== bg) {
-                            el.style.backgroundImage = newBg;
-                        }
-                    }
-                }
-                
-                // Inline CSS
-                const links = document.querySelectorAll('link[rel="stylesheet"]');
-                for (const link of links) {
-                    try {
-                        const href = link.href;
-                        const r = await fetch(href);
-                        let css = await r.text();
-                        
-                        // Replace urls in CSS
-                        const cssUrls = css.match(/url\\(["']?([^"')]+)["']?\\)/g) || [];
-                        for (const u of cssUrls) {
-                            const m = u.match(/url\\(["']?([^"')]+)["']?\\)/);
-                            if (m && m[1] && !m[1].startsWith('data:')) {
-                                const fullUrl = new URL(m[1], href).href;
-                                const data = await toBase64(fullUrl);
-                                if (data) {
-                                    css = css.split(m[1]).join(data);
-                                }
-                            }
-                        }
-                        
-                        const style = document.createElement('style');
-                        style.textContent = css;
-                        link.replaceWith(style);
-                    } catch {}
-                }
-                
-                // Remove scripts
-                document.querySelectorAll('script').forEach(s => s.remove());
-                
-                // Handle video posters
-                for (const v of document.querySelectorAll('video[poster]')) {
-                    const poster = v.poster;
-                    if (poster && !poster.startsWith('data:')) {
-                        const data = await toBase64(poster);
-                        if (data) v.poster = data;
-                    }
-                }
-                
-                return '<!DOCTYPE html>\\n' + document.documentElement.outerHTML;
-            }''')
+            # Embed all resources (encoded in Python, see page_embed)
+            html = await self.embed_cache.embed(page, backgrounds='*', unwrap_noscript=False)
             
             return html
             
@@ -194,10 +114,10 @@ class VisibleCloner:
             print(f"    Error: {str(e)[:80]}")
             return None
     
-    def extract_links(self, page):
+    async def extract_links(self, page):
         """Get same-domain links"""
         try:
-            links = page.evaluate('''() => {
+            links = await page.evaluate('''() => {
                 return [...document.querySelectorAll('a[href]')]
                     .map(a => {
                         try { return new URL(a.href).href.split('#')[0]; }
@@ -222,53 +142,36 @@ class VisibleCloner:
         
         self.pages_to_visit.append((self.base_url, 0))
         
-        with sync_playwright() as p:
-            # Launch VISIBLE browser
-            browser = p.chromium.launch(
-                headless=False,  # VISIBLE!
-                slow_mo=100  # Slow down to appear more human
-            )
+        async def visit(page, url, depth):
+            filename = self.url_to_filename(url)
+            self.page_files[url] = filename
             
-            context = browser.new_context(
-                viewport={'width': 1920, 'height': 1080},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-            )
+            print(f"\n[PAGE {len(self.visited_urls)}] {url[:60]}...")
             
-            page = context.new_page()
+            html = await self.capture_page(page, url)
             
-            while self.pages_to_visit:
-                url, depth = self.pages_to_visit.popleft()
-                
-                if url in self.visited_urls or depth > self.max_depth:
-                    continue
-                
-                self.visited_urls.add(url)
-                filename = self.url_to_filename(url)
-                self.page_files[url] = filename
-                
-                print(f"\n[PAGE {len(self.visited_urls)}] {url[:60]}...")
-                
-                html = self.capture_page(page, url)
-                
-                if html:
-                    filepath = os.path.join(self.output_dir, filename)
-                    with open(filepath, 'w', encoding='utf-8') as f:
-                        f.write(html)
-                    
-                    size_kb = len(html) // 1024
-                    print(f"    Saved: {filename} ({size_kb}KB)")
-                    
-                    if depth < self.max_depth:
-                        links = self.extract_links(page)
-                        new_links = [l for l in links if l not in self.visited_urls][:15]  # Limit
-                        print(f"    Found {len(new_links)} new links to crawl")
-                        
-                        for link in new_links:
-                            self.pages_to_visit.append((link, depth + 1))
-                else:
-                    print(f"    FAILED")
+            if not html:
+                print(f"    FAILED")
+                return ()
             
-            browser.close()
+            filepath = os.path.join(self.output_dir, filename)
+            with open(filepath, 'w', encoding='utf-8') as f:
+                f.write(html)
+            
+            size_kb = len(html) // 1024
+            print(f"    Saved: {filename} ({size_kb}KB)")
+            
+            # All links, even at max depth or already seen: the frontier keeps each
+            # page's smallest depth, and caps the new ones
+            links = await self.extract_links(page)
+            print(f"    Found {len(links)} links")
+            return links
+        
+        # VISIBLE browser, slowed down to appear more human
+        pool = BrowserPool(self.workers, self.recycle_after, resource_policy=self.resource_policy,
+                           launch_options={'headless': False, 'slow_mo': 100}, on_page=self.embed_cache.attach)
+        pool.run(Frontier(self.pages_to_visit, self.visited_urls, self.max_depth,
+                          max_links=MAX_NEW_LINKS), visit)
         
         # Update links
         print("\n[FINALIZING] Updating internal links...")
@@ -303,6 +206,9 @@ class VisibleCloner:
         print("  CLONE COMPLETE!")
         print("="*65)
         print(f"  Pages: {len(self.visited_urls)}")
+        print(f"  Embedding: {self.embed_cache.summary()}")
+        if self.resource_policy is not None:
+            print(f"  Resources: {self.resource_policy.summary()}")
         print(f"\n  >>> OPEN: {os.path.abspath(index_path)}")
         print("="*65 + "\n")
 
@@ -313,9 +219,22 @@ if __name__ == '__main__':
     parser.add_argument('url', nargs='?', default='https://www.stumptowncoffee.com/')
     parser.add_argument('-o', '--output', default='stumptown_visible')
     parser.add_argument('-d', '--depth', type=int, default=2)
+    parser.add_argument('-w', '--workers', type=int, default=VISIBLE_WORKERS,
+                       help=f'Browser windows capturing at once (default: {VISIBLE_WORKERS})')
+    parser.add_argument('--recycle-after', type=int, default=DEFAULT_RECYCLE_AFTER,
+                       help=f'Navigations before a window\'s browser context is replaced (default: {DEFAULT_RECYCLE_AFTER})')
+    parser.add_argument('--ready-timeout', type=float, default=DEFAULT_READY_TIMEOUT,
+                       help=f'Longest wait for a page to settle before it is captured anyway, in seconds (default: {DEFAULT_READY_TIMEOUT:g})')
+    add_policy_arguments(parser, CAPTURED_TYPES)
+    add_scroll_arguments(parser)
+    parser.add_argument('--shared-assets', action='store_true',
+                       help=f'Store images and stylesheets once in OUTPUT/{SHARED_DIR} and link them from every page, '
+                            'instead of inlining them into each one')
     args = parser.parse_args()
     
-    cloner = VisibleCloner(args.url, args.output, args.depth)
+    cloner = VisibleCloner(args.url, args.output, args.depth, args.workers, args.recycle_after, args.ready_timeout,
+                           policy_from_args(args, urlparse(args.url).netloc), args.shared_assets,
+                           max_scroll_height=args.scroll_max_height, max_scroll_time=args.scroll_max_time)
     cloner.clone()
 
 
@@ -8,51 +8,111 @@ import re
 import sys
 import time
 import hashlib
+import threading
 import argparse
 from urllib.parse import urljoin, urlparse, unquote
 from collections import deque
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 import mimetypes
 
 try:
     import requests
-    from bs4 import BeautifulSoup
 except ImportError:
     print("Installing required packages...")
     import subprocess
     subprocess.check_call([sys.executable, "-m", "pip", "install", "requests", "beautifulsoup4", "lxml"])
     import requests
-    from bs4 import BeautifulSoup
 
+from crawl_state import CrawlState
+from http_cache import HttpCache
+from asset_store import AssetStore
+from host_throttle import HostThrottle
+from html_extract import ExtractRules, extract, rel_has, URL, SRCSET, CSS, LINK, PAGE, REFRESH
+from html_rewrite import parse, rewrite_html, BACKENDS, DEFAULT_BACKEND
+from css_scan import find_refs, splice_refs, css_urls
+from parse_pool import ParsePool, read_bytes, decode_body, default_workers
 
-class WebsiteCloner:
-    def __init__(self, base_url, output_dir="cloned_site", max_depth=10, max_workers=10, delay=0.1):
+
+# Most parallel requests to the site's own host; other hosts (CDNs) adapt up to --host-concurrency
+ORIGIN_CONCURRENCY = 2
+
+# What extract_assets_from_html() collects, as one tag -> attribute table
+EXTRACT_RULES = ExtractRules(
+    tag_attrs=[
+        ('link', 'href', URL),          # CSS, icons, etc.
+        ('script', 'src', URL),         # JavaScript
+        ('img', 'src', URL),            # Images
+        ('img', 'data-src', URL),       # Lazy-loaded images
+        ('img', 'srcset', SRCSET),      # Responsive images
+        ('source', 'src', URL),         # Video/audio sources
+        ('source', 'srcset', SRCSET),   # Picture sources
+        ('video', 'src', URL),          # Video
+        ('video', 'poster', URL),       # Video poster
+        ('audio', 'src', URL),          # Audio
+        ('iframe', 'src', URL),         # Iframes
+        ('embed', 'src', URL),          # Embeds
+        ('object', 'data', URL),        # Objects
+        ('use', 'xlink:href', URL),     # SVG use
+        ('image', 'xlink:href', URL),   # SVG image
+        ('a', 'href', LINK),
+        ('link', 'href', PAGE, rel_has('canonical', 'alternate')),
+        ('meta', 'content', REFRESH, lambda a: a.get('http-equiv') == 'refresh'),
+        # Open Graph and Twitter Card images
+        ('meta', 'content', URL, lambda a: a.get('property', '').startswith('og:') and 'image' in a['property'].lower()),
+        ('meta', 'content', URL, lambda a: a.get('name', '').startswith('twitter:') and 'image' in a['name'].lower()),
+    ],
+    any_attrs=[
+        ('style', CSS),
+        ('data-background', URL),
+        ('data-bg', URL),
+    ],
+    text_tags={'style': CSS},
+)
+
+# What rewrite_urls_in_html() points at local copies
+REWRITE_RULES = ExtractRules(
+    tag_attrs=[
+        ('link', 'href', URL),
+        ('script', 'src', URL),
+        ('img', 'src', URL),
+        ('img', 'data-src', URL),
+        ('img', 'srcset', SRCSET),
+        ('source', 'src', URL),
+        ('source', 'srcset', SRCSET),
+        ('video', 'src', URL),
+        ('video', 'poster', URL),
+        ('audio', 'src', URL),
+        ('iframe', 'src', URL),
+        ('embed', 'src', URL),
+        ('object', 'data', URL),
+        ('a', 'href', URL),
+    ],
+    any_attrs=[('style', CSS)],
+    text_tags={'style': CSS},
+)
+
+
+class PageParser:
+    """URL mapping, extraction and rewriting, with no crawl state
+    
+    What a parse pool worker builds (see parse_pool); WebsiteCloner adds the
+    crawl on top. Without a refs table nothing is pointed at a local copy.
+    """
+    def __init__(self, base_url, output_dir="cloned_site", html_parser=DEFAULT_BACKEND):
         self.base_url = base_url.rstrip('/')
         self.parsed_base = urlparse(self.base_url)
         self.base_domain = self.parsed_base.netloc
         self.output_dir = output_dir
-        self.max_depth = max_depth
-        self.max_workers = max_workers
-        self.delay = delay
-        
-        # Track visited URLs and downloaded assets
-        self.visited_urls = set()
-        self.downloaded_assets = set()
-        self.url_to_local = {}  # Maps original URLs to local file paths
-        self.failed_urls = set()
         
-        # Queue for pages to visit: (url, depth)
-        self.pages_to_visit = deque()
+        # HTML backend for extraction and rewriting: 'lxml' or 'bs4' (same output)
+        self.html_parser = html_parser
         
-        # Session for connection pooling
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'en-US,en;q=0.9',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Connection': 'keep-alive',
-        })
+        # Memoized URL -> local path index, and relative paths per referring directory,
+        # so rewriting a reference is a dict lookup once its target has been seen
+        self.local_paths = {}
+        self.rel_paths = {}  # directory -> {target path -> relative reference}
+        self.rewrite_stats = {'pages': 0, 'stylesheets': 0, 'refs': 0, 'seconds': 0.0}
+        self.stats_lock = threading.Lock()
         
         # File extensions to download
         self.asset_extensions = {
@@ -61,10 +121,7 @@ class WebsiteCloner:
             '.mp4', '.webm', '.mp3', '.ogg', '.wav',
             '.pdf', '.json', '.xml', '.txt', '.map'
         }
-        
-        # Create output directory
-        os.makedirs(self.output_dir, exist_ok=True)
-        
+    
     def get_file_extension(self, url, content_type=None):
         """Determine file extension from URL or content type"""
         parsed = urlparse(url)
@@ -85,7 +142,11 @@ class WebsiteCloner:
         return '.html'
     
     def url_to_filepath(self, url, content_type=None):
-        """Convert URL to local file path"""
+        """Convert URL to local file path (memoized, see local_paths)"""
+        local_path = self.local_paths.get(url)
+        if local_path is not None:
+            return local_path
+        
         parsed = urlparse(url)
         path = unquote(parsed.path)
         
@@ -110,11 +171,43 @@ class WebsiteCloner:
         # Create full local path
         local_path = os.path.join(self.output_dir, parsed.netloc, path.lstrip('/'))
         
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(local_path), exist_ok=True)
-        
+        self.local_paths[url] = local_path
         return local_path
     
+    def relative_ref(self, target, referrer_local):
+        """Reference to a local file from another local file, '/'-separated (cached per directory)"""
+        from_dir = os.path.dirname(referrer_local)
+        cache = self.rel_paths.get(from_dir)
+        if cache is None:
+            cache = self.rel_paths.setdefault(from_dir, {})
+        
+        rel_path = cache.get(target)
+        if rel_path is None:
+            try:
+                rel_path = os.path.relpath(target, from_dir).replace('\\', '/')
+            except ValueError:
+                # Different drives on Windows
+                rel_path = target
+            cache[target] = rel_path
+        return rel_path
+    
+    def count_rewrite(self, kind, seconds, refs):
+        """Add one rewrite pass to the timing counters shown in the summary"""
+        with self.stats_lock:
+            self.rewrite_stats[kind] += 1
+            self.rewrite_stats['refs'] += refs
+            self.rewrite_stats['seconds'] += seconds
+    
+    def rewrite_summary(self):
+        """One line on rewriting: passes, references, time and how much the path caches saved"""
+        stats = self.rewrite_stats
+        if not stats['refs']:
+            return "nothing rewritten"
+        rel_computed = sum(len(cache) for cache in self.rel_paths.values())
+        return (f"{stats['pages']} pages and {stats['stylesheets']} stylesheets in {stats['seconds']:.2f}s, "
+                f"{stats['refs']} references -> {len(self.local_paths)} local paths and "
+                f"{rel_computed} relative paths computed, the rest from cache")
+    
     def is_same_domain(self, url):
         """Check if URL belongs to the same domain"""
         parsed = urlparse(url)
@@ -151,111 +244,22 @@ class WebsiteCloner:
         
         return url
     
-    def download_file(self, url, is_html=False):
-        """Download a file and save it locally"""
-        if url in self.downloaded_assets or url in self.failed_urls:
-            return self.url_to_local.get(url)
-        
-        try:
-            time.sleep(self.delay)
-            response = self.session.get(url, timeout=30, allow_redirects=True)
-            response.raise_for_status()
-            
-            content_type = response.headers.get('Content-Type', '')
-            local_path = self.url_to_filepath(url, content_type)
-            
-            # Save the file
-            if 'text' in content_type or is_html or content_type.startswith('application/javascript') or content_type.startswith('application/json'):
-                with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
-                    f.write(response.text)
-            else:
-                with open(local_path, 'wb') as f:
-                    f.write(response.content)
-            
-            self.downloaded_assets.add(url)
-            self.url_to_local[url] = local_path
-            
-            print(f"[OK] Downloaded: {url[:80]}...")
-            return local_path
-            
-        except Exception as e:
-            print(f"[FAIL] Failed: {url[:60]}... - {str(e)[:50]}")
-            self.failed_urls.add(url)
-            return None
-    
     def extract_assets_from_html(self, html_content, page_url):
-        """Extract all asset URLs from HTML content"""
-        soup = BeautifulSoup(html_content, 'lxml')
+        """Extract all asset URLs from HTML content or a parsed page (one tree walk, see EXTRACT_RULES)"""
+        found = extract(html_content, EXTRACT_RULES)
         assets = set()
         pages = set()
         
-        # Extract from various HTML elements
-        tag_attrs = [
-            ('link', 'href'),      # CSS, icons, etc.
-            ('script', 'src'),     # JavaScript
-            ('img', 'src'),        # Images
-            ('img', 'data-src'),   # Lazy-loaded images
-            ('img', 'srcset'),     # Responsive images
-            ('source', 'src'),     # Video/audio sources
-            ('source', 'srcset'),  # Picture sources
-            ('video', 'src'),      # Video
-            ('video', 'poster'),   # Video poster
-            ('audio', 'src'),      # Audio
-            ('iframe', 'src'),     # Iframes
-            ('embed', 'src'),      # Embeds
-            ('object', 'data'),    # Objects
-            ('use', 'xlink:href'), # SVG use
-            ('image', 'xlink:href'), # SVG image
-        ]
-        
-        for tag, attr in tag_attrs:
-            for element in soup.find_all(tag):
-                value = element.get(attr)
-                if value:
-                    # Handle srcset (multiple URLs)
-                    if 'srcset' in attr:
-                        for part in value.split(','):
-                            url_part = part.strip().split()[0]
-                            url = self.normalize_url(url_part, page_url)
-                            if url:
-                                assets.add(url)
-                    else:
-                        url = self.normalize_url(value, page_url)
-                        if url:
-                            assets.add(url)
-        
-        # Extract URLs from inline styles
-        for element in soup.find_all(style=True):
-            style = element.get('style', '')
-            urls = re.findall(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', style)
-            for url in urls:
-                normalized = self.normalize_url(url, page_url)
-                if normalized:
-                    assets.add(normalized)
-        
-        # Extract URLs from style tags
-        for style_tag in soup.find_all('style'):
-            if style_tag.string:
-                urls = re.findall(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', style_tag.string)
-                for url in urls:
-                    normalized = self.normalize_url(url, page_url)
-                    if normalized:
-                        assets.add(normalized)
-        
-        # Extract from data attributes
-        for element in soup.find_all(attrs={'data-background': True}):
-            url = self.normalize_url(element.get('data-background'), page_url)
-            if url:
-                assets.add(url)
-        
-        for element in soup.find_all(attrs={'data-bg': True}):
-            url = self.normalize_url(element.get('data-bg'), page_url)
+        # Tag attributes, srcset entries and data-* backgrounds, plus url()
+        # references in style attributes and <style> tags
+        values = found[URL] + [url for css in found[CSS] for url in css_urls(css)]
+        for value in values:
+            url = self.normalize_url(value, page_url)
             if url:
                 assets.add(url)
         
         # Extract page links (a href)
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag.get('href')
+        for href in found[LINK]:
             url = self.normalize_url(href, page_url)
             if url and self.is_same_domain(url):
                 # Check if it's a page (not an asset)
@@ -264,66 +268,30 @@ class WebsiteCloner:
                 if not ext or ext in ['.html', '.htm', '.php', '.asp', '.aspx', '']:
                     pages.add(url)
         
-        # Extract canonical and alternate URLs
-        for link in soup.find_all('link', rel=['canonical', 'alternate']):
-            href = link.get('href')
-            if href:
-                url = self.normalize_url(href, page_url)
-                if url and self.is_same_domain(url):
-                    pages.add(url)
+        # Canonical and alternate URLs
+        for href in found[PAGE]:
+            url = self.normalize_url(href, page_url)
+            if url and self.is_same_domain(url):
+                pages.add(url)
         
-        # Extract meta refresh URLs
-        for meta in soup.find_all('meta', attrs={'http-equiv': 'refresh'}):
-            content = meta.get('content', '')
+        # Meta refresh URLs
+        for content in found[REFRESH]:
             match = re.search(r'url=([^\s;]+)', content, re.I)
             if match:
                 url = self.normalize_url(match.group(1), page_url)
                 if url and self.is_same_domain(url):
                     pages.add(url)
         
-        # Extract Open Graph and Twitter Card images
-        for meta in soup.find_all('meta', attrs={'property': re.compile(r'^og:')}):
-            content = meta.get('content', '')
-            if 'image' in meta.get('property', '').lower():
-                url = self.normalize_url(content, page_url)
-                if url:
-                    assets.add(url)
-        
-        for meta in soup.find_all('meta', attrs={'name': re.compile(r'^twitter:')}):
-            content = meta.get('content', '')
-            if 'image' in meta.get('name', '').lower():
-                url = self.normalize_url(content, page_url)
-                if url:
-                    assets.add(url)
-        
         return assets, pages
     
-    def extract_assets_from_css(self, css_content, css_url):
-        """Extract asset URLs from CSS content"""
+    def extract_assets_from_css(self, css_content, css_url, found=None):
+        """Extract asset URLs from CSS content: url() references, @imports and
+        @font-face sources, in one pass (found: find_refs() output, if already scanned)"""
         assets = set()
-        
-        # Find url() references
-        urls = re.findall(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', css_content)
-        for url in urls:
-            normalized = self.normalize_url(url, css_url)
-            if normalized:
-                assets.add(normalized)
-        
-        # Find @import statements
-        imports = re.findall(r'@import\s+[\'"]([^\'"]+)[\'"]', css_content)
-        imports += re.findall(r'@import\s+url\([\'"]?([^\'")\s]+)[\'"]?\)', css_content)
-        for url in imports:
-            normalized = self.normalize_url(url, css_url)
-            if normalized:
-                assets.add(normalized)
-        
-        # Find @font-face src
-        font_urls = re.findall(r'src:\s*[^;]*url\([\'"]?([^\'")\s]+)[\'"]?\)', css_content)
-        for url in font_urls:
-            normalized = self.normalize_url(url, css_url)
+        for _, value, _, _ in (find_refs(css_content) if found is None else found):
+            normalized = self.normalize_url(value, css_url)
             if normalized:
                 assets.add(normalized)
-        
         return assets
     
     def extract_assets_from_js(self, js_content, js_url):
@@ -350,96 +318,281 @@ class WebsiteCloner:
         
         return assets
     
-    def rewrite_urls_in_html(self, html_content, page_url):
-        """Rewrite URLs in HTML to use local paths"""
-        soup = BeautifulSoup(html_content, 'lxml')
-        
-        # Rewrite various tag attributes
-        tag_attrs = [
-            ('link', 'href'),
-            ('script', 'src'),
-            ('img', 'src'),
-            ('img', 'data-src'),
-            ('source', 'src'),
-            ('video', 'src'),
-            ('video', 'poster'),
-            ('audio', 'src'),
-            ('iframe', 'src'),
-            ('embed', 'src'),
-            ('object', 'data'),
-            ('a', 'href'),
-        ]
+    def rewrite_urls_in_html(self, html_content, page_url, refs=None):
+        """Rewrite URLs in HTML to use local paths (html_content may already be parsed; refs, see local_ref())"""
+        started = time.perf_counter()
+        page_local = self.url_to_filepath(page_url)
+        rewritten = {}  # Attribute value -> new value, for references repeated on the page
+        found = [0]
+        
+        def rewrite_url(value):
+            found[0] += 1
+            if value in rewritten:
+                return rewritten[value]
+            url = self.normalize_url(value, page_url)
+            # Relative path from this page
+            rewritten[value] = self.local_ref(url, page_local, refs) if url else None
+            return rewritten[value]
+        
+        def rewrite_css(css):
+            css, count = self.rewrite_css_refs(css, page_url, page_local, refs)
+            found[0] += count
+            return css
+        
+        # Tag attributes and srcset entries, then inline styles and style tags
+        handlers = {
+            URL: rewrite_url,
+            CSS: rewrite_css,
+        }
+        html = rewrite_html(html_content, REWRITE_RULES, handlers, self.html_parser)
+        self.count_rewrite('pages', time.perf_counter() - started, found[0])
+        return html
+    
+    def rewrite_urls_in_css(self, css_content, css_url, refs=None, found=None):
+        """Rewrite URLs in CSS to use local paths (refs, see local_ref(); found, see extract_assets_from_css())"""
+        started = time.perf_counter()
+        css_content, count = self.rewrite_css_refs(css_content, css_url, self.url_to_filepath(css_url), refs, found)
+        self.count_rewrite('stylesheets', time.perf_counter() - started, count)
+        return css_content
+    
+    def rewrite_css_refs(self, css_content, css_url, css_local, refs=None, found=None):
+        """url() and @import references in CSS (a stylesheet, or inline CSS of the page
+        at css_local) pointed at local paths; returns the CSS and the number of references"""
+        def replace_url(kind, value):
+            normalized = self.normalize_url(value, css_url)
+            return self.local_ref(normalized, css_local, refs) if normalized else None
+        
+        # Spliced in at the offsets of the scan
+        return splice_refs(css_content, find_refs(css_content) if found is None else found, replace_url)
+    
+    def local_ref(self, url, referrer_local, refs=None):
+        """Reference to url's local copy from refs (URL -> reference), or None"""
+        return refs.get(url) if refs is not None else None
+    
+    # Parse pool tasks: these run in worker processes (see parse_pool), each on a
+    # PageParser of its own. Bodies come in as file paths, and whatever needs the
+    # crawl state as a URL -> reference table (WebsiteCloner.local_refs()).
+    
+    def scan_page_file(self, path, encoding, page_url):
+        """Assets, page links and every URL rewriting will look up, for the page body at path"""
+        document = parse(decode_body(read_bytes(path), encoding), self.html_parser)
+        assets, pages = self.extract_assets_from_html(document, page_url)
+        
+        found = extract(document, REWRITE_RULES)
+        values = found[URL] + [value for css in found[CSS] for value in css_urls(css)]
+        targets = {self.normalize_url(value, page_url) for value in values}
+        targets.discard(None)
+        return assets, pages, targets
+    
+    def write_page_file(self, path, encoding, page_url, local_path, refs):
+        """Rewrite the page body at path with refs and write it to local_path;
+        returns (references rewritten, seconds)"""
+        document = parse(decode_body(read_bytes(path), encoding), self.html_parser)
+        before = dict(self.rewrite_stats)
+        html = self.rewrite_urls_in_html(document, page_url, refs)
+        with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
+            f.write(html)
+        return self.rewrite_stats['refs'] - before['refs'], self.rewrite_stats['seconds'] - before['seconds']
+    
+    def scan_stylesheet_file(self, path, css_url):
+        """Assets a saved stylesheet references (also what rewriting will look up)"""
+        with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            return self.extract_assets_from_css(f.read(), css_url)
+    
+    def write_stylesheet_file(self, path, css_url, refs):
+        """Rewrite a saved stylesheet in place with refs; returns (references rewritten, seconds)"""
+        with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            css = f.read()
+        before = dict(self.rewrite_stats)
+        css = self.rewrite_urls_in_css(css, css_url, refs)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, 'w', encoding='utf-8', errors='replace', newline='') as f:
+            f.write(css)
+        os.replace(temp, path)
+        return self.rewrite_stats['refs'] - before['refs'], self.rewrite_stats['seconds'] - before['seconds']
+    
+    def scan_script_file(self, path, js_url):
+        """Asset URLs in a saved script"""
+        with open(path, 'r', encoding='utf-8', errors='replace', newline='') as f:
+            return self.extract_assets_from_js(f.read(), js_url)
+
+
+class WebsiteCloner(PageParser):
+    def __init__(self, base_url, output_dir="cloned_site", max_depth=10, max_workers=10, delay=0.1, resume=False,
+                 revalidate=True, blob_dir=None, max_memory=1024 * 1024, html_parser=DEFAULT_BACKEND,
+                 host_concurrency=8, parse_workers=0):
+        super().__init__(base_url, output_dir, html_parser)
+        self.max_depth = max_depth
+        self.max_workers = max_workers
+        self.delay = delay
+        self.resume = resume
         
-        for tag, attr in tag_attrs:
-            for element in soup.find_all(tag):
-                value = element.get(attr)
-                if value:
-                    url = self.normalize_url(value, page_url)
-                    if url and url in self.url_to_local:
-                        # Calculate relative path
-                        page_local = self.url_to_filepath(page_url)
-                        asset_local = self.url_to_local[url]
-                        try:
-                            rel_path = os.path.relpath(asset_local, os.path.dirname(page_local))
-                            rel_path = rel_path.replace('\\', '/')
-                            element[attr] = rel_path
-                        except ValueError:
-                            # Different drives on Windows
-                            element[attr] = asset_local
-        
-        # Rewrite srcset attributes
-        for tag in ['img', 'source']:
-            for element in soup.find_all(tag, srcset=True):
-                srcset = element.get('srcset', '')
-                new_srcset_parts = []
-                for part in srcset.split(','):
-                    parts = part.strip().split()
-                    if parts:
-                        url = self.normalize_url(parts[0], page_url)
-                        if url and url in self.url_to_local:
-                            page_local = self.url_to_filepath(page_url)
-                            asset_local = self.url_to_local[url]
-                            try:
-                                rel_path = os.path.relpath(asset_local, os.path.dirname(page_local))
-                                rel_path = rel_path.replace('\\', '/')
-                                parts[0] = rel_path
-                            except ValueError:
-                                parts[0] = asset_local
-                        new_srcset_parts.append(' '.join(parts))
-                element['srcset'] = ', '.join(new_srcset_parts)
-        
-        # Rewrite inline styles
-        for element in soup.find_all(style=True):
-            style = element.get('style', '')
-            element['style'] = self.rewrite_urls_in_css(style, page_url)
-        
-        # Rewrite style tags
-        for style_tag in soup.find_all('style'):
-            if style_tag.string:
-                style_tag.string = self.rewrite_urls_in_css(style_tag.string, page_url)
-        
-        return str(soup)
-    
-    def rewrite_urls_in_css(self, css_content, css_url):
-        """Rewrite URLs in CSS to use local paths"""
-        def replace_url(match):
-            url = match.group(1)
-            normalized = self.normalize_url(url, css_url)
-            if normalized and normalized in self.url_to_local:
-                css_local = self.url_to_filepath(css_url)
-                asset_local = self.url_to_local[normalized]
-                try:
-                    rel_path = os.path.relpath(asset_local, os.path.dirname(css_local))
-                    rel_path = rel_path.replace('\\', '/')
-                    return f'url("{rel_path}")'
-                except ValueError:
-                    return f'url("{asset_local}")'
-            return match.group(0)
+        # Track visited URLs and downloaded assets
+        self.visited_urls = set()
+        self.downloaded_assets = set()
+        self.url_to_local = {}  # Maps original URLs to local file paths
+        self.failed_urls = set()
         
-        # Replace url() references
-        css_content = re.sub(r'url\([\'"]?([^\'")\s]+)[\'"]?\)', replace_url, css_content)
+        # Streaming pipeline: local paths for URLs that are scheduled but not yet
+        # downloaded, and which of those each written file points at
+        self.planned_local = {}
+        self.pending_refs = {}  # local file -> set of planned URLs it references
         
-        return css_content
+        # Queue for pages to visit: (url, depth)
+        self.pages_to_visit = deque()
+        
+        # Checkpoints for --resume
+        self.state = CrawlState(self.output_dir)
+        
+        # Validators from earlier runs, for conditional re-downloads
+        self.http_cache = HttpCache(self.output_dir, enabled=revalidate)
+        self.unchanged_urls = set()
+        
+        # Binary assets are stored once per distinct body and hardlinked into place.
+        # Downloads are streamed; bodies over max_memory bytes go to a temp file.
+        self.asset_store = AssetStore(self.output_dir, blob_dir, max_memory)
+        
+        # Worker processes for parsing and rewriting (0: in the crawling process);
+        # the pool is started by clone()
+        self.parse_workers = parse_workers
+        self.parse_pool = None
+        
+        # Session for connection pooling
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+            'Accept-Language': 'en-US,en;q=0.9',
+            'Accept-Encoding': 'gzip, deflate, br',
+            'Connection': 'keep-alive',
+        })
+        
+        # Per-host politeness: delay is the origin's minimum gap between requests,
+        # every other host adapts its own rate and concurrency (plus robots.txt crawl-delay)
+        self.throttle = HostThrottle(self.session, interval=delay, max_concurrency=host_concurrency)
+        self.throttle.policy(self.base_domain, min_interval=delay, max_concurrency=ORIGIN_CONCURRENCY)
+        
+        # Create output directory
+        os.makedirs(self.output_dir, exist_ok=True)
+    
+    def url_to_filepath(self, url, content_type=None):
+        """PageParser.url_to_filepath(), creating the file's directory the first time"""
+        if url in self.local_paths:
+            return self.local_paths[url]
+        local_path = super().url_to_filepath(url, content_type)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        return local_path
+    
+    def download_file(self, url, is_html=False, text_filter=None, nested=None, after_save=None):
+        """Download a file and save it locally
+        
+        text_filter, if given, receives the decoded text and returns what is
+        written, so a file can be rewritten before its only write. nested is
+        the set of URLs the filter found, kept for revalidation on later runs.
+        after_save(local_path), if given, runs on the saved text file before it
+        is recorded; the parse pool works on files where they are.
+        A copy from an earlier run that is still current is left untouched.
+        The body is streamed, never held in memory whole when it is large.
+        """
+        if url in self.downloaded_assets or url in self.failed_urls:
+            return self.url_to_local.get(url)
+        
+        try:
+            with self.throttle.slot(url) as slot:
+                response = self.session.get(url, timeout=30, allow_redirects=True, stream=True,
+                                            headers=self.http_cache.conditional_headers(url))
+                slot.done(response)
+                response.raise_for_status()
+                
+                content_type = response.headers.get('Content-Type', '')
+                local_path = self.url_to_filepath(url, content_type)
+                
+                # The host's slot covers the body download too
+                body = self.asset_store.read(response)
+            
+            with body:
+                if self.http_cache.unchanged(url, response.status_code, response.headers, body):
+                    self.unchanged_urls.add(url)
+                    self.downloaded_assets.add(url)
+                    self.url_to_local[url] = local_path
+                    print(f"[SAME] Unchanged: {url[:80]}...")
+                    return local_path
+                
+                # Save the file
+                if text_filter or after_save or 'text' in content_type or is_html or content_type.startswith('application/javascript') or content_type.startswith('application/json'):
+                    text = body.text(response.encoding)
+                    if text_filter:
+                        text = text_filter(text)
+                    with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
+                        f.write(text)
+                    if after_save:
+                        after_save(local_path)
+                else:
+                    self.asset_store.save_body(local_path, body, content_type)
+            
+            self.http_cache.record(url, local_path, response.headers, body, assets=nested or ())
+            self.downloaded_assets.add(url)
+            self.url_to_local[url] = local_path
+            
+            print(f"[OK] Downloaded: {url[:80]}...")
+            return local_path
+            
+        except Exception as e:
+            print(f"[FAIL] Failed: {url[:60]}... - {str(e)[:50]}")
+            self.failed_urls.add(url)
+            return None
+    
+    def plan_download(self, url):
+        """Reserve the local path for a URL that will be downloaded"""
+        if url not in self.url_to_local and url not in self.failed_urls:
+            self.planned_local.setdefault(url, self.url_to_filepath(url))
+    
+    def resolve_local(self, url, referrer_local):
+        """Local path for a downloaded or scheduled URL, or None
+        
+        References resolved to a path that is not downloaded yet are recorded
+        against the referring file so fix_leftover_refs() can undo them if the
+        download fails. That includes downloads that have failed already: every
+        failed reference is restored the same way, once all downloads are done,
+        whichever finished first.
+        """
+        local = self.url_to_local.get(url)
+        if local is not None:
+            return local
+        local = self.planned_local.get(url)
+        if local is not None:
+            self.pending_refs.setdefault(referrer_local, set()).add(url)
+        return local
+    
+    def local_ref(self, url, referrer_local, refs=None):
+        """Reference from referrer_local to url's local copy, or None
+        
+        With refs (URL -> reference, worked out by the crawling process for a
+        parse pool worker) only that table is consulted.
+        """
+        if refs is not None:
+            return refs.get(url)
+        asset_local = self.resolve_local(url, referrer_local)
+        return self.relative_ref(asset_local, referrer_local) if asset_local else None
+    
+    def local_refs(self, urls, referrer_local):
+        """local_ref() for each of urls, as the table a parse pool worker rewrites with"""
+        refs = {}
+        for url in urls:
+            ref = self.local_ref(url, referrer_local)
+            if ref is not None:
+                refs[url] = ref
+        return refs
+    
+    def reuse_refs(self, local_path, urls):
+        """Schedule the URLs an unchanged file from an earlier run points at
+        
+        The file is not rewritten, so its references are recorded here for
+        fix_leftover_refs() instead.
+        """
+        for url in urls:
+            self.plan_download(url)
+            self.resolve_local(url, local_path)
     
     def process_page(self, url, depth):
         """Process a single page: download, extract assets, find links"""
@@ -447,12 +600,34 @@ class WebsiteCloner:
             return set(), set()
         
         self.visited_urls.add(url)
-        
+        return self.fetch_page(url, depth)
+    
+    def fetch_page(self, url, depth):
+        """Download, extract and write one page that is already marked visited"""
+        body_path = None  # Temp copy of the body for the parse pool
         try:
-            time.sleep(self.delay)
-            response = self.session.get(url, timeout=30, allow_redirects=True)
+            with self.throttle.slot(url) as slot:
+                response = self.session.get(url, timeout=30, allow_redirects=True,
+                                            headers=self.http_cache.conditional_headers(url))
+                slot.done(response)
             response.raise_for_status()
             
+            local_path = self.url_to_filepath(url)
+            
+            if self.http_cache.unchanged(url, response.status_code, response.headers, response.content):
+                # Saved page is current - keep it and follow what it linked to last time
+                self.unchanged_urls.add(url)
+                self.url_to_local[url] = local_path
+                self.downloaded_assets.add(url)
+                
+                assets, pages = self.http_cache.links(url)
+                print(f"[SAME] Page unchanged: {url[:70]}... ({len(assets)} assets, {len(pages)} links)")
+                
+                if depth + 1 <= self.max_depth:
+                    self.reuse_refs(local_path, [p for p in pages if p not in self.visited_urls])
+                self.reuse_refs(local_path, assets)
+                return assets, pages
+            
             content_type = response.headers.get('Content-Type', '')
             
             if 'text/html' not in content_type and 'application/xhtml' not in content_type:
@@ -460,79 +635,183 @@ class WebsiteCloner:
                 self.download_file(url)
                 return set(), set()
             
-            html_content = response.text
-            local_path = self.url_to_filepath(url)
+            if self.parse_pool is not None:
+                # Parsed in a worker process, from a temp file; see write below
+                body_path = self.parse_pool.stash(response.content)
+                assets, pages, targets = self.parse_pool.call('scan_page_file', body_path, response.encoding, url)
+            else:
+                # One parsed tree serves both extraction and rewriting
+                document = parse(response.text, self.html_parser)
+                
+                # Extract assets and pages
+                assets, pages = self.extract_assets_from_html(document, url)
             
-            self.url_to_local[url] = local_path
-            self.downloaded_assets.add(url)
+            print(f"[PAGE] Page: {url[:70]}... (found {len(assets)} assets, {len(pages)} links)")
             
-            # Extract assets and pages
-            assets, pages = self.extract_assets_from_html(html_content, url)
+            # Reserve paths for everything this page will cause to be downloaded,
+            # so it can be rewritten and written once, right now
+            if depth + 1 <= self.max_depth:
+                for page_url in pages:
+                    if page_url not in self.visited_urls:
+                        self.plan_download(page_url)
+            for asset_url in assets:
+                self.plan_download(asset_url)
             
-            print(f"[PAGE] Page: {url[:70]}... (found {len(assets)} assets, {len(pages)} links)")
+            self.url_to_local[url] = local_path
+            self.downloaded_assets.add(url)
             
-            # Save HTML temporarily (will be rewritten later)
-            with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
-                f.write(html_content)
+            if self.parse_pool is not None:
+                # Everything that needs the crawl state is looked up here, once per URL
+                refs = self.local_refs(targets, local_path)
+                count, seconds = self.parse_pool.call('write_page_file', body_path, response.encoding,
+                                                      url, local_path, refs)
+                self.count_rewrite('pages', seconds, count)
+            else:
+                with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
+                    f.write(self.rewrite_urls_in_html(document, url))
             
+            self.http_cache.record(url, local_path, response.headers, response.content,
+                                   assets=assets, pages=pages)
             return assets, pages
             
         except Exception as e:
             print(f"[FAIL] Page failed: {url[:60]}... - {str(e)[:50]}")
             self.failed_urls.add(url)
             return set(), set()
+        finally:
+            if body_path is not None:
+                os.remove(body_path)
     
     def download_and_process_asset(self, url):
         """Download an asset and extract any nested assets (CSS, JS)"""
         if url in self.downloaded_assets or url in self.failed_urls:
             return set()
         
-        local_path = self.download_file(url)
-        if not local_path:
-            return set()
-        
         nested_assets = set()
+        local_path = self.url_to_filepath(url)
         
-        # Process CSS files for nested assets
+        # Process CSS files for nested assets, then rewrite before writing
         if local_path.endswith('.css'):
-            try:
-                with open(local_path, 'r', encoding='utf-8', errors='replace') as f:
-                    css_content = f.read()
-                nested_assets = self.extract_assets_from_css(css_content, url)
-            except Exception as e:
-                print(f"  Warning: Could not process CSS {url}: {e}")
+            def process_css(css_content):
+                try:
+                    # One scan serves both extraction and rewriting
+                    found = find_refs(css_content)
+                    nested_assets.update(self.extract_assets_from_css(css_content, url, found))
+                    for nested_url in nested_assets:
+                        self.plan_download(nested_url)
+                    return self.rewrite_urls_in_css(css_content, url, found=found)
+                except Exception as e:
+                    print(f"  Warning: Could not process CSS {url}: {e}")
+                    return css_content
+            
+            # Same steps with a parse pool, on the saved file
+            def process_css_file(path):
+                try:
+                    nested_assets.update(self.parse_pool.call('scan_stylesheet_file', path, url))
+                    for nested_url in nested_assets:
+                        self.plan_download(nested_url)
+                    count, seconds = self.parse_pool.call('write_stylesheet_file', path, url,
+                                                          self.local_refs(nested_assets, path))
+                    self.count_rewrite('stylesheets', seconds, count)
+                except Exception as e:
+                    print(f"  Warning: Could not process CSS {url}: {e}")
+            
+            if self.parse_pool is not None:
+                self.download_file(url, nested=nested_assets, after_save=process_css_file)
+            else:
+                self.download_file(url, text_filter=process_css, nested=nested_assets)
         
         # Process JS files for asset URLs
         elif local_path.endswith('.js'):
-            try:
-                with open(local_path, 'r', encoding='utf-8', errors='replace') as f:
-                    js_content = f.read()
-                nested_assets = self.extract_assets_from_js(js_content, url)
-            except Exception as e:
-                print(f"  Warning: Could not process JS {url}: {e}")
+            def process_js(js_content):
+                try:
+                    nested_assets.update(self.extract_assets_from_js(js_content, url))
+                except Exception as e:
+                    print(f"  Warning: Could not process JS {url}: {e}")
+                return js_content
+            
+            def process_js_file(path):
+                try:
+                    nested_assets.update(self.parse_pool.call('scan_script_file', path, url))
+                except Exception as e:
+                    print(f"  Warning: Could not process JS {url}: {e}")
+            
+            if self.parse_pool is not None:
+                self.download_file(url, nested=nested_assets, after_save=process_js_file)
+            else:
+                self.download_file(url, text_filter=process_js, nested=nested_assets)
+        
+        else:
+            self.download_file(url)
+        
+        # Unchanged since the last run: the filters did not run
+        if url in self.unchanged_urls:
+            nested_assets, _ = self.http_cache.links(url)
+            if local_path.endswith('.css'):
+                self.reuse_refs(local_path, nested_assets)
         
         return nested_assets
     
-    def rewrite_all_files(self):
-        """Rewrite all URLs in downloaded files to use local paths"""
-        print("\n[REWRITE] Rewriting URLs to local paths...")
+    def looks_like_page(self, url):
+        """Same-domain URL that the page crawl may still fetch as HTML"""
+        if not self.is_same_domain(url):
+            return False
+        ext = os.path.splitext(urlparse(url).path)[1].lower()
+        return ext in ['.html', '.htm', '.php', '.asp', '.aspx', '']
+    
+    def fix_leftover_refs(self):
+        """Point references to planned downloads that failed back at the original URL"""
+        fixed_files = 0
         
-        for url, local_path in self.url_to_local.items():
+        for local_path, refs in self.pending_refs.items():
+            failed = sorted(url for url in refs if url in self.failed_urls)
+            if not failed or not os.path.exists(local_path):
+                continue
+            
             try:
-                if local_path.endswith('.html') or local_path.endswith('.htm'):
-                    with open(local_path, 'r', encoding='utf-8', errors='replace') as f:
-                        content = f.read()
-                    rewritten = self.rewrite_urls_in_html(content, url)
-                    with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
-                        f.write(rewritten)
-                elif local_path.endswith('.css'):
-                    with open(local_path, 'r', encoding='utf-8', errors='replace') as f:
-                        content = f.read()
-                    rewritten = self.rewrite_urls_in_css(content, url)
-                    with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
-                        f.write(rewritten)
+                with open(local_path, 'r', encoding='utf-8', errors='replace') as f:
+                    content = f.read()
+                
+                for url in failed:
+                    rel_path = self.relative_ref(self.planned_local[url], local_path)
+                    # Only whole attribute values, srcset entries and url() arguments
+                    pattern = r'(?<=["\'(\s,])' + re.escape(rel_path) + r'(?=["\')\s,])'
+                    content = re.sub(pattern, lambda m: url, content)
+                
+                with open(local_path, 'w', encoding='utf-8', errors='replace') as f:
+                    f.write(content)
+                fixed_files += 1
             except Exception as e:
-                print(f"  Warning: Could not rewrite {local_path}: {e}")
+                print(f"  Warning: Could not fix up {local_path}: {e}")
+        
+        return fixed_files
+    
+    def save_checkpoint(self, phase, in_progress=()):
+        """Persist crawl progress so an interrupted run can be resumed"""
+        in_progress = [item for item in in_progress if item]
+        self.state.save(
+            sets={
+                'visited': self.visited_urls - {url for url, _ in in_progress},
+                'failed': self.failed_urls,
+            },
+            maps={
+                'url_to_local': self.url_to_local,
+                'planned_local': self.planned_local,
+                'pending_refs': {path: list(refs) for path, refs in list(self.pending_refs.items())},
+            },
+            frontier=in_progress + list(self.pages_to_visit),
+            meta={'phase': phase},
+        )
+    
+    def restore_checkpoint(self):
+        """Load progress saved by save_checkpoint()"""
+        self.visited_urls = self.state.load_set('visited')
+        self.failed_urls = self.state.load_set('failed')
+        self.url_to_local = self.state.load_map('url_to_local')
+        self.downloaded_assets = set(self.url_to_local)
+        self.planned_local = self.state.load_map('planned_local')
+        self.pending_refs = {path: set(refs) for path, refs in self.state.load_map('pending_refs').items()}
+        self.pages_to_visit = deque(self.state.load_frontier())
     
     def clone(self):
         """Main method to clone the website"""
@@ -544,53 +823,125 @@ class WebsiteCloner:
         print(f"Max depth: {self.max_depth}")
         print(f"{'='*60}\n")
         
-        # Start with the base URL
-        self.pages_to_visit.append((self.base_url, 0))
-        all_assets = set()
-        
-        # Phase 1: Crawl all pages
-        print("[PHASE 1] Crawling pages...\n")
-        while self.pages_to_visit:
-            url, depth = self.pages_to_visit.popleft()
-            
-            if url in self.visited_urls:
-                continue
+        self.http_cache.open()
+        if self.state.open(resume=self.resume):
+            self.restore_checkpoint()
+            print(f"[RESUME] {len(self.visited_urls)} pages visited, "
+                  f"{len(self.pages_to_visit)} queued, {len(self.url_to_local)} files saved\n")
+        else:
+            # Start with the base URL
+            self.pages_to_visit.append((self.base_url, 0))
+            self.plan_download(self.base_url)
+        
+        # Pages are rewritten and written as soon as they are fetched, while
+        # assets stream through the thread pool in the background
+        print("[PIPELINE] Crawling pages and streaming assets...\n")
+        
+        submitted = set()
+        deferred = set()  # Page-like assets, held back until the crawl is done
+        futures = {}
+        
+        def submit(asset_urls):
+            for asset_url in asset_urls:
+                if asset_url not in submitted:
+                    submitted.add(asset_url)
+                    futures[executor.submit(self.download_and_process_asset, asset_url)] = asset_url
+        
+        def collect(timeout):
+            done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                url = futures.pop(future)
+                try:
+                    submit(future.result())
+                except Exception as e:
+                    print(f"  Error processing {url}: {e}")
+        
+        # Anything planned but not finished before a restart (assets that were
+        # in flight, page-like assets still held back) goes back in the pipeline
+        queued_pages = {url for url, _ in self.pages_to_visit}
+        unfinished = [url for url in list(self.planned_local)
+                      if url not in self.url_to_local and url not in self.failed_urls and url not in queued_pages]
+        
+        # With a parse pool, pages are fetched and parsed several at a time
+        # (threads feeding the worker processes); without one, one at a time
+        if self.parse_workers:
+            self.parse_pool = ParsePool(self.parse_workers, PageParser,
+                                        {'base_url': self.base_url, 'output_dir': self.output_dir,
+                                         'html_parser': self.html_parser},
+                                        spill_dir=self.asset_store.spill_dir)
+            print(f"[PARSE] Parsing in {self.parse_pool.workers} worker processes\n")
+        page_slots = self.parse_pool.workers if self.parse_pool else 1
+        running = {}  # page future -> (url, depth)
+        
+        phase = 'pages'
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        page_executor = ThreadPoolExecutor(max_workers=page_slots)
+        try:
+            deferred.update(a for a in unfinished if self.looks_like_page(a))
+            submit(a for a in unfinished if not self.looks_like_page(a))
             
-            assets, pages = self.process_page(url, depth)
-            all_assets.update(assets)
+            while self.pages_to_visit or running:
+                # A deeper page waits until the current depth is done, so every
+                # page is still reached (and its links followed) at its shortest depth
+                while self.pages_to_visit and len(running) < page_slots:
+                    url, depth = self.pages_to_visit[0]
+                    if running and depth != next(iter(running.values()))[1]:
+                        break
+                    self.pages_to_visit.popleft()
+                    
+                    if url in self.visited_urls or depth > self.max_depth:
+                        continue
+                    self.visited_urls.add(url)
+                    running[page_executor.submit(self.fetch_page, url, depth)] = (url, depth)
+                
+                if not running:
+                    continue
+                done, _ = wait(list(running) + list(futures), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future not in running:
+                        continue
+                    url, depth = running.pop(future)
+                    assets, pages = future.result()
+                    
+                    deferred.update(a for a in assets if self.looks_like_page(a))
+                    submit(a for a in assets if not self.looks_like_page(a))
+                    
+                    # Add new pages to queue
+                    if depth + 1 <= self.max_depth:
+                        for page_url in pages:
+                            if page_url not in self.visited_urls:
+                                self.pages_to_visit.append((page_url, depth + 1))
+                
+                if futures:
+                    collect(timeout=0)
+                if self.state.due():
+                    self.save_checkpoint(phase, in_progress=list(running.values()))
             
-            # Add new pages to queue
-            for page_url in pages:
-                if page_url not in self.visited_urls:
-                    self.pages_to_visit.append((page_url, depth + 1))
-        
-        # Phase 2: Download all assets
-        print(f"\n[PHASE 2] Downloading {len(all_assets)} assets...\n")
-        
-        assets_to_process = all_assets.copy()
-        processed_assets = set()
-        
-        while assets_to_process:
-            current_batch = list(assets_to_process - processed_assets)[:100]  # Process in batches
+            phase = 'assets'
+            submit(a for a in deferred if a not in self.visited_urls)
             
-            if not current_batch:
-                break
+            print(f"\n[PIPELINE] Pages done, finishing {len(futures)} queued assets...\n")
+            while futures:
+                collect(timeout=None)
+                if self.state.due():
+                    self.save_checkpoint(phase)
             
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                futures = {executor.submit(self.download_and_process_asset, url): url 
-                          for url in current_batch}
-                
-                for future in as_completed(futures):
-                    url = futures[future]
-                    processed_assets.add(url)
-                    try:
-                        nested = future.result()
-                        assets_to_process.update(nested)
-                    except Exception as e:
-                        print(f"  Error processing {url}: {e}")
-        
-        # Phase 3: Rewrite URLs
-        self.rewrite_all_files()
+            executor.shutdown()
+            page_executor.shutdown()
+            phase = 'done'
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            page_executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        finally:
+            self.save_checkpoint(phase, in_progress=list(running.values()))
+            if self.parse_pool is not None:
+                self.parse_pool.close(wait=phase == 'done')
+        
+        # Fix up references to downloads that failed after their referrer was written
+        fixed = self.fix_leftover_refs()
+        if fixed:
+            print(f"\n[FIXUP] Restored original URLs in {fixed} files")
         
         # Phase 4: Create index redirect if needed
         main_index = os.path.join(self.output_dir, self.base_domain, 'index.html')
@@ -618,7 +969,16 @@ class WebsiteCloner:
         print(f"{'='*60}")
         print(f"Pages downloaded: {len(self.visited_urls)}")
         print(f"Assets downloaded: {len(self.downloaded_assets)}")
+        # A page also linked as an asset matches the entry this run just wrote; not counted
+        print(f"Unchanged since last run: {len(self.http_cache.from_earlier_run(self.unchanged_urls))}")
         print(f"Failed downloads: {len(self.failed_urls)}")
+        pruned = self.asset_store.prune()
+        print(f"Blob store: {self.asset_store.summary()}, {pruned} unused blobs pruned")
+        print(f"Rewriting: {self.rewrite_summary()}")
+        if self.parse_pool is not None:
+            print(f"Parse pool: {self.parse_pool.summary()}")
+        for line in self.throttle.summary():
+            print(f"Host {line}")
         print(f"Output directory: {os.path.abspath(self.output_dir)}")
         print(f"\nTo view the site, open: {os.path.abspath(root_index)}")
         
@@ -630,6 +990,8 @@ class WebsiteCloner:
         
         print(f"{'='*60}\n")
         
+        self.state.close()
+        self.http_cache.close()
         return self.output_dir
 
 
@@ -654,7 +1016,22 @@ Examples:
     parser.add_argument('-w', '--max-workers', type=int, default=10,
                        help='Maximum concurrent downloads (default: 10)')
     parser.add_argument('--delay', type=float, default=0.1,
-                       help='Delay between requests in seconds (default: 0.1)')
+                       help='Minimum delay between requests to the site itself, in seconds (default: 0.1)')
+    parser.add_argument('--host-concurrency', type=int, default=8,
+                       help='Most parallel requests to any other host; each adapts up to this (default: 8)')
+    parser.add_argument('--resume', action='store_true',
+                       help='Continue an interrupted clone from its last checkpoint')
+    parser.add_argument('--full', action='store_true',
+                       help='Re-download everything instead of revalidating files from earlier runs')
+    parser.add_argument('--blob-dir', default=None,
+                       help='Shared blob store for deduplicated assets (default: OUTPUT/.blobs)')
+    parser.add_argument('--max-memory', type=float, default=1.0,
+                       help='Largest download kept in memory, in MB; bigger ones stream to disk (default: 1)')
+    parser.add_argument('--parser', choices=BACKENDS, default=DEFAULT_BACKEND,
+                       help='HTML backend for extraction and rewriting; both write the same output (default: lxml)')
+    parser.add_argument('--parse-workers', type=int, nargs='?', const=default_workers(), default=0,
+                       help=f'Parse and rewrite in this many worker processes, fetching pages side by side '
+                            f'(no number: {default_workers()}, one per core but one; default: 0, in-process)')
     
     args = parser.parse_args()
     
@@ -663,10 +1040,20 @@ Examples:
         output_dir=args.output,
         max_depth=args.depth,
         max_workers=args.max_workers,
-        delay=args.delay
+        delay=args.delay,
+        resume=args.resume,
+        revalidate=not args.full,
+        blob_dir=args.blob_dir,
+        max_memory=int(args.max_memory * 1024 * 1024),
+        html_parser=args.parser,
+        host_concurrency=args.host_concurrency,
+        parse_workers=args.parse_workers
     )
     
-    cloner.clone()
+    try:
+        cloner.clone()
+    except KeyboardInterrupt:
+        print("\n\nInterrupted - progress saved. Run again with --resume to continue.")
 
 
 if __name__ == '__main__':